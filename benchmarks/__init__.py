@@ -0,0 +1,13 @@
+"""Benchmarks for the hot paths of the `sublemon` library.
+
+Each benchmark module can be run directly, e.g.::
+
+    python -m benchmarks.bench_completion
+
+The core ones are also run together by the suite in `benchmarks.suite`,
+which writes machine-readable results and checks them against a stored
+baseline::
+
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+
+"""
@@ -0,0 +1,34 @@
+"""Benchmark running tiny commands in batches, against one process each."""
+
+import time
+
+from typing import Dict
+
+from sublemon import (
+    crossplat_loop_run,
+    Sublemon)
+
+
+async def bench(launcher: str, cmd: str, num_jobs: int=2000,
+                max_concurrency: int=64) -> Dict[str, float]:
+    """Measure the throughput of many copies of a tiny command."""
+    async with Sublemon(max_concurrency=max_concurrency,
+                        launcher=launcher) as s:
+        start = time.perf_counter()
+        await s.gather(*[cmd for _ in range(num_jobs)])
+        elapsed = time.perf_counter() - start
+    return {'jobs_per_s': num_jobs / elapsed}
+
+
+async def main() -> None:
+    # a shell builtin, and a program the shell has to execute
+    for cmd in ('true', '/bin/true',):
+        for launcher in ('asyncio', 'batch',):
+            rates = [(await bench(launcher, cmd))['jobs_per_s']
+                     for _ in range(3)]
+            print('{:>9} {:>7}: {:.1f} jobs/s (best of 3)'.format(
+                cmd, launcher, max(rates)))
+
+
+if __name__ == '__main__':
+    crossplat_loop_run(main())
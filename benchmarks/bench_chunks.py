@@ -0,0 +1,58 @@
+"""Benchmark output throughput of the line, chunk, and readinto paths."""
+
+import time
+
+from typing import Dict
+
+from sublemon import (
+    crossplat_loop_run,
+    Sublemon)
+
+_LINE = b'0123456789' * 6
+
+
+async def _consume(sp, path: str) -> int:
+    """Read all of a subprocess's stdout via `path`, returning the bytes."""
+    n = 0
+    if path == 'lines':
+        # what `iter_lines` does per line
+        async for line in sp.stdout:
+            n += len(line.decode('utf-8').rstrip()) + 1
+    elif path == 'chunks':
+        async for chunk in sp.iter_chunks():
+            n += len(chunk)
+    elif path == 'line_batches':
+        async for batch in sp.iter_line_batches(encoding='utf-8'):
+            n += sum(map(len, batch)) + len(batch)
+    else:
+        buf = bytearray(2 ** 16)
+        while True:
+            read = await sp.readinto(buf)
+            if not read:
+                break
+            n += read
+    return n
+
+
+async def bench(path: str, num_mib: int=64) -> Dict[str, float]:
+    """Measure how many MiB/s of output a read path gets through."""
+    num_lines = num_mib * 2 ** 20 // (len(_LINE) + 1)
+    cmd = ['sh', '-c', 'yes {} | head -n {}'.format(
+        _LINE.decode(), num_lines)]
+    async with Sublemon() as s:
+        sp, = s.spawn(cmd)
+        start = time.perf_counter()
+        n = await _consume(sp, path)
+        elapsed = time.perf_counter() - start
+        await sp.wait_done()
+    return {'mib_per_s': n / 2 ** 20 / elapsed}
+
+
+async def main() -> None:
+    for path in ('lines', 'line_batches', 'chunks', 'readinto',):
+        results = await bench(path)
+        print('{:>12}: {:.1f} MiB/s'.format(path, results['mib_per_s']))
+
+
+if __name__ == '__main__':
+    crossplat_loop_run(main())
@@ -0,0 +1,56 @@
+"""Benchmark completion latency and CPU use of each completion mode."""
+
+import asyncio
+import time
+
+from typing import Dict
+
+from sublemon import (
+    crossplat_loop_run,
+    Sublemon)
+
+_TRIVIAL_CMD = 'true'
+_SLEEP_CMD = 'sleep 1'
+
+
+async def bench(completion: str, num_jobs: int=200, num_idle: int=200,
+                poll_delta: float=0.01) -> Dict[str, float]:
+    """Measure per-job latency and idle CPU use of a completion mode.
+
+    The latency figure is the mean wall time of running trivial jobs one at
+    a time, so any delay between a subprocess exiting and its slot being
+    freed shows up directly. The idle CPU figure is the CPU time that this
+    process burns while `num_idle` subprocesses sleep for one second.
+
+    """
+    async with Sublemon(max_concurrency=1, completion=completion,
+                        poll_delta=poll_delta) as s:
+        start = time.perf_counter()
+        await s.gather(*[_TRIVIAL_CMD for _ in range(num_jobs)])
+        latency = (time.perf_counter() - start) / num_jobs
+
+    async with Sublemon(max_concurrency=num_idle, completion=completion,
+                        poll_delta=poll_delta) as s:
+        subprocs = s.spawn(*[_SLEEP_CMD for _ in range(num_idle)])
+        await asyncio.gather(*[sp.wait_running() for sp in subprocs])
+        cpu_start = time.process_time()
+        await s.block()
+        idle_cpu = time.process_time() - cpu_start
+
+    return {
+        'per_job_latency_ms': latency * 1000,
+        'idle_cpu_s': idle_cpu,
+    }
+
+
+async def main() -> None:
+    for completion in ('event', 'poll',):
+        results = await bench(completion)
+        print('{:>5}: {:.3f} ms per job, {:.3f} s CPU while idle'.format(
+            completion,
+            results['per_job_latency_ms'],
+            results['idle_cpu_s']))
+
+
+if __name__ == '__main__':
+    crossplat_loop_run(main())
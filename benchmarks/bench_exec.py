@@ -0,0 +1,31 @@
+"""Benchmark spawn throughput of shell-mode vs exec-mode commands."""
+
+import time
+
+from typing import Dict
+
+from sublemon import (
+    crossplat_loop_run,
+    Sublemon)
+
+
+async def bench(mode: str, num_jobs: int=1000, max_concurrency: int=25,
+                launcher: str='asyncio') -> Dict[str, float]:
+    """Measure how many trivial jobs per second a spawn mode can run."""
+    cmd = '/bin/true' if mode == 'shell' else ['/bin/true']
+    async with Sublemon(max_concurrency=max_concurrency,
+                        launcher=launcher) as s:
+        start = time.perf_counter()
+        await s.gather(*[cmd for _ in range(num_jobs)])
+        elapsed = time.perf_counter() - start
+    return {'jobs_per_s': num_jobs / elapsed}
+
+
+async def main() -> None:
+    for mode in ('shell', 'exec',):
+        results = await bench(mode)
+        print('{:>5}: {:.1f} jobs/s'.format(mode, results['jobs_per_s']))
+
+
+if __name__ == '__main__':
+    crossplat_loop_run(main())
@@ -0,0 +1,43 @@
+"""Benchmark filtering output before it is split into lines, and after."""
+
+import re
+import time
+
+from typing import Dict
+
+from sublemon import (
+    crossplat_loop_run,
+    OutputFilter,
+    Sublemon)
+
+# matches 1 in 1000 of the lines written by `seq`
+_PATTERN = rb'999$'
+
+
+async def bench(path: str, num_lines: int=2000000,
+                num_jobs: int=4) -> Dict[str, float]:
+    """Measure how quickly the matching lines of large outputs are found."""
+    cmds = [['seq', str(num_lines)]] * num_jobs
+    async with Sublemon(max_concurrency=num_jobs) as s:
+        start = time.perf_counter()
+        if path == 'python':
+            pattern = re.compile(_PATTERN.decode())
+            matched = [line async for line in s.iter_lines(*cmds)
+                       if pattern.search(line)]
+        else:
+            matched = [line async for line in s.iter_lines(
+                *cmds, output_filter=OutputFilter(pattern=_PATTERN))]
+        elapsed = time.perf_counter() - start
+    assert len(matched) == num_jobs * (num_lines // 1000)
+    return {'lines_per_s': num_jobs * num_lines / elapsed}
+
+
+async def main() -> None:
+    for path in ('python', 'pushdown',):
+        rates = [(await bench(path))['lines_per_s'] for _ in range(3)]
+        print('{:>8}: {:.0f} lines/s scanned (best of 3)'.format(
+            path, max(rates)))
+
+
+if __name__ == '__main__':
+    crossplat_loop_run(main())
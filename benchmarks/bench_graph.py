@@ -0,0 +1,54 @@
+"""Benchmark running dependent jobs in stages vs as a dependency graph."""
+
+import random
+import time
+
+from typing import Dict
+
+from sublemon import (
+    crossplat_loop_run,
+    JobGraph,
+    Sublemon)
+
+
+def _durations(num_chains: int, num_stages: int) -> Dict[str, float]:
+    """Pick random durations for a set of independent chains of jobs."""
+    rng = random.Random(0)
+    return {'{}-{}'.format(chain, stage): rng.choice([0.02, 0.05, 0.4])
+            for chain in range(num_chains) for stage in range(num_stages)}
+
+
+async def bench(mode: str, num_chains: int=16, num_stages: int=4,
+                max_concurrency: int=8) -> Dict[str, float]:
+    """Measure the wall time and slot utilization of an execution mode."""
+    durations = _durations(num_chains, num_stages)
+    async with Sublemon(max_concurrency=max_concurrency) as s:
+        start = time.perf_counter()
+        if mode == 'stages':
+            for stage in range(num_stages):
+                await s.gather(*[
+                    ['sleep', str(durations['{}-{}'.format(chain, stage)])]
+                    for chain in range(num_chains)])
+        else:
+            graph = JobGraph()
+            for name, duration in durations.items():
+                chain, stage = name.split('-')
+                deps = ['{}-{}'.format(chain, int(stage) - 1)] if int(
+                    stage) else []
+                graph.add(name, ['sleep', str(duration)], deps=deps,
+                          cost=duration)
+            await s.run_graph(graph)
+        elapsed = time.perf_counter() - start
+    busy = sum(durations.values()) / max_concurrency
+    return {'seconds': elapsed, 'utilization': busy / elapsed}
+
+
+async def main() -> None:
+    for mode in ('stages', 'graph',):
+        results = await bench(mode)
+        print('{:>6}: {:.2f}s, {:.0%} slot utilization'.format(
+            mode, results['seconds'], results['utilization']))
+
+
+if __name__ == '__main__':
+    crossplat_loop_run(main())
@@ -0,0 +1,37 @@
+"""Benchmark the overhead of lifecycle hooks and metrics."""
+
+import time
+
+from typing import Dict
+
+from sublemon import (
+    crossplat_loop_run,
+    Sublemon,
+    SublemonHooks,
+    SublemonMetrics)
+
+
+async def bench(mode: str, num_jobs: int=2000,
+                max_concurrency: int=25) -> Dict[str, float]:
+    """Measure the throughput of short jobs with some kind of hooks."""
+    kwargs = {}
+    if mode == 'no-op':
+        kwargs['hooks'] = [SublemonHooks()]
+    elif mode == 'metrics':
+        kwargs['hooks'] = [SublemonMetrics()]
+    async with Sublemon(max_concurrency=max_concurrency, **kwargs) as s:
+        start = time.perf_counter()
+        await s.gather(*['seq 100' for _ in range(num_jobs)])
+        elapsed = time.perf_counter() - start
+    return {'jobs_per_s': num_jobs / elapsed}
+
+
+async def main() -> None:
+    for mode in ('none', 'no-op', 'metrics',):
+        # interleave runs, to even out any drift of the host
+        rates = [(await bench(mode))['jobs_per_s'] for _ in range(3)]
+        print('{:>8}: {:.1f} jobs/s (best of 3)'.format(mode, max(rates)))
+
+
+if __name__ == '__main__':
+    crossplat_loop_run(main())
@@ -0,0 +1,38 @@
+"""Benchmark spawn latency of each launcher as the parent's RSS grows."""
+
+import time
+
+from typing import (
+    Dict,
+    List)
+
+from sublemon import (
+    crossplat_loop_run,
+    Sublemon)
+
+_MIB = 2 ** 20
+
+
+async def bench(launcher: str, num_jobs: int=200) -> Dict[str, float]:
+    """Measure the mean latency of spawning and reaping trivial jobs."""
+    async with Sublemon(max_concurrency=1, launcher=launcher) as s:
+        start = time.perf_counter()
+        await s.gather(*[['/bin/true'] for _ in range(num_jobs)])
+        elapsed = time.perf_counter() - start
+    return {'spawn_latency_ms': elapsed / num_jobs * 1000}
+
+
+async def main() -> None:
+    ballast: List[bytes] = []
+    for rss_mib in (0, 256, 1024,):
+        # touch every page, so the memory actually counts towards our RSS
+        while len(ballast) < rss_mib:
+            ballast.append(b'\x01' * _MIB)
+        for launcher in ('asyncio', 'posix_spawn', 'pool',):
+            results = await bench(launcher)
+            print('{:>5} MiB ballast, {:>11}: {:.3f} ms per spawn'.format(
+                rss_mib, launcher, results['spawn_latency_ms']))
+
+
+if __name__ == '__main__':
+    crossplat_loop_run(main())
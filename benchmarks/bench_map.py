@@ -0,0 +1,39 @@
+"""Benchmark peak memory of eager `gather` vs lazy `map` submission."""
+
+import time
+import tracemalloc
+
+from typing import Dict
+
+from sublemon import (
+    crossplat_loop_run,
+    Sublemon)
+
+
+async def bench(mode: str, num_jobs: int=5000,
+                max_concurrency: int=25) -> Dict[str, float]:
+    """Measure the peak traced memory and throughput of a submission mode."""
+    cmds = (['/bin/true'] for _ in range(num_jobs))
+    async with Sublemon(max_concurrency=max_concurrency) as s:
+        tracemalloc.start()
+        start = time.perf_counter()
+        if mode == 'gather':
+            await s.gather(*cmds)
+        else:
+            async for _ in s.map(cmds):
+                pass
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {'peak_mib': peak / 2 ** 20, 'jobs_per_s': num_jobs / elapsed}
+
+
+async def main() -> None:
+    for mode in ('gather', 'map',):
+        results = await bench(mode)
+        print('{:>6}: {:.1f} MiB peak, {:.1f} jobs/s'.format(
+            mode, results['peak_mib'], results['jobs_per_s']))
+
+
+if __name__ == '__main__':
+    crossplat_loop_run(main())
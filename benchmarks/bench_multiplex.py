@@ -0,0 +1,59 @@
+"""Benchmark merged line iteration with many concurrent subprocesses."""
+
+import time
+
+from typing import Dict
+
+from sublemon import (
+    amerge,
+    crossplat_loop_run,
+    Sublemon)
+
+# each line is the wall-clock time (in seconds) at which it was written
+_CMD = 'for i in $(seq {}); do echo $EPOCHREALTIME; done'
+
+
+async def _amerge_lines(s, cmds):
+    """The `aiostream`-based merging `iter_lines` used to do."""
+    sps = s.spawn(*cmds)
+    agen = amerge(
+        amerge(*[sp.stdout for sp in sps]),
+        amerge(*[sp.stderr for sp in sps]))
+    async for line in agen:
+        yield line.decode('utf-8').rstrip()
+
+
+async def bench(path: str, num_jobs: int,
+                lines_per_job: int=200) -> Dict[str, float]:
+    """Measure line throughput and latency of a merging path."""
+    cmds = [['bash', '-c', _CMD.format(lines_per_job)]] * num_jobs
+    async with Sublemon(max_concurrency=num_jobs) as s:
+        if path == 'amerge':
+            lines = _amerge_lines(s, cmds)
+        else:
+            lines = s.iter_lines(*cmds)
+
+        num_lines = 0
+        total_latency = 0.0
+        start = time.perf_counter()
+        async for line in lines:
+            total_latency += time.time() - float(line)
+            num_lines += 1
+        elapsed = time.perf_counter() - start
+    return {
+        'lines_per_s': num_lines / elapsed,
+        'latency_ms': total_latency / num_lines * 1000,
+    }
+
+
+async def main() -> None:
+    for num_jobs in (1, 100, 1000,):
+        for path in ('amerge', 'multiplex',):
+            results = await bench(path, num_jobs)
+            print('{:>4} jobs, {:>9}: {:.0f} lines/s, {:.2f} ms/line'.format(
+                num_jobs, path, results['lines_per_s'],
+                results['latency_ms']))
+
+
+if __name__ == '__main__':
+    crossplat_loop_run(main())
@@ -0,0 +1,36 @@
+"""Benchmark piping between subprocesses directly vs through Python."""
+
+import time
+
+from typing import Dict
+
+from sublemon import (
+    crossplat_loop_run,
+    Sublemon)
+
+
+async def bench(mode: str, num_bytes: int=2 ** 30) -> Dict[str, float]:
+    """Measure the throughput of moving bytes from one job to another."""
+    producer = 'head -c {} /dev/zero'.format(num_bytes)
+    async with Sublemon() as s:
+        start = time.perf_counter()
+        if mode == 'direct':
+            _, consumer = s.pipeline(producer, ['wc', '-c'])
+        else:
+            upstream, = s.spawn(producer)
+            consumer, = s.spawn(['wc', '-c'], stdin=upstream.iter_chunks())
+        output = b''.join([line async for line in consumer.stdout])
+        await s.block()
+        elapsed = time.perf_counter() - start
+    assert int(output) == num_bytes
+    return {'mib_per_s': num_bytes / 2 ** 20 / elapsed}
+
+
+async def main() -> None:
+    for mode in ('python', 'direct',):
+        results = await bench(mode)
+        print('{:>6}: {:.1f} MiB/s'.format(mode, results['mib_per_s']))
+
+
+if __name__ == '__main__':
+    crossplat_loop_run(main())
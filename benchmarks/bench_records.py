@@ -0,0 +1,48 @@
+"""Benchmark the memory and creation cost of queued subprocess records."""
+
+import time
+import tracemalloc
+
+from typing import Dict
+
+from sublemon import (
+    crossplat_loop_run,
+    Sublemon,
+    SublemonSubprocess)
+
+
+async def bench(num_jobs: int=100000) -> Dict[str, float]:
+    """Measure the per-job overhead of creating and queueing job records.
+
+    Records are created and added to the server's pending set, the same
+    bookkeeping `spawn` does for each job before it waits for a slot, but
+    without launching anything.
+
+    """
+    async with Sublemon() as s:
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        records = []
+        for _ in range(num_jobs):
+            sp = SublemonSubprocess(s, 'true')
+            s._pending_set.add(sp)
+            records.append(sp)
+        elapsed = time.perf_counter() - start
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        s._pending_set.clear()
+    return {
+        'bytes_per_job': (after - before) / num_jobs,
+        'jobs_per_s': num_jobs / elapsed,
+    }
+
+
+async def main() -> None:
+    results = await bench()
+    print('{:.0f} bytes/job, {:.0f} jobs/s'.format(
+        results['bytes_per_job'], results['jobs_per_s']))
+
+
+if __name__ == '__main__':
+    crossplat_loop_run(main())
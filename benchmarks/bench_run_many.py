@@ -0,0 +1,51 @@
+"""Benchmark collecting output with `run_many` vs a reader per subprocess."""
+
+import asyncio
+import time
+import tracemalloc
+
+from typing import Dict
+
+from sublemon import (
+    crossplat_loop_run,
+    Sublemon)
+
+
+async def _collect(sp) -> bytes:
+    """Collect the stdout of a subprocess the hand-rolled way."""
+    lines = [line async for line in sp.stdout]
+    await sp.wait_done()
+    return b''.join(lines)
+
+
+async def bench(mode: str, num_jobs: int=2000,
+                max_concurrency: int=25) -> Dict[str, float]:
+    """Measure the peak traced memory and throughput of a collection mode."""
+    cmds = [['seq', '100'] for _ in range(num_jobs)]
+    async with Sublemon(max_concurrency=max_concurrency) as s:
+        tracemalloc.start()
+        start = time.perf_counter()
+        if mode == 'per-job':
+            outputs = await asyncio.gather(
+                *(_collect(sp) for sp in s.spawn(*cmds)))
+            total = sum(len(o) for o in outputs)
+        else:
+            total = 0
+            async for r in s.run_many(cmds):
+                total += len(r.stdout)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    assert total == num_jobs * 292
+    return {'peak_mib': peak / 2 ** 20, 'jobs_per_s': num_jobs / elapsed}
+
+
+async def main() -> None:
+    for mode in ('per-job', 'run_many',):
+        results = await bench(mode)
+        print('{:>8}: {:.1f} MiB peak, {:.1f} jobs/s'.format(
+            mode, results['peak_mib'], results['jobs_per_s']))
+
+
+if __name__ == '__main__':
+    crossplat_loop_run(main())
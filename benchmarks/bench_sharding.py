@@ -0,0 +1,50 @@
+"""Benchmark how throughput scales with the number of `Sublemon` shards."""
+
+import os
+import time
+
+from typing import Dict
+
+from sublemon import (
+    crossplat_loop_run,
+    ShardedSublemon,
+    Sublemon)
+
+
+async def bench(shards: int, mode: str='process', num_jobs: int=1000,
+                lines: int=2000, max_concurrency: int=32) -> Dict[str, float]:
+    """Measure the jobs/s and output lines/s of some number of shards.
+
+    A `shards` count of zero measures a plain `Sublemon`, for reference.
+
+    """
+    cmds = [['seq', str(lines)] for _ in range(num_jobs)]
+    if shards:
+        server = ShardedSublemon(shards=shards, mode=mode,
+                                 max_concurrency=max_concurrency)
+    else:
+        server = Sublemon(max_concurrency=max_concurrency)  # type: ignore
+    async with server:
+        start = time.perf_counter()
+        total = 0
+        async for r in server.run_many(cmds, max_output=2 ** 20):
+            total += r.stdout.count(b'\n')
+        elapsed = time.perf_counter() - start
+    assert total == num_jobs * lines
+    return {'jobs_per_s': num_jobs / elapsed, 'lines_per_s': total / elapsed}
+
+
+async def main() -> None:
+    print('{} CPUs'.format(os.cpu_count()))
+    results = await bench(0)
+    print('{:>12}: {:.0f} jobs/s, {:.0f} lines/s'.format(
+        'Sublemon', results['jobs_per_s'], results['lines_per_s']))
+    for mode in ('thread', 'process',):
+        for shards in (1, 2, 4, 8,):
+            results = await bench(shards, mode)
+            print('{:>7} x {}: {:.0f} jobs/s, {:.0f} lines/s'.format(
+                mode, shards, results['jobs_per_s'], results['lines_per_s']))
+
+
+if __name__ == '__main__':
+    crossplat_loop_run(main())
@@ -0,0 +1,62 @@
+"""Benchmark running commands from synchronous code."""
+
+import threading
+import time
+
+from typing import Dict
+
+from sublemon import (
+    crossplat_loop_run,
+    Sublemon,
+    SyncSublemon)
+
+
+async def _gather_once(cmd: str) -> None:
+    async with Sublemon() as s:
+        await s.gather(cmd)
+
+
+def bench(mode: str, num_calls: int=500, num_threads: int=8,
+          max_concurrency: int=25) -> Dict[str, float]:
+    """Measure the rate of blocking calls to run one short command each.
+
+    In `loop_run` mode, each call runs its own event loop, with
+    `crossplat_loop_run`; in `sync` mode, each call goes through a shared
+    `SyncSublemon`, from one thread; and in `threads` mode, the calls are
+    spread across `num_threads` threads sharing a `SyncSublemon`.
+
+    """
+    if mode == 'loop_run':
+        start = time.perf_counter()
+        for _ in range(num_calls):
+            crossplat_loop_run(_gather_once('true'))
+        return {'calls_per_s': num_calls / (time.perf_counter() - start)}
+
+    with SyncSublemon(max_concurrency=max_concurrency) as s:
+        start = time.perf_counter()
+        if mode == 'sync':
+            for _ in range(num_calls):
+                s.gather('true')
+        else:
+            def run() -> None:
+                for _ in range(num_calls // num_threads):
+                    s.gather('true')
+
+            threads = [threading.Thread(target=run)
+                       for _ in range(num_threads)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        elapsed = time.perf_counter() - start
+    return {'calls_per_s': num_calls / elapsed}
+
+
+def main() -> None:
+    for mode in ('loop_run', 'sync', 'threads',):
+        rates = [bench(mode)['calls_per_s'] for _ in range(3)]
+        print('{:>8}: {:.1f} calls/s (best of 3)'.format(mode, max(rates)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+"""Reproducible suite of the core benchmarks, with regression checks.
+
+Runs the spawn rate, completion latency, output throughput, and per-job
+memory benchmarks over a matrix of parameters, and reports the median of
+each metric over a number of repeats. Results can be written out as JSON,
+and compared against a stored baseline::
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+
+The spawn rate and line throughput cases are also run on each other kind of
+event loop passed to `--loop` (by default, `uvloop`, if it is installed), to
+compare them with the standard library's loop.
+
+When comparing, the suite exits with a non-zero status if any metric got
+worse than the baseline by more than `--tolerance`. Metrics ending in
+`_per_s` are better when higher; all others are better when lower. Results
+only compare meaningfully against a baseline from the same host, which is
+recorded alongside them; on noisy (e.g., shared or single-core) hosts, use
+more repeats or a looser tolerance.
+
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple)
+
+from benchmarks import (
+    bench_chunks,
+    bench_completion,
+    bench_exec,
+    bench_multiplex,
+    bench_records)
+from sublemon import (
+    __version__,
+    crossplat_loop_run,
+    has_uvloop)
+
+Results = Dict[str, Dict[str, float]]
+
+_DEFAULT_TOLERANCE = 0.2
+
+
+class Case(NamedTuple):
+
+    """A benchmark run with a fixed set of parameters."""
+
+    name: str
+    run: Callable[..., Awaitable[Dict[str, float]]]
+    kwargs: Dict[str, Any]
+    loop_factory: str = 'asyncio'
+
+
+def make_cases(args: argparse.Namespace) -> List[Case]:
+    """Expand the parameter matrix into the cases to run."""
+    cases: List[Case] = []
+    for lf in args.loop:
+        # cases on the default loop keep their names, to match baselines
+        suffix = '' if lf == 'asyncio' else ', loop=' + lf
+        for mc in args.max_concurrency:
+            cases.append(Case(
+                'spawn[max_concurrency={}{}]'.format(mc, suffix),
+                bench_exec.bench,
+                dict(mode='exec', num_jobs=args.jobs, max_concurrency=mc),
+                lf))
+        if hasattr(os, 'posix_spawn'):
+            # uvloop's own spawning is slow on some hosts; this is not
+            cases.append(Case(
+                'spawn[max_concurrency=25, launcher=posix_spawn{}]'.format(
+                    suffix),
+                bench_exec.bench,
+                dict(mode='exec', num_jobs=args.jobs, max_concurrency=25,
+                     launcher='posix_spawn'),
+                lf))
+        cases.append(Case(
+            'lines[multiplex, jobs=100{}]'.format(suffix),
+            bench_multiplex.bench,
+            dict(path='multiplex', num_jobs=100, lines_per_job=args.lines),
+            lf))
+
+    cases.append(Case(
+        'completion[event]', bench_completion.bench,
+        dict(completion='event', num_jobs=args.jobs // 4, num_idle=50)))
+    for pd in args.poll_delta:
+        cases.append(Case(
+            'completion[poll, poll_delta={}]'.format(pd),
+            bench_completion.bench,
+            dict(completion='poll', num_jobs=args.jobs // 4, num_idle=50,
+                 poll_delta=pd)))
+
+    cases.append(Case(
+        'lines[amerge, jobs=100]', bench_multiplex.bench,
+        dict(path='amerge', num_jobs=100, lines_per_job=args.lines)))
+    for path in ('lines', 'chunks',):
+        cases.append(Case(
+            'output[{}, {} MiB]'.format(path, args.mib), bench_chunks.bench,
+            dict(path=path, num_mib=args.mib)))
+
+    cases.append(Case(
+        'queued_records', bench_records.bench,
+        dict(num_jobs=args.jobs * 50)))
+    return cases
+
+
+def run_case(case: Case, repeat: int) -> Dict[str, float]:
+    """Run a case `repeat` times, taking the median of each metric.
+
+    Each run gets a new event loop of the case's kind.
+
+    """
+    samples: Dict[str, List[float]] = {}
+    for i in range(repeat):
+        random.seed(i)
+        gc.collect()
+        metrics = crossplat_loop_run(
+            case.run(**case.kwargs), loop_factory=case.loop_factory)
+        for metric, value in metrics.items():
+            samples.setdefault(metric, []).append(value)
+    return {metric: statistics.median(values)
+            for metric, values in samples.items()}
+
+
+def higher_is_better(metric: str) -> bool:
+    """Whether a greater value of a metric is an improvement."""
+    return metric.endswith('_per_s')
+
+
+def compare(results: Results, baseline: Results,
+            tolerance: float) -> List[Tuple[str, str, float, float, bool]]:
+    """Compare results to a baseline.
+
+    Returns:
+        A `(case, metric, baseline value, value, regressed)` tuple for each
+        metric found in both.
+
+    """
+    rows = []
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(case, {}).get(metric)
+            if old is None:
+                continue
+            change = (value - old) / old if old else 0.0
+            if higher_is_better(metric):
+                change = -change
+            rows.append((case, metric, old, value, change > tolerance))
+    return rows
+
+
+def host_info() -> Dict[str, Any]:
+    """Describe where the results were measured."""
+    return {
+        'sublemon': __version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'uvloop': _uvloop_version(),
+    }
+
+
+def _uvloop_version() -> Optional[str]:
+    if not has_uvloop():
+        return None
+    import uvloop
+    return uvloop.__version__
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.suite',
+        description='Run the sublemon benchmark suite.')
+    parser.add_argument(
+        '--max-concurrency', type=int, nargs='+', default=[1, 25, 100],
+        help='concurrency limits to measure the spawn rate with')
+    parser.add_argument(
+        '--poll-delta', type=float, nargs='+', default=[0.001, 0.01],
+        help='poll intervals to measure completion latency with')
+    parser.add_argument(
+        '--loop', nargs='+', choices=['asyncio', 'uvloop'],
+        default=['asyncio', 'uvloop'],
+        help='kinds of event loop to measure the spawn rate and line '
+             'throughput on; uvloop is skipped if it is not installed')
+    parser.add_argument(
+        '--jobs', type=int, default=1000,
+        help='number of jobs per spawn rate run')
+    parser.add_argument(
+        '--lines', type=int, default=200,
+        help='lines written per job in line throughput runs')
+    parser.add_argument(
+        '--mib', type=int, default=64,
+        help='MiB of output in output throughput runs')
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='number of runs of each case to take the median of')
+    parser.add_argument(
+        '--filter', default='',
+        help='only run the cases whose names contain this')
+    parser.add_argument(
+        '--output', help='file to write the results to, as JSON')
+    parser.add_argument(
+        '--baseline', help='JSON results to compare against')
+    parser.add_argument(
+        '--save-baseline', help='file to write the results to as a baseline')
+    parser.add_argument(
+        '--tolerance', type=float, default=_DEFAULT_TOLERANCE,
+        help='fraction by which a metric may get worse before failing')
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    if 'uvloop' in args.loop and not has_uvloop():
+        print('note: uvloop is not installed; skipping its cases')
+        args.loop.remove('uvloop')
+
+    results: Results = {}
+    for case in make_cases(args):
+        if args.filter not in case.name:
+            continue
+        results[case.name] = metrics = run_case(case, args.repeat)
+        print('{}: {}'.format(case.name, ', '.join(
+            '{} {:.4g}'.format(m, v) for m, v in sorted(metrics.items()))))
+
+    report = {'host': host_info(), 'results': results}
+    for path in (args.output, args.save_baseline,):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+                f.write('\n')
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if any(baseline['host'].get(k) != v for k, v in report['host'].items()
+           if k != 'sublemon'):
+        print('warning: the baseline was measured on a different host: ' +
+              json.dumps(baseline['host']))
+
+    regressed = 0
+    for case, metric, old, new, is_worse in compare(
+            results, baseline['results'], args.tolerance):
+        print('{:<8} {} {}: {:.4g} -> {:.4g}'.format(
+            'WORSE' if is_worse else 'ok', case, metric, old, new))
+        regressed += is_worse
+    if regressed:
+        print('{} metric(s) regressed by more than {:.0%}'.format(
+            regressed, args.tolerance))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -25,7 +25,9 @@ setup(
     url='https://github.com/welchbj/sublemon',
     license='MIT',
     install_requires=['aiostream'],
-    packages=find_packages(exclude=['tests', '*.tests', '*.tests.*']),
+    extras_require={'uvloop': ['uvloop']},
+    packages=find_packages(exclude=[
+        'benchmarks', 'benchmarks.*', 'tests', '*.tests', '*.tests.*']),
     include_package_data=True,
     classifiers=[
         'Environment :: Console',
@@ -1,11 +1,40 @@
+from .cache import (  # noqa
+    CommandResult,
+    ResultCache)
 from .errors import (  # noqa
+    SublemonCancelledError,
     SublemonError,
-    SublemonRuntimeError)
+    SublemonRuntimeError,
+    SublemonTimeoutError)
+from .filters import OutputFilter  # noqa
+from .graph import JobGraph  # noqa
+from .hooks import SublemonHooks  # noqa
+from .launchers import (  # noqa
+    AsyncioLauncher,
+    BatchLauncher,
+    PosixSpawnLauncher,
+    ResourceUsage,
+    SublemonLauncher,
+    WorkerPoolLauncher)
+from .metrics import (  # noqa
+    Histogram,
+    SublemonMetrics)
+from .multiplex import OutputLine  # noqa
+from .results import RunResult  # noqa
+from .retry import (  # noqa
+    Attempt,
+    RetryPolicy)
 from .runtime import Sublemon  # noqa
+from .sharding import (  # noqa
+    ShardedSublemon,
+    ShardResult)
 from .subprocess import SublemonSubprocess  # noqa
+from .sync import SyncSublemon  # noqa
 from .utils import (  # noqa
     amerge,
-    crossplat_loop_run)
+    crossplat_loop_run,
+    has_uvloop,
+    new_event_loop)
 
 # expose library version info
 from .version import __version__ as _version, __version_info__ as _version_info
@@ -0,0 +1,177 @@
+"""Worker side of the shards of a `ShardedSublemon`.
+
+Each shard runs its own `Sublemon` on its own event loop, either in a thread
+of the front end's process or in a child process running `main`. Process
+shards talk to the front end over their stdin and stdout, which are moved out
+of the way of the commands they run, and are passed the name of the kind of
+event loop to run (see `new_event_loop`) as their only argument, if any.
+
+Each frame is a four-byte big-endian payload length and a pickled payload.
+The first frame sent to a process shard holds the kwargs of its `Sublemon`;
+every later one is a request:
+
+* `('run', opts, jobs)` - run each `(job_id, cmd)` in `jobs`, with the
+  `run_many` kwargs in `opts`
+* `('cancel', job_ids)` - cancel the jobs with these ids
+
+Shards answer with lists of results, one `(job_id, *fields)` tuple per
+finished job, where the fields are those of a `ShardResult` after its `cmd`
+and `shard`. Closing the shard's stdin stops it, terminating whatever it is
+still running.
+
+"""
+
+import asyncio
+import os
+import pickle
+import struct
+import sys
+
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Tuple)
+
+from sublemon.errors import SublemonCancelledError
+from sublemon.results import make_result
+from sublemon.runtime import (
+    _run_to_eof,
+    Sublemon)
+from sublemon.subprocess import SublemonSubprocess
+from sublemon.utils import crossplat_loop_run
+
+HEADER = struct.Struct('!I')
+
+
+def frame(msg: Any) -> bytes:
+    """Pickle a message into a frame."""
+    payload = pickle.dumps(msg, pickle.HIGHEST_PROTOCOL)
+    return HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Any:
+    """Coroutine to read and unpickle the next frame of a stream.
+
+    Raises:
+        asyncio.IncompleteReadError: If the stream ends first.
+
+    """
+    size, = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return pickle.loads(await reader.readexactly(size))
+
+
+def failed(job_id: int, opts: Dict[str, Any],
+           error: Exception) -> Tuple[Any, ...]:
+    """The result of a job that never ran, because of `error`."""
+    empty: Any = '' if opts['encoding'] is not None else b''
+    return (job_id, None, empty, empty, False, False, 0.0, None, error)
+
+
+class ShardServer:
+
+    """Runs the jobs sent to a shard, and batches up their results.
+
+    Results are handed to `send` at most once per iteration of the shard's
+    event loop, however many jobs finished during it.
+
+    """
+
+    def __init__(self, server: Sublemon,
+                 send: Callable[[List[Tuple[Any, ...]]], None]) -> None:
+        self._server = server
+        self._send = send
+        self._running: Dict[int, SublemonSubprocess] = {}
+        self._outbox: List[Tuple[Any, ...]] = []
+
+    def handle(self, msg: Tuple[Any, ...]) -> None:
+        """Act on a request from the front end."""
+        if msg[0] == 'run':
+            _, opts, jobs = msg
+            for job_id, cmd in jobs:
+                try:
+                    sp = SublemonSubprocess(
+                        self._server, cmd,
+                        output_policy='capture',
+                        output_limit=opts['max_output'],
+                        timeout=opts['timeout'])
+                except Exception as e:
+                    self._put(failed(job_id, opts, e))
+                    continue
+                fut = sp._queue(_run_to_eof(sp))
+                fut.add_done_callback(partial(self._done, job_id, opts, sp))
+                self._running[job_id] = sp
+        elif msg[0] == 'cancel':
+            for job_id in msg[1]:
+                job = self._running.get(job_id)
+                if job is not None:
+                    job.cancel()
+
+    def cancel_all(self) -> None:
+        """Cancel every job that has not finished yet."""
+        for sp in list(self._running.values()):
+            sp.cancel()
+
+    def _done(self, job_id: int, opts: Dict[str, Any],
+              sp: SublemonSubprocess, fut: asyncio.Future) -> None:
+        del self._running[job_id]
+        if fut.cancelled():
+            # cancelled before its spawn task got to run
+            self._put(failed(job_id, opts, SublemonCancelledError(
+                'Subprocess was cancelled before it started')))
+            return
+
+        result = make_result(sp, opts['encoding'], opts['errors'])
+        self._put((job_id,) + tuple(result[1:]))
+
+    def _put(self, result: Tuple[Any, ...]) -> None:
+        if not self._outbox:
+            asyncio.get_event_loop().call_soon(self._flush)
+        self._outbox.append(result)
+
+    def _flush(self) -> None:
+        batch, self._outbox = self._outbox, []
+        self._send(batch)
+
+
+async def _serve(channel_in: int, channel_out: int) -> None:
+    """Coroutine to serve the front end of a process shard."""
+    loop = asyncio.get_event_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader),
+        os.fdopen(channel_in, 'rb', 0))
+    transport, protocol = await loop.connect_write_pipe(
+        asyncio.Protocol, os.fdopen(channel_out, 'wb', 0))
+
+    kwargs = await read_frame(reader)
+    server = Sublemon(**kwargs)
+    await server.start()
+    shard = ShardServer(server, lambda batch: transport.write(frame(batch)))
+    try:
+        while True:
+            shard.handle(await read_frame(reader))
+    except asyncio.IncompleteReadError:
+        pass
+    finally:
+        shard.cancel_all()
+        await server.stop('terminate')
+        transport.close()
+
+
+def main() -> None:
+    """Run a process shard over this process's stdin and stdout."""
+    # the commands run by this shard inherit its stdin and stdout, so the
+    # front end's channel is moved to other fds first
+    channel_in = os.dup(0)
+    channel_out = os.dup(1)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(2, 1)
+    os.close(devnull)
+    sys.stdout = sys.stderr
+    # the kind of event loop to run, if not the default, is passed by name
+    crossplat_loop_run(_serve(channel_in, channel_out),
+                       loop_factory=sys.argv[1] if len(sys.argv) > 1 else None)
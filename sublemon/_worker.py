@@ -0,0 +1,273 @@
+"""Helper process for the `pool` launcher of `sublemon`.
+
+This file is run directly by path as a long-lived worker process, so it must
+only depend on the standard library. It reads framed requests from its stdin,
+runs one command at a time, and streams framed events back over its stdout.
+
+Each frame is a one-byte kind, a four-byte big-endian payload length, and the
+payload. Requests are:
+
+* `r` - run the command in the JSON payload (a string for the shell, or an
+  argv list)
+* `s` - send the signal in the JSON payload to the running command
+
+Events are:
+
+* `p` - the command was started, with a JSON payload holding its `pid` (or
+  the `errno` and `message` of the error that prevented it from starting)
+* `o` / `e` - raw stdout / stderr data from the command
+* `O` / `E` - the command's stdout / stderr reached EOF
+* `x` - the command exited, with its `returncode` in the JSON payload (and
+  its `rusage`, as `[user time, system time, max RSS]`, where available)
+* `d` - the worker is done with the command and ready for another
+
+"""
+
+import json
+import os
+import selectors
+import struct
+import subprocess
+
+from typing import (
+    Dict,
+    IO,
+    List,
+    Optional,
+    Tuple)
+
+HEADER = struct.Struct('!cI')
+
+_READ_SIZE = 2 ** 16
+_MAX_OUTBOX = 2 ** 18
+_POLL_INTERVAL = 0.01
+
+
+class _Job:
+
+    """A command being run by this worker."""
+
+    def __init__(self, proc: subprocess.Popen) -> None:
+        self.proc = proc
+        stdout: IO[bytes] = proc.stdout  # type: ignore
+        stderr: IO[bytes] = proc.stderr  # type: ignore
+        self.pipes: Dict[int, Tuple[IO[bytes], bytes, bytes]] = {
+            stdout.fileno(): (stdout, b'o', b'O',),
+            stderr.fileno(): (stderr, b'e', b'E',),
+        }
+        for fd in self.pipes:
+            os.set_blocking(fd, False)
+        self.pidfd: Optional[int] = None
+        if hasattr(os, 'pidfd_open'):
+            try:
+                self.pidfd = os.pidfd_open(proc.pid)
+            except OSError:
+                pass
+        self.exited = False
+        self.rusage: Optional[List[float]] = None
+
+
+class _Worker:
+
+    """Event loop of the worker process."""
+
+    def __init__(self) -> None:
+        self._selector = selectors.DefaultSelector()
+        self._registered: Dict[int, Tuple[int, str]] = {}
+        self._inbox = bytearray()
+        self._outbox = bytearray()
+        self._job: Optional[_Job] = None
+        self._running = True
+
+    def run(self) -> None:
+        while self._running or self._outbox:
+            self._update_interest()
+            timeout = None
+            if (self._job is not None and self._job.pidfd is None and
+                    not self._job.exited):
+                timeout = _POLL_INTERVAL
+            for key, _ in self._selector.select(timeout):
+                self._on_ready(key.fd, key.data)
+            if self._job is not None:
+                self._check_exit()
+
+    def _update_interest(self) -> None:
+        """Register exactly the file descriptors we want to hear about."""
+        wanted: Dict[int, Tuple[int, str]] = {}
+        if self._running:
+            wanted[0] = (selectors.EVENT_READ, 'requests')
+        if self._outbox:
+            wanted[1] = (selectors.EVENT_WRITE, 'events')
+        if self._job is not None:
+            if len(self._outbox) < _MAX_OUTBOX:
+                for fd in self._job.pipes:
+                    wanted[fd] = (selectors.EVENT_READ, 'pipe')
+            if self._job.pidfd is not None and not self._job.exited:
+                wanted[self._job.pidfd] = (selectors.EVENT_READ, 'exit')
+
+        for fd in list(self._registered):
+            if self._registered[fd] != wanted.get(fd):
+                self._selector.unregister(fd)
+                del self._registered[fd]
+        for fd, (events, data) in wanted.items():
+            if fd not in self._registered:
+                self._selector.register(fd, events, data)
+                self._registered[fd] = (events, data)
+
+    def _forget(self, fd: int) -> None:
+        """Unregister a file descriptor that is about to be closed."""
+        if fd in self._registered:
+            self._selector.unregister(fd)
+            del self._registered[fd]
+
+    def _on_ready(self, fd: int, what: str) -> None:
+        if what == 'requests':
+            data = os.read(0, _READ_SIZE)
+            if not data:
+                self._shutdown()
+                return
+            self._inbox.extend(data)
+            self._handle_requests()
+        elif what == 'events':
+            written = os.write(1, self._outbox)
+            del self._outbox[:written]
+        elif self._job is None:
+            # stale readiness for a job that has already finished
+            return
+        elif what == 'pipe' and fd in self._job.pipes:
+            try:
+                self._on_pipe_readable(fd)
+            except BlockingIOError:
+                pass
+        elif what == 'exit':
+            self._check_exit()
+
+    def _on_pipe_readable(self, fd: int) -> None:
+        job: _Job = self._job  # type: ignore
+        pipe, data_kind, eof_kind = job.pipes[fd]
+        data = os.read(fd, _READ_SIZE)
+        if data:
+            self._send(data_kind, data)
+        else:
+            self._forget(fd)
+            pipe.close()
+            del job.pipes[fd]
+            self._send(eof_kind, b'')
+
+    def _handle_requests(self) -> None:
+        while len(self._inbox) >= HEADER.size:
+            kind, length = HEADER.unpack_from(self._inbox)
+            if len(self._inbox) < HEADER.size + length:
+                return
+            payload = json.loads(
+                bytes(self._inbox[HEADER.size:HEADER.size + length]))
+            del self._inbox[:HEADER.size + length]
+
+            if kind == b'r':
+                self._start(payload['cmd'])
+            elif kind == b's':
+                self._signal(payload['signal'])
+
+    def _start(self, cmd) -> None:
+        try:
+            proc = subprocess.Popen(
+                cmd,
+                shell=isinstance(cmd, str),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                start_new_session=True)
+        except OSError as e:
+            self._send_json(b'p', {'errno': e.errno, 'message': e.strerror})
+            self._send(b'd', b'')
+            return
+
+        self._job = _Job(proc)
+        self._send_json(b'p', {'pid': proc.pid})
+
+    def _signal(self, sig: int) -> None:
+        if self._job is not None and not self._job.exited:
+            try:
+                os.killpg(self._job.proc.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def _check_exit(self) -> None:
+        job: _Job = self._job  # type: ignore
+        if not job.exited and _reap(job):
+            job.exited = True
+            if job.pidfd is not None:
+                self._forget(job.pidfd)
+                os.close(job.pidfd)
+                job.pidfd = None
+            self._send_json(b'x', {
+                'returncode': job.proc.returncode,
+                'rusage': job.rusage,
+            })
+
+        if job.exited:
+            # pick up whatever output is left, without waiting on any
+            # grandchildren that may be holding the pipes open
+            for fd in list(job.pipes):
+                drained = 0
+                try:
+                    while fd in job.pipes and drained < _MAX_OUTBOX:
+                        drained += _READ_SIZE
+                        self._on_pipe_readable(fd)
+                except BlockingIOError:
+                    pass
+                if fd in job.pipes:
+                    pipe, _, eof_kind = job.pipes.pop(fd)
+                    self._forget(fd)
+                    pipe.close()
+                    self._send(eof_kind, b'')
+            self._job = None
+            self._send(b'd', b'')
+
+    def _send(self, kind: bytes, payload: bytes) -> None:
+        self._outbox.extend(HEADER.pack(kind, len(payload)))
+        self._outbox.extend(payload)
+
+    def _send_json(self, kind: bytes, obj: dict) -> None:
+        self._send(kind, json.dumps(obj).encode('utf-8'))
+
+    def _shutdown(self) -> None:
+        """Stop accepting requests; the parent has gone away."""
+        self._running = False
+        if self._job is not None and not self._job.exited:
+            self._job.proc.kill()
+            self._job.proc.wait()
+        self._job = None
+
+
+def _reap(job: _Job) -> bool:
+    """Check whether a job's command has exited, reaping it if so.
+
+    Where possible, the command is reaped via `wait4`, which also reports
+    its resource usage.
+
+    """
+    proc = job.proc
+    if proc.returncode is None and hasattr(os, 'wait4'):
+        try:
+            pid, status, ru = os.wait4(proc.pid, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid:
+            proc.returncode = (-os.WTERMSIG(status)
+                               if os.WIFSIGNALED(status) else
+                               os.WEXITSTATUS(status))
+            job.rusage = [ru.ru_utime, ru.ru_stime, ru.ru_maxrss]
+    return proc.poll() is not None
+
+
+def main() -> None:
+    worker = _Worker()
+    try:
+        worker.run()
+    except BrokenPipeError:
+        pass
+
+
+if __name__ == '__main__':
+    main()
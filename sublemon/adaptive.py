@@ -0,0 +1,218 @@
+"""Adaptive concurrency control based on host metrics and job latency."""
+
+import os
+import sys
+
+from typing import (
+    Dict,
+    List,
+    Optional)
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore
+
+# file descriptors held by the runtime for each running subprocess
+_FDS_PER_JOB: int = 2
+
+# file descriptors left alone for the rest of the program
+_FD_RESERVE: int = 64
+
+_DECREASE_FACTOR: float = 0.75
+_LATENCY_ALPHA: float = 0.2
+
+
+class AdaptiveConcurrency:
+
+    """Additive-increase, multiplicative-decrease controller of a limit.
+
+    Every time `adjust` is called, the host's load average, available memory
+    and open file descriptors are sampled, along with the latency of jobs
+    that completed since the last adjustment. If the host looks congested,
+    the limit is cut multiplicatively; if it is healthy and the limit is the
+    bottleneck, the limit grows by one. The limit is always kept within
+    `[floor, ceiling]`, and never allowed to grow to a value that could run
+    the process out of file descriptors under `RLIMIT_NOFILE`.
+
+    Args:
+        limit: The initial limit.
+        floor: The lowest the limit may go (file descriptor permitting).
+        ceiling: The highest the limit may go.
+        max_load: The max 1-minute load average per CPU before the host is
+            considered congested.
+        min_free_memory: The min fraction of memory that must be available
+            before the host is considered congested.
+        max_latency_ratio: How many times slower than the best observed
+            (smoothed) latency jobs may get before the host is considered
+            congested.
+
+    """
+
+    def __init__(self, limit: int, floor: int, ceiling: int,
+                 max_load: float=1.5, min_free_memory: float=0.1,
+                 max_latency_ratio: float=2.0) -> None:
+        self._floor = floor
+        self._ceiling = ceiling
+        self._limit = min(max(limit, floor), ceiling)
+        self._max_load = max_load
+        self._min_free_memory = min_free_memory
+        self._max_latency_ratio = max_latency_ratio
+
+        self._latencies: List[float] = []
+        self._latency: Optional[float] = None
+        self._best_latency: Optional[float] = None
+        self._metrics: Dict[str, Optional[float]] = {}
+
+    @property
+    def limit(self) -> int:
+        """The current limit."""
+        return self._limit
+
+    @property
+    def floor(self) -> int:
+        """The lowest the limit may go."""
+        return self._floor
+
+    @property
+    def ceiling(self) -> int:
+        """The highest the limit may go."""
+        return self._ceiling
+
+    @property
+    def metrics(self) -> Dict[str, Optional[float]]:
+        """The latest sampled metrics and the current limit.
+
+        Metrics that cannot be sampled on this platform are `None`.
+
+        """
+        metrics = dict(self._metrics)
+        metrics.update(
+            limit=self._limit,
+            floor=self._floor,
+            ceiling=self._ceiling,
+            latency=self._latency)
+        return metrics
+
+    def record_latency(self, seconds: float) -> None:
+        """Record how long a completed job took to run."""
+        self._latencies.append(seconds)
+
+    def adjust(self, running: int, pending: int) -> int:
+        """Sample the host and move the limit accordingly.
+
+        Args:
+            running: The number of jobs currently running.
+            pending: The number of jobs waiting to run.
+
+        Returns:
+            The new limit.
+
+        """
+        load = _load_per_cpu()
+        free_memory = _free_memory()
+        open_fds = _open_fds()
+        nofile = _nofile_limit()
+        self._metrics = {
+            'load_per_cpu': load,
+            'free_memory': free_memory,
+            'open_fds': open_fds,
+            'nofile_limit': nofile,
+        }
+
+        latency_ratio = self._update_latency()
+        congested = (
+            (load is not None and load > self._max_load) or
+            (free_memory is not None and
+             free_memory < self._min_free_memory) or
+            (latency_ratio is not None and
+             latency_ratio > self._max_latency_ratio))
+
+        limit = self._limit
+        if congested:
+            limit = int(limit * _DECREASE_FACTOR)
+        elif pending and running >= limit:
+            limit += 1
+        limit = min(max(limit, self._floor), self._ceiling)
+
+        if nofile is not None:
+            in_use = open_fds if open_fds is not None else (
+                running * _FDS_PER_JOB)
+            spare = nofile - _FD_RESERVE - in_use
+            fd_cap = running + max(spare, 0) // _FDS_PER_JOB
+            self._metrics['fd_cap'] = fd_cap
+            limit = min(limit, fd_cap)
+
+        self._limit = max(limit, 1)
+        return self._limit
+
+    def _update_latency(self) -> Optional[float]:
+        """Fold recent latencies into the smoothed latency.
+
+        Returns:
+            The ratio of the smoothed latency to the best smoothed latency
+            seen so far, or `None` if no jobs have completed yet.
+
+        """
+        if self._latencies:
+            mean = sum(self._latencies) / len(self._latencies)
+            self._latencies.clear()
+            if self._latency is None:
+                self._latency = mean
+            else:
+                self._latency += _LATENCY_ALPHA * (mean - self._latency)
+            if (self._best_latency is None or
+                    self._latency < self._best_latency):
+                self._best_latency = self._latency
+
+        if self._latency is None or not self._best_latency:
+            return None
+        return self._latency / self._best_latency
+
+
+def _load_per_cpu() -> Optional[float]:
+    """Get the 1-minute load average per CPU."""
+    if not hasattr(os, 'getloadavg'):
+        return None
+    try:
+        load = os.getloadavg()[0]
+    except OSError:
+        return None
+    return load / (os.cpu_count() or 1)
+
+
+def _free_memory() -> Optional[float]:
+    """Get the fraction of physical memory that is available."""
+    try:
+        with open('/proc/meminfo') as f:
+            meminfo = dict(line.split(':', 1) for line in f)
+        total = int(meminfo['MemTotal'].split()[0])
+        available = int(meminfo['MemAvailable'].split()[0])
+        return available / total
+    except (OSError, KeyError, ValueError):
+        pass
+
+    try:
+        return (os.sysconf('SC_AVPHYS_PAGES') /
+                os.sysconf('SC_PHYS_PAGES'))
+    except (AttributeError, OSError, ValueError, ZeroDivisionError):
+        return None
+
+
+def _open_fds() -> Optional[int]:
+    """Get the number of file descriptors this process has open."""
+    fd_dir = '/proc/self/fd' if sys.platform.startswith('linux') else '/dev/fd'
+    try:
+        return len(os.listdir(fd_dir))
+    except OSError:
+        return None
+
+
+def _nofile_limit() -> Optional[int]:
+    """Get the soft `RLIMIT_NOFILE` of this process."""
+    if resource is None:
+        return None
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return None
+    return soft
@@ -0,0 +1,266 @@
+"""Caching of the results of deterministic commands."""
+
+import asyncio
+import collections
+import hashlib
+import json
+import os
+import struct
+import tempfile
+
+from typing import (
+    Iterable,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union)
+
+_DEFAULT_ME: int = 256
+_DEFAULT_MDB: int = 2 ** 30
+
+_HEADER = struct.Struct('!iQ')
+_DIGEST_READ_SIZE = 2 ** 20
+
+
+class CommandResult(NamedTuple):
+
+    """The exit code and captured output of a command."""
+
+    exit_code: int
+    stdout: bytes
+    stderr: bytes
+    cached: bool = False
+
+
+class ResultCache:
+
+    """Two-tier cache of the results of deterministic commands.
+
+    Results are keyed on the command, the working directory and environment
+    it runs with, and the contents of any input files it depends on (see
+    `key`). The most recently used results are kept in memory; if a
+    `directory` is specified, all results are also stored on disk, where the
+    least recently used ones are evicted once their total size exceeds
+    `max_disk_bytes`.
+
+    Args:
+        max_entries: The max number of results kept in memory.
+        directory: The directory to store results on disk in, if any. It is
+            created if it does not exist, and may be shared by multiple
+            caches over time (but not at the same time).
+        max_disk_bytes: The max total size of the results stored on disk.
+
+    """
+
+    def __init__(self, max_entries: int=_DEFAULT_ME,
+                 directory: Optional[str]=None,
+                 max_disk_bytes: int=_DEFAULT_MDB) -> None:
+        self._max_entries = max_entries
+        self._directory = directory
+        self._max_disk_bytes = max_disk_bytes
+        self._memory: 'collections.OrderedDict[str, CommandResult]' = (
+            collections.OrderedDict())
+        self._disk: 'collections.OrderedDict[str, int]' = (
+            collections.OrderedDict())
+        self._disk_bytes = 0
+        self._hits = 0
+        self._misses = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            entries = []
+            for entry in os.scandir(directory):
+                if entry.is_file() and not entry.name.startswith('.'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name, stat.st_size,))
+            for _, key, size in sorted(entries):
+                self._disk[key] = size
+                self._disk_bytes += size
+
+    def __len__(self) -> int:
+        return len(self._memory.keys() | self._disk.keys())
+
+    @staticmethod
+    def key(cmd: Union[str, Sequence[str]],
+            input_digests: Iterable[Tuple[str, str]]=()) -> str:
+        """Compute the cache key of a command.
+
+        Args:
+            cmd: The shell command or argv.
+            input_digests: `(path, digest)` pairs of the input files the
+                command depends on, as returned by `digest_inputs`.
+
+        Returns:
+            A hex digest identifying the command, the current working
+            directory and environment, and the input files.
+
+        """
+        material = json.dumps([
+            cmd if isinstance(cmd, str) else list(cmd),
+            os.getcwd(),
+            sorted(os.environ.items()),
+            sorted(input_digests),
+        ])
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[CommandResult]:
+        """Look up a result, marking it as recently used.
+
+        This blocks on reading from the disk tier; see `aget`.
+
+        """
+        result = self._memory.get(key)
+        if result is None and key in self._disk:
+            result = self._loaded(key, _read_entry(self._path(key)))
+        return self._looked_up(key, result)
+
+    async def aget(self, key: str) -> Optional[CommandResult]:
+        """Coroutine to look up a result, reading from disk in an executor."""
+        result = self._memory.get(key)
+        if result is None and key in self._disk:
+            loaded = await asyncio.get_event_loop().run_in_executor(
+                None, _read_entry, self._path(key))
+            result = self._loaded(key, loaded)
+        return self._looked_up(key, result)
+
+    def put(self, key: str, result: CommandResult) -> None:
+        """Store a result in the cache.
+
+        This blocks on writing to the disk tier; see `aput`.
+
+        """
+        result = result._replace(cached=False)
+        self._remember(key, result)
+        if self._directory is not None:
+            self._stored(key, _write_entry(
+                self._directory, self._path(key), result))
+
+    async def aput(self, key: str, result: CommandResult) -> None:
+        """Coroutine to store a result, writing to disk in an executor."""
+        result = result._replace(cached=False)
+        self._remember(key, result)
+        if self._directory is not None:
+            size = await asyncio.get_event_loop().run_in_executor(
+                None, _write_entry, self._directory, self._path(key), result)
+            self._stored(key, size)
+
+    def clear(self) -> None:
+        """Remove all results from the cache, including those on disk."""
+        self._memory.clear()
+        for key in list(self._disk):
+            self._forget(key)
+
+    @property
+    def hits(self) -> int:
+        """The number of lookups that found a result."""
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """The number of lookups that did not find a result."""
+        return self._misses
+
+    @property
+    def disk_bytes(self) -> int:
+        """The total size of the results stored on disk."""
+        return self._disk_bytes
+
+    def _remember(self, key: str, result: CommandResult) -> None:
+        """Add a result to the memory tier, evicting the LRU results."""
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, key)  # type: ignore
+
+    def _looked_up(self, key: str,
+                   result: Optional[CommandResult]) -> Optional[CommandResult]:
+        """Count a lookup, marking the result found as recently used."""
+        if result is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+            self._remember(key, result)
+        return result
+
+    def _loaded(self, key: str,
+                result: Optional[CommandResult]) -> Optional[CommandResult]:
+        """Note a read from the disk tier, dropping unreadable results."""
+        if result is None:
+            self._forget(key)
+        elif key in self._disk:
+            self._disk.move_to_end(key)
+        return result
+
+    def _stored(self, key: str, size: int) -> None:
+        """Note a write to the disk tier, evicting the LRU results."""
+        self._disk_bytes += size - self._disk.pop(key, 0)
+        self._disk[key] = size
+        while self._disk_bytes > self._max_disk_bytes and self._disk:
+            self._forget(next(iter(self._disk)))
+
+    def _forget(self, key: str) -> None:
+        """Remove a result from the disk tier."""
+        self._disk_bytes -= self._disk.pop(key, 0)
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+def _read_entry(path: str) -> Optional[CommandResult]:
+    """Read a result from disk, if it can be read and is intact."""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        os.utime(path)
+    except OSError:
+        return None
+
+    if len(data) < _HEADER.size:
+        return None
+    exit_code, stdout_len = _HEADER.unpack_from(data)
+    stdout_end = _HEADER.size + stdout_len
+    if stdout_end > len(data):
+        return None
+    return CommandResult(
+        exit_code, data[_HEADER.size:stdout_end], data[stdout_end:])
+
+
+def _write_entry(directory: str, path: str, result: CommandResult) -> int:
+    """Write a result to disk, returning the size of its entry."""
+    fd, tmp_path = tempfile.mkstemp(prefix='.', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(result.exit_code, len(result.stdout)))
+            f.write(result.stdout)
+            f.write(result.stderr)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return _HEADER.size + len(result.stdout) + len(result.stderr)
+
+
+def digest_inputs(paths: Iterable[str]) -> Tuple[Tuple[str, str], ...]:
+    """Compute the `(path, digest)` pairs of input files for cache keys.
+
+    Files that do not exist get an empty digest, so that creating them
+    later changes the key.
+
+    """
+    digests = []
+    for path in paths:
+        sha = hashlib.sha256()
+        try:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(_DIGEST_READ_SIZE), b''):
+                    sha.update(block)
+            digest = sha.hexdigest()
+        except FileNotFoundError:
+            digest = ''
+        digests.append((os.path.abspath(path), digest,))
+    return tuple(digests)
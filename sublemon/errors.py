@@ -11,3 +11,11 @@ class SublemonRuntimeError(SublemonError):
 
 class SublemonLifetimeError(SublemonError):
     """Exception type for improper access of `sublemon` object attributes."""
+
+
+class SublemonTimeoutError(SublemonError):
+    """Exception type for subprocesses whose deadline passed before running."""
+
+
+class SublemonCancelledError(SublemonError):
+    """Exception type for subprocesses that were cancelled before running."""
@@ -0,0 +1,270 @@
+"""Filters applied to the raw output of subprocesses, line by line."""
+
+import re
+
+from collections import deque
+from typing import (
+    Deque,
+    List,
+    Optional,
+    Pattern,
+    Tuple,
+    Union)
+
+from sublemon.errors import SublemonRuntimeError
+
+# the start and end (just past its newline, if any) of a line in a block
+_Span = Tuple[int, int]
+
+# the max length of a line held back until its end is read
+_MAX_PARTIAL: int = 2 ** 20
+
+
+class OutputFilter:
+
+    """Declarative filter over the lines of a subprocess's output pipes.
+
+    Filters run on the raw chunks of output as they are read from the pipe,
+    before any of it is buffered, split into line objects, or decoded. The
+    chunks are searched in bulk, and only the lines that are kept get
+    copied out; output that is filtered away costs little more than the
+    search itself. Each pipe of a subprocess is filtered separately.
+
+    A line is kept if it contains a match of `pattern` and starts with
+    `prefix` (when given). Of those lines, every `sample`th one is kept
+    (starting with the first), of which the first `head` ones are kept,
+    of which the last `tail` ones are kept. Output after the `head` lines
+    is dropped without being searched. Lines kept by a `tail` are held back
+    until the pipe is closed. Lines longer than 1 MiB are filtered in
+    pieces of that size, each as if it were a line of its own.
+
+    Kept lines are passed on with their trailing newlines intact, so the
+    filtered output reads like the output of, e.g., `grep`. Hooks still see
+    all of the output, as it was read.
+
+    Args:
+        pattern: A regex, as `bytes` or compiled from `bytes`, that kept
+            lines contain a match of. It is searched with `re.MULTILINE`,
+            so `^` and `$` match at the start and end of each line.
+        prefix: The bytes that kept lines start with.
+        sample: Keep only one of every this many lines.
+        head: The max number of lines kept from the start of the output.
+        tail: The max number of lines kept from the end of the output.
+
+    """
+
+    def __init__(self, pattern: Optional[Union[bytes, Pattern[bytes]]]=None,
+                 prefix: Optional[bytes]=None,
+                 sample: int=1,
+                 head: Optional[int]=None,
+                 tail: Optional[int]=None) -> None:
+        if pattern is not None and not isinstance(pattern, bytes):
+            if not isinstance(getattr(pattern, 'pattern', None), bytes):
+                raise SublemonRuntimeError(
+                    'Invalid `pattern` kwarg received: `' + str(pattern) +
+                    '`')
+        if prefix is not None and not isinstance(prefix, bytes):
+            raise SublemonRuntimeError(
+                'Invalid `prefix` kwarg received: `' + str(prefix) + '`')
+        elif sample < 1:
+            raise SublemonRuntimeError(
+                'Invalid `sample` kwarg received: `' + str(sample) + '`')
+        elif head is not None and head < 0:
+            raise SublemonRuntimeError(
+                'Invalid `head` kwarg received: `' + str(head) + '`')
+        elif tail is not None and tail < 0:
+            raise SublemonRuntimeError(
+                'Invalid `tail` kwarg received: `' + str(tail) + '`')
+
+        self._pattern: Optional[Pattern[bytes]] = None
+        if isinstance(pattern, bytes):
+            self._pattern = re.compile(pattern, re.MULTILINE)
+        elif pattern is not None:
+            self._pattern = re.compile(
+                pattern.pattern, pattern.flags | re.MULTILINE)
+        self._prefix = prefix or None
+        self._sample = sample
+        self._head = head
+        self._tail = tail
+
+    def __repr__(self) -> str:
+        return '<OutputFilter [{}]>'.format(', '.join(
+            '{}={!r}'.format(name, value) for name, value in (
+                ('pattern', self.pattern,), ('prefix', self._prefix,),
+                ('sample', self._sample,), ('head', self._head,),
+                ('tail', self._tail,),)
+            if value is not None and not (name == 'sample' and value == 1)))
+
+    def apply(self, data: bytes) -> bytes:
+        """Filter all of the output of a pipe at once."""
+        state = self._start()
+        return state.feed(data) + state.flush()
+
+    def _start(self) -> '_LineFilter':
+        """Create the state of this filter for one pipe."""
+        return _LineFilter(self)
+
+    @property
+    def pattern(self) -> Optional[bytes]:
+        """The regex that kept lines contain a match of."""
+        return self._pattern.pattern if self._pattern is not None else None
+
+    @property
+    def prefix(self) -> Optional[bytes]:
+        """The bytes that kept lines start with."""
+        return self._prefix
+
+    @property
+    def sample(self) -> int:
+        """One of every how many lines is kept."""
+        return self._sample
+
+    @property
+    def head(self) -> Optional[int]:
+        """The max number of lines kept from the start of the output."""
+        return self._head
+
+    @property
+    def tail(self) -> Optional[int]:
+        """The max number of lines kept from the end of the output."""
+        return self._tail
+
+
+class _LineFilter:
+
+    """The state of an `OutputFilter` over the output of one pipe."""
+
+    def __init__(self, spec: OutputFilter) -> None:
+        self._pattern = spec._pattern
+        self._prefix = spec._prefix
+        self._sample = spec._sample
+        # how many lines to skip before the next sampled one
+        self._skip = 0
+        self._left = spec._head
+        self._kept: Optional[Deque[bytes]] = (
+            deque(maxlen=spec._tail) if spec._tail is not None else None)
+        # the start of a line whose end has not been read yet
+        self._partial = bytearray()
+
+    def feed(self, data: bytes) -> bytes:
+        """Filter a chunk of output, holding back any incomplete line."""
+        if self._left == 0:
+            return b''
+        cut = data.rfind(b'\n') + 1
+        out = b''
+        if cut:
+            block = data[:cut]
+            if self._partial:
+                block = bytes(self._partial) + block
+                self._partial = bytearray()
+            out = self._take(block)
+        self._partial += data[cut:]
+        if len(self._partial) >= _MAX_PARTIAL:
+            out += self._take_partial()
+        return out
+
+    def flush(self) -> bytes:
+        """Filter any incomplete last line, and release the tail."""
+        out = self._take_partial()
+        if self._kept is None:
+            return out
+        kept, self._kept = self._kept, None
+        return b''.join(kept)
+
+    def _take_partial(self) -> bytes:
+        """Filter the incomplete line held back as a line of its own."""
+        partial, self._partial = bytes(self._partial), bytearray()
+        if not partial or self._left == 0:
+            return b''
+        # matched as a line of its own, without gaining a newline
+        block = partial + b'\n'
+        spans = self._select(block)
+        if not spans:
+            return b''
+        out = block[spans[0][0]:-1]
+        if self._kept is not None:
+            self._kept.append(out)
+            return b''
+        return out
+
+    def _take(self, block: bytes) -> bytes:
+        """Filter a block of complete lines."""
+        if (self._pattern is None and self._prefix is None and
+                self._sample == 1 and self._left is None and
+                self._kept is None):
+            return block
+
+        spans = self._select(block)
+        if self._kept is not None:
+            self._kept.extend(block[start:end] for start, end in spans)
+            return b''
+        elif len(spans) == 1:
+            start, end = spans[0]
+            return block[start:end]
+        return b''.join(block[start:end] for start, end in spans)
+
+    def _select(self, block: bytes) -> List[_Span]:
+        """Pick out the lines of a block of complete lines to keep."""
+        if self._pattern is None and self._prefix is None:
+            spans = _line_spans(block, self._limit())
+        else:
+            spans = self._matches(block)
+
+        if self._sample > 1:
+            kept = spans[self._skip::self._sample]
+            self._skip = (self._skip - len(spans)) % self._sample
+            spans = kept
+        if self._left is not None:
+            spans = spans[:self._left]
+            self._left -= len(spans)
+        return spans
+
+    def _limit(self) -> Optional[int]:
+        """How many more lines could be kept, if there is a bound."""
+        if self._left is None:
+            return None
+        return self._skip + self._left * self._sample
+
+    def _matches(self, block: bytes) -> List[_Span]:
+        """Find the lines of a block that match the pattern and prefix."""
+        spans: List[_Span] = []
+        limit = self._limit()
+        pos = 0
+        while pos < len(block) and (limit is None or len(spans) < limit):
+            if self._prefix is not None:
+                if block.startswith(self._prefix, pos):
+                    start = pos
+                else:
+                    start = block.find(b'\n' + self._prefix, pos) + 1
+                    if not start:
+                        break
+                end = block.index(b'\n', start) + 1
+                if (self._pattern is not None and
+                        self._pattern.search(block, start, end - 1) is None):
+                    pos = end
+                    continue
+            else:
+                match = self._pattern.search(block, pos)  # type: ignore
+                if match is None:
+                    break
+                start = block.rfind(b'\n', pos, match.start()) + 1 or pos
+                end = block.index(b'\n', match.start()) + 1
+                if match.end() >= end and self._pattern.search(  # type: ignore
+                        block, start, end - 1) is None:
+                    # the match spanned lines, but the line alone doesn't
+                    pos = end
+                    continue
+            spans.append((start, end,))
+            pos = end
+        return spans
+
+
+def _line_spans(block: bytes, limit: Optional[int]) -> List[_Span]:
+    """Split a block of complete lines into (at most `limit`) spans."""
+    spans: List[_Span] = []
+    start = 0
+    while start < len(block) and (limit is None or len(spans) < limit):
+        end = block.index(b'\n', start) + 1
+        spans.append((start, end,))
+        start = end
+    return spans
@@ -0,0 +1,146 @@
+"""Graphs of commands that depend on one another."""
+
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Tuple)
+
+from sublemon.errors import SublemonRuntimeError
+from sublemon.subprocess import Command
+
+
+class _Job(NamedTuple):
+
+    """A command in a `JobGraph`, and what it needs to run."""
+
+    cmd: Command
+    deps: Tuple[str, ...]
+    cost: float
+    kwargs: Dict[str, Any]
+
+
+class JobGraph:
+
+    """A directed acyclic graph of named commands and their dependencies.
+
+    Jobs are added with `add`, naming the jobs they depend on, which may be
+    added before or after them. Run the graph with `Sublemon.run_graph`.
+
+    """
+
+    def __init__(self) -> None:
+        self._jobs: Dict[str, _Job] = {}
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._jobs
+
+    def add(self, name: str, cmd: Command, deps: Iterable[str]=(),
+            cost: float=1.0, **kwargs: Any) -> None:
+        """Add a job to this graph.
+
+        Args:
+            name: The unique name of the job.
+            cmd: The shell command or argv to run.
+            deps: The names of the jobs that must succeed before this one
+                can run.
+            cost: The relative cost (e.g., the expected run time) of the
+                job, used to find the critical path of the graph.
+            kwargs: Any other kwargs of `Sublemon.spawn` (e.g., `timeout`
+                or `retry`) to spawn the job with.
+
+        """
+        if name in self._jobs:
+            raise SublemonRuntimeError(
+                'Attempted to add duplicate job `' + str(name) + '`')
+        elif cost < 0:
+            raise SublemonRuntimeError(
+                'Invalid `cost` kwarg received: `' + str(cost) + '`')
+        self._jobs[name] = _Job(cmd, tuple(deps), cost, kwargs)
+
+    @property
+    def names(self) -> List[str]:
+        """The names of the jobs in this graph, in the order added."""
+        return list(self._jobs)
+
+    def deps(self, name: str) -> Tuple[str, ...]:
+        """The names of the jobs that a job depends on."""
+        return self._jobs[name].deps
+
+    def dependents(self) -> Dict[str, List[str]]:
+        """Map each job to the names of the jobs that depend on it.
+
+        Raises:
+            SublemonRuntimeError: If a job depends on one that is not in
+                this graph.
+
+        """
+        dependents: Dict[str, List[str]] = {name: [] for name in self._jobs}
+        for name, job in self._jobs.items():
+            for dep in job.deps:
+                if dep not in dependents:
+                    raise SublemonRuntimeError(
+                        'Job `' + str(name) + '` depends on unknown job `' +
+                        str(dep) + '`')
+                dependents[dep].append(name)
+        return dependents
+
+    def topological_order(self) -> List[str]:
+        """Order the jobs so that every job comes after its dependencies.
+
+        Raises:
+            SublemonRuntimeError: If a job depends on one that is not in
+                this graph, or the dependencies form a cycle.
+
+        """
+        dependents = self.dependents()
+        remaining = {name: len(job.deps) for name, job in self._jobs.items()}
+        order = [name for name, n in remaining.items() if not n]
+        for name in order:
+            for dependent in dependents[name]:
+                remaining[dependent] -= 1
+                if not remaining[dependent]:
+                    order.append(dependent)
+
+        if len(order) < len(self._jobs):
+            raise SublemonRuntimeError(
+                'Dependency cycle detected: ' + ' -> '.join(
+                    self._find_cycle({n for n, r in remaining.items() if r})))
+        return order
+
+    def critical_paths(self) -> Dict[str, float]:
+        """Map each job to the cost of the longest path of jobs it starts.
+
+        A job's critical path is its own cost plus that of the costliest
+        chain of jobs depending on it; jobs on the graph's critical path
+        have the longest ones, and delaying them delays the whole graph.
+
+        """
+        dependents = self.dependents()
+        paths: Dict[str, float] = {}
+        for name in reversed(self.topological_order()):
+            paths[name] = self._jobs[name].cost + max(
+                (paths[d] for d in dependents[name]), default=0.0)
+        return paths
+
+    def _find_cycle(self, blocked: Iterable[str]) -> List[str]:
+        """Find a dependency cycle among jobs stuck waiting on each other.
+
+        Every blocked job depends on at least one other blocked job, so
+        following such dependencies must eventually revisit a job.
+
+        """
+        blocked = set(blocked)
+        path: List[str] = []
+        seen: Dict[str, int] = {}
+        name = min(blocked)
+        while name not in seen:
+            seen[name] = len(path)
+            path.append(name)
+            name = next(d for d in self._jobs[name].deps if d in blocked)
+        return path[seen[name]:] + [name]
@@ -0,0 +1,43 @@
+"""Callbacks for observing the lifecycle of subprocesses."""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sublemon.subprocess import SublemonSubprocess  # noqa
+
+
+class SublemonHooks:
+
+    """Base type for observers of the lifecycle of subprocesses.
+
+    Subclasses override whichever of the callbacks below they are interested
+    in, and are passed to a `Sublemon` instance via its `hooks` kwarg. The
+    callbacks are called synchronously from the event loop, so they should
+    be quick, and must not raise.
+
+    A subprocess is queued and started once per attempt at running it (see
+    `RetryPolicy`), and exits once, when it is done. Subprocesses that never
+    ran (because they were cancelled, missed their deadline, or could not
+    be launched) exit with an `exit_code` of `None`, possibly without having
+    been queued. Output may still be read after a subprocess has exited,
+    until its pipes are closed.
+
+    """
+
+    def on_queued(self, sp: 'SublemonSubprocess') -> None:
+        """Called when a subprocess starts waiting for a slot."""
+
+    def on_started(self, sp: 'SublemonSubprocess') -> None:
+        """Called when a subprocess has been launched."""
+
+    def on_output(self, sp: 'SublemonSubprocess', stream: str,
+                  data: bytes) -> None:
+        """Called with each chunk of output read from `stdout` or `stderr`.
+
+        Output redirected away from Python (e.g., to the next stage of a
+        pipeline) is never seen here.
+
+        """
+
+    def on_exited(self, sp: 'SublemonSubprocess') -> None:
+        """Called when a subprocess is done."""
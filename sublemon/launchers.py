@@ -0,0 +1,1206 @@
+"""Backends for launching subprocesses onto the event loop."""
+
+import asyncio
+import errno
+import json
+import os
+import shlex
+import shutil
+import signal
+import sys
+import threading
+
+from collections import deque
+from contextlib import suppress
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union)
+
+from sublemon._worker import HEADER
+from sublemon.errors import SublemonRuntimeError
+from sublemon.filters import OutputFilter
+from sublemon.output import DEFAULT_LIMIT
+
+ProtocolFactory = Callable[[], asyncio.SubprocessProtocol]
+LaunchResult = Tuple[asyncio.SubprocessTransport, asyncio.SubprocessProtocol]
+# a command queued by a `BatchLauncher`, and the transport standing in for it
+_BatchJob = Tuple['_BatchTransport', Union[str, Sequence[str]]]
+
+PIPE = asyncio.subprocess.PIPE
+
+_HAS_POSIX_SPAWN = hasattr(os, 'posix_spawn')
+# signals Python ignores, which children should get the default handling of
+# (like `subprocess.Popen`'s `restore_signals`), so that, e.g., a pipeline
+# stage is killed by `SIGPIPE` once the stage it writes to has exited
+_RESTORED_SIGNALS = tuple(
+    getattr(signal, name) for name in ('SIGPIPE', 'SIGXFSZ',)
+    if hasattr(signal, name))
+_HAS_PIDFD = hasattr(os, 'pidfd_open')
+# reported for processes that were reaped by someone else
+_UNKNOWN_EXIT_CODE = 255
+_WORKER_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '_worker.py')
+# `ru_maxrss` is in kilobytes, except on macOS
+_MAXRSS_SCALE = 1 if sys.platform == 'darwin' else 1024
+
+_DEFAULT_BS = 64
+_DEFAULT_BD = 0.001
+# what a batch's shell runs for each of its commands; markers are written
+# once it has started, and once it has exited on both of its output pipes
+_BATCH_LINE = (
+    "( {cmd} ) </dev/null & "
+    "printf '\\n{token} s {index} %d\\n' $!; "
+    "wait $!; "
+    "printf '\\n{token} x {index} %d\\n' $?; "
+    "printf '\\n{token} e {index}\\n' >&2\n")
+
+
+class ResourceUsage(NamedTuple):
+
+    """The resources used by an exited subprocess, as reported by `wait4`.
+
+    Times are in seconds, and `max_rss` is in bytes. Descendants of the
+    subprocess are accounted for if it waited on them (like the commands
+    run by a shell), but not otherwise.
+
+    """
+
+    user_time: float
+    system_time: float
+    max_rss: int
+
+
+class SubprocessProtocol(asyncio.subprocess.SubprocessStreamProtocol):
+
+    """Stream protocol that reports process exit as soon as it happens.
+
+    The default protocol only wakes `Process.wait()` once the process has
+    exited *and* all of its pipes have been closed; this protocol instead
+    invokes a callback as soon as the launcher reports the exit. If given,
+    `on_output` is called with the fd and data of each chunk of output
+    before it is buffered, and `output_filter` is applied to what is then
+    buffered from each pipe.
+
+    """
+
+    # internals of `asyncio.subprocess.SubprocessStreamProtocol`
+    _loop: asyncio.AbstractEventLoop
+    _pipe_fds: List[int]
+
+    def __init__(
+            self,
+            loop: asyncio.AbstractEventLoop,
+            on_exit: Callable[[], None],
+            reader_factory: Callable[[int], asyncio.StreamReader],
+            on_output: Optional[Callable[[int, bytes], None]]=None,
+            output_filter: Optional[OutputFilter]=None
+    ) -> None:
+        super().__init__(limit=DEFAULT_LIMIT, loop=loop)
+        self._on_exit = on_exit
+        self._reader_factory = reader_factory
+        self._on_output = on_output
+        self._filters = ({fd: output_filter._start() for fd in (1, 2,)}
+                         if output_filter is not None else None)
+
+    def connection_made(self, transport) -> None:
+        self._transport = transport
+
+        stdout_transport = transport.get_pipe_transport(1)
+        if stdout_transport is not None:
+            self.stdout = self._reader_factory(1)
+            self.stdout.set_transport(stdout_transport)
+            self._pipe_fds.append(1)
+
+        stderr_transport = transport.get_pipe_transport(2)
+        if stderr_transport is not None:
+            self.stderr = self._reader_factory(2)
+            self.stderr.set_transport(stderr_transport)
+            self._pipe_fds.append(2)
+
+        stdin_transport = transport.get_pipe_transport(0)
+        if stdin_transport is not None:
+            self.stdin = asyncio.StreamWriter(
+                stdin_transport, protocol=self, reader=None, loop=self._loop)
+
+    def pipe_data_received(  # type: ignore
+            self, fd: int, data: bytes) -> None:
+        if self._on_output is not None:
+            self._on_output(fd, data)
+        if self._filters is not None:
+            data = self._filters[fd].feed(data)
+            if not data:
+                return
+        super().pipe_data_received(fd, data)
+
+    def pipe_connection_lost(self, fd: int,
+                             exc: Optional[Exception]) -> None:
+        if self._filters is not None and fd in self._filters:
+            data = self._filters.pop(fd).flush()
+            if data:
+                super().pipe_data_received(fd, data)
+        super().pipe_connection_lost(fd, exc)
+
+    def process_exited(self) -> None:
+        super().process_exited()
+        self._on_exit()
+
+
+class SublemonLauncher:
+
+    """Base type for strategies of launching subprocesses.
+
+    A launcher starts the process for a command with piped stdout and
+    stderr, in a process group of its own, and drives the protocol returned
+    by `protocol_factory` through the standard `asyncio.SubprocessProtocol`
+    callbacks.
+
+    The `stdin` and `stdout` kwargs of `launch` are only passed when a
+    subprocess's stdin or stdout is redirected, so launchers that do not
+    support redirection keep working for everything else.
+
+    """
+
+    name = 'base'
+
+    async def start(self, loop: asyncio.AbstractEventLoop,
+                    max_concurrency: int) -> None:
+        """Coroutine called when the owning `Sublemon` instance starts."""
+
+    async def stop(self) -> None:
+        """Coroutine called when the owning `Sublemon` instance stops."""
+
+    async def launch(self, loop: asyncio.AbstractEventLoop,
+                     protocol_factory: ProtocolFactory,
+                     cmd: Union[str, Sequence[str]],
+                     stdin: Optional[int]=None,
+                     stdout: int=PIPE) -> LaunchResult:
+        """Coroutine to launch a subprocess.
+
+        Args:
+            loop: The event loop to launch the subprocess onto.
+            protocol_factory: Callable returning the protocol that will
+                receive the subprocess's output and exit notification.
+            cmd: A shell command string, or an argv to execute directly.
+            stdin: A file descriptor to use as the subprocess's stdin,
+                `asyncio.subprocess.PIPE` to connect it to a pipe writable
+                through the protocol, or `None` to inherit ours.
+            stdout: A file descriptor to use as the subprocess's stdout, or
+                `asyncio.subprocess.PIPE` to read it through the protocol.
+
+        Returns:
+            The `(transport, protocol)` pair of the launched subprocess.
+
+        """
+        raise NotImplementedError
+
+
+class AsyncioLauncher(SublemonLauncher):
+
+    """Launcher using the event loop's own subprocess support."""
+
+    name = 'asyncio'
+
+    async def launch(self, loop: asyncio.AbstractEventLoop,
+                     protocol_factory: ProtocolFactory,
+                     cmd: Union[str, Sequence[str]],
+                     stdin: Optional[int]=None,
+                     stdout: int=PIPE) -> LaunchResult:
+        if isinstance(cmd, str):
+            return await loop.subprocess_shell(
+                protocol_factory,
+                cmd,
+                stdin=stdin,
+                stdout=stdout,
+                stderr=PIPE,
+                start_new_session=True)
+        return await loop.subprocess_exec(
+            protocol_factory,
+            *cmd,
+            stdin=stdin,
+            stdout=stdout,
+            stderr=PIPE,
+            start_new_session=True)
+
+
+class PosixSpawnLauncher(SublemonLauncher):
+
+    """Launcher using `os.posix_spawn`, wired into the event loop directly.
+
+    The C library implements `posix_spawn` with `vfork` (or an equivalent
+    `clone`), so the cost of launching a subprocess does not grow with the
+    size of the parent process the way a full `fork` does. Output pipes are
+    connected to the loop with `connect_read_pipe`, and the process exit is
+    watched with a pidfd where the platform supports it, falling back to a
+    thread blocking in `waitpid`.
+
+    """
+
+    name = 'posix_spawn'
+
+    def __init__(self) -> None:
+        if not _HAS_POSIX_SPAWN:
+            raise SublemonRuntimeError(
+                '`posix_spawn` launcher is not supported on this platform')
+
+    async def launch(self, loop: asyncio.AbstractEventLoop,
+                     protocol_factory: ProtocolFactory,
+                     cmd: Union[str, Sequence[str]],
+                     stdin: Optional[int]=None,
+                     stdout: int=PIPE) -> LaunchResult:
+        # our ends of the pipes, and the child's ends, by child fd
+        ours: Dict[int, int] = {}
+        theirs: Dict[int, int] = {}
+        file_actions = []
+        try:
+            if stdin == PIPE:
+                theirs[0], ours[0] = os.pipe()
+            elif stdin is not None:
+                file_actions.append((os.POSIX_SPAWN_DUP2, stdin, 0))
+            if stdout == PIPE:
+                ours[1], theirs[1] = os.pipe()
+            else:
+                file_actions.append((os.POSIX_SPAWN_DUP2, stdout, 1))
+            ours[2], theirs[2] = os.pipe()
+            file_actions.extend(
+                (os.POSIX_SPAWN_DUP2, fd, child_fd)
+                for child_fd, fd in theirs.items())
+
+            if isinstance(cmd, str):
+                pid = os.posix_spawn(
+                    '/bin/sh', ['/bin/sh', '-c', cmd], os.environ,
+                    file_actions=file_actions, setpgroup=0,
+                    setsigdef=_RESTORED_SIGNALS)
+            else:
+                pid = os.posix_spawnp(
+                    cmd[0], list(cmd), os.environ,
+                    file_actions=file_actions, setpgroup=0,
+                    setsigdef=_RESTORED_SIGNALS)
+        except BaseException:
+            for fd in ours.values():
+                os.close(fd)
+            raise
+        finally:
+            for fd in theirs.values():
+                os.close(fd)
+
+        protocol = protocol_factory()
+        transport = _PosixSpawnTransport(loop, protocol, pid)
+        try:
+            await transport._connect_pipes(ours)
+        except BaseException:
+            transport.close()
+            raise
+        return transport, protocol
+
+
+class WorkerPoolLauncher(SublemonLauncher):
+
+    """Launcher handing commands to a pool of pre-forked worker processes.
+
+    Each worker is a small, long-lived Python process (see
+    `sublemon._worker`) that receives commands over a pipe, runs them one at
+    a time, and streams their output and exit code back. Since workers fork
+    from a much smaller footprint than the parent process, launching a
+    command through the pool stays cheap as the parent grows.
+
+    By default the pool has one worker per slot of the owning `Sublemon`
+    instance's `max_concurrency`, all of which are started up front.
+
+    Note:
+        Commands run by a worker have their stdin connected to
+        `/dev/null` (and cannot be fed input, or piped into one another),
+        and inherit the environment and working directory that
+        the parent had when the pool was started. Output written by
+        grandchildren after the command itself has exited is dropped.
+
+    """
+
+    name = 'pool'
+
+    def __init__(self, size: Optional[int]=None) -> None:
+        self._size = size
+        self._pool_size = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._workers: List[_PoolWorker] = []
+        self._idle: Deque[_PoolWorker] = deque()
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def size(self) -> int:
+        """The number of workers this pool runs."""
+        return self._pool_size
+
+    async def start(self, loop: asyncio.AbstractEventLoop,
+                    max_concurrency: int) -> None:
+        self._loop = loop
+        self._pool_size = (self._size if self._size is not None else
+                           max_concurrency)
+        workers = await asyncio.gather(
+            *[self._add_worker() for _ in range(self._pool_size)])
+        self._idle.extend(workers)
+
+    async def stop(self) -> None:
+        workers, self._workers = self._workers, []
+        self._idle.clear()
+        for worker in workers:
+            worker.close()
+        await asyncio.gather(*[worker.wait_closed() for worker in workers])
+
+    async def launch(self, loop: asyncio.AbstractEventLoop,
+                     protocol_factory: ProtocolFactory,
+                     cmd: Union[str, Sequence[str]],
+                     stdin: Optional[int]=None,
+                     stdout: int=PIPE) -> LaunchResult:
+        if stdin is not None or stdout != PIPE:
+            raise SublemonRuntimeError(
+                'The `pool` launcher does not support redirecting the stdin '
+                'or stdout of commands')
+        worker = await self._acquire()
+        protocol = protocol_factory()
+        transport = _PoolTransport(loop, protocol, worker)
+        transport._connection_made()
+        worker.run(transport, cmd)
+        await transport._started
+        return transport, protocol
+
+    async def _add_worker(self) -> '_PoolWorker':
+        worker = _PoolWorker(self)
+        self._workers.append(worker)
+        try:
+            await worker.start(self._loop)  # type: ignore
+        except BaseException:
+            self._workers.remove(worker)
+            raise
+        return worker
+
+    async def _acquire(self) -> '_PoolWorker':
+        """Coroutine to get hold of an idle worker."""
+        if self._loop is None:
+            raise SublemonRuntimeError(
+                'Attempted to launch from a non-started worker pool')
+        elif self._idle:
+            return self._idle.popleft()
+        elif len(self._workers) < self._pool_size:
+            return await self._add_worker()
+
+        waiter = self._loop.create_future()
+        self._waiters.append(waiter)
+        return await waiter
+
+    def _release(self, worker: '_PoolWorker') -> None:
+        """Hand a worker that has become idle to the next launch."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(worker)
+                return
+        self._idle.append(worker)
+
+    def _discard(self, worker: '_PoolWorker') -> None:
+        """Forget about a worker that has died."""
+        if worker in self._workers:
+            self._workers.remove(worker)
+        if worker in self._idle:
+            self._idle.remove(worker)
+
+        # replace the dead worker for anyone waiting on one
+        if self._waiters and self._loop is not None:
+            async def replace() -> None:
+                self._release(await self._add_worker())
+            asyncio.ensure_future(replace())
+
+
+class BatchLauncher(SublemonLauncher):
+
+    """Launcher running batches of commands through one shell each.
+
+    Launching a process costs far more than running a trivial command like
+    `echo` or `test`. This launcher instead collects the commands launched
+    within `batch_delay` seconds of each other (up to `batch_size` of them)
+    and hands each such batch to a single `/bin/sh`, which runs them one
+    after another, each in a subshell of its own (a fork of the shell,
+    which runs builtins without executing any program at all). The shell
+    brackets the output of each command with framing markers, from which
+    their output, start, and exit code are demultiplexed into what looks to
+    the rest of `sublemon` like one subprocess per command.
+
+    Commands with redirected stdin or stdout (like those fed input, or
+    piped into one another) cannot share a shell, and are launched the
+    usual way instead.
+
+    Note:
+        Commands in a batch get `/dev/null` as their stdin, and share the
+        process group of the batch's shell, which `$$` also expands to. A
+        command counts as running once its turn in the batch comes, while
+        its slot is held from when it was launched. Terminating one of them
+        (e.g., once it runs out of time) only signals its own process, so
+        any processes it started may outlive it; output those processes
+        write after the command has exited goes to the next command in the
+        batch, or is dropped. An argv command whose program cannot be found
+        fails with a `FileNotFoundError`, as usual. No resource usage is
+        reported.
+
+    Args:
+        batch_size: The max number of commands run by each shell.
+        batch_delay: The max number of seconds a command waits for others
+            to batch it with.
+
+    """
+
+    name = 'batch'
+
+    def __init__(self, batch_size: int=_DEFAULT_BS,
+                 batch_delay: float=_DEFAULT_BD) -> None:
+        if batch_size < 1:
+            raise SublemonRuntimeError(
+                'Invalid `batch_size` kwarg received: `' + str(batch_size) +
+                '`')
+        elif batch_delay < 0:
+            raise SublemonRuntimeError(
+                'Invalid `batch_delay` kwarg received: `' + str(batch_delay) +
+                '`')
+
+        self._batch_size = batch_size
+        self._batch_delay = batch_delay
+        self._fallback = AsyncioLauncher()
+        # commands waiting for their batch to fill up
+        self._queue: List[_BatchJob] = []
+        self._timer: Optional[asyncio.Handle] = None
+        self._shells: Set['_BatchShell'] = set()
+
+    @property
+    def batch_size(self) -> int:
+        """The max number of commands run by each shell."""
+        return self._batch_size
+
+    @property
+    def batch_delay(self) -> float:
+        """The max number of seconds a command waits to be batched."""
+        return self._batch_delay
+
+    async def stop(self) -> None:
+        self._flush()
+        await asyncio.gather(
+            *[shell.wait_closed() for shell in list(self._shells)])
+
+    async def launch(self, loop: asyncio.AbstractEventLoop,
+                     protocol_factory: ProtocolFactory,
+                     cmd: Union[str, Sequence[str]],
+                     stdin: Optional[int]=None,
+                     stdout: int=PIPE) -> LaunchResult:
+        if stdin is not None or stdout != PIPE:
+            return await self._fallback.launch(
+                loop, protocol_factory, cmd, stdin=stdin, stdout=stdout)
+        elif not isinstance(cmd, str) and shutil.which(cmd[0]) is None:
+            raise FileNotFoundError(
+                errno.ENOENT, os.strerror(errno.ENOENT), cmd[0])
+
+        protocol = protocol_factory()
+        transport = _BatchTransport(loop, protocol)
+        transport._connection_made()
+        self._queue.append((transport, cmd,))
+        if len(self._queue) >= self._batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._batch_delay, self._flush)
+
+        try:
+            await transport._started
+        except asyncio.CancelledError:
+            transport._abandon()
+            self._queue = [
+                job for job in self._queue if job[0] is not transport]
+            raise
+        return transport, protocol
+
+    def _flush(self) -> None:
+        """Hand the queued commands to a new shell."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._queue:
+            return
+
+        jobs, self._queue = self._queue, []
+        shell = _BatchShell(self, jobs)
+        self._shells.add(shell)
+        asyncio.ensure_future(shell.start())
+
+    def _discard(self, shell: '_BatchShell') -> None:
+        self._shells.discard(shell)
+
+
+class _ReadPipeProtocol(asyncio.Protocol):
+
+    """Protocol forwarding data from one output pipe to its transport."""
+
+    def __init__(self, transport: '_PosixSpawnTransport', fd: int) -> None:
+        self._transport = transport
+        self._fd = fd
+
+    def data_received(self, data: bytes) -> None:
+        self._transport._pipe_data_received(self._fd, data)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self._transport._pipe_connection_lost(self._fd, exc)
+
+
+class _WritePipeProtocol(asyncio.BaseProtocol):
+
+    """Protocol relaying flow control of the stdin pipe to its transport."""
+
+    def __init__(self, transport: '_PosixSpawnTransport') -> None:
+        self._transport = transport
+
+    def pause_writing(self) -> None:
+        self._transport._protocol.pause_writing()
+
+    def resume_writing(self) -> None:
+        self._transport._protocol.resume_writing()
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self._transport._pipe_connection_lost(0, exc)
+
+
+class _LauncherTransport(asyncio.SubprocessTransport):
+
+    """Base transport for processes started by `sublemon`'s own launchers.
+
+    Protocol callbacks are held back until `_connection_made` is called, so
+    that output or an exit notification arriving while the launcher is still
+    wiring things up is not lost.
+
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop,
+                 protocol: asyncio.SubprocessProtocol) -> None:
+        super().__init__()
+        self._loop = loop
+        self._protocol = protocol
+        self._pid: Optional[int] = None
+        self._returncode: Optional[int] = None
+        self._rusage: Optional[ResourceUsage] = None
+        self._pipes: Dict[int, asyncio.BaseTransport] = {}
+        self._closed = False
+        self._exit_waiters: List[asyncio.Future] = []
+        self._pending_calls: Optional[Deque[Tuple[Callable, Tuple]]] = (
+            deque())
+
+    def _connection_made(self) -> None:
+        self._protocol.connection_made(self)
+        pending_calls, self._pending_calls = self._pending_calls, None
+        for callback, args in pending_calls:  # type: ignore
+            callback(*args)
+
+    def _call(self, callback: Callable, *args: Any) -> None:
+        if self._pending_calls is not None:
+            self._pending_calls.append((callback, args,))
+        else:
+            callback(*args)
+
+    def _pipe_data_received(self, fd: int, data: bytes) -> None:
+        self._call(self._protocol.pipe_data_received, fd, data)
+
+    def _pipe_connection_lost(self, fd: int,
+                              exc: Optional[Exception]) -> None:
+        self._call(self._protocol.pipe_connection_lost, fd, exc)
+
+    def _process_exited(self, returncode: int,
+                        rusage: Optional[ResourceUsage]=None) -> None:
+        self._returncode = returncode
+        self._rusage = rusage
+        self._call(self._protocol.process_exited)
+        for waiter in self._exit_waiters:
+            if not waiter.done():
+                waiter.set_result(returncode)
+        self._exit_waiters.clear()
+
+    async def _wait(self) -> int:
+        if self._returncode is not None:
+            return self._returncode
+        waiter = self._loop.create_future()
+        self._exit_waiters.append(waiter)
+        return await waiter
+
+    def get_pid(self) -> int:
+        return self._pid  # type: ignore
+
+    def get_returncode(self) -> Optional[int]:
+        return self._returncode
+
+    def get_pipe_transport(self, fd: int) -> Optional[asyncio.BaseTransport]:
+        return self._pipes.get(fd)
+
+    def terminate(self) -> None:
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self) -> None:
+        self.send_signal(signal.SIGKILL)
+
+    def is_closing(self) -> bool:
+        return self._closed
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for pipe in self._pipes.values():
+            pipe.close()
+        if self._returncode is None:
+            self.kill()
+
+
+class _PosixSpawnTransport(_LauncherTransport):
+
+    """Transport for a process started by the `PosixSpawnLauncher`."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop,
+                 protocol: asyncio.SubprocessProtocol, pid: int) -> None:
+        super().__init__(loop, protocol)
+        self._pid = pid
+        self._watch_exit()
+
+    async def _connect_pipes(self, fds: Dict[int, int]) -> None:
+        for fd, pipe_fd in fds.items():
+            transport: asyncio.BaseTransport
+            if fd == 0:
+                transport, _ = await self._loop.connect_write_pipe(
+                    lambda: _WritePipeProtocol(self),
+                    open(pipe_fd, 'wb', buffering=0))
+            else:
+                transport, _ = await self._loop.connect_read_pipe(
+                    lambda fd=fd: _ReadPipeProtocol(self, fd),  # type: ignore
+                    open(pipe_fd, 'rb', buffering=0))
+            self._pipes[fd] = transport
+        self._connection_made()
+
+    def _watch_exit(self) -> None:
+        """Arrange for `_process_exited` to be called when the process ends."""
+        pid: int = self._pid  # type: ignore
+        if _HAS_PIDFD:
+            try:
+                pidfd = os.pidfd_open(pid)
+            except OSError:
+                pass
+            else:
+                def on_readable() -> None:
+                    self._loop.remove_reader(pidfd)
+                    os.close(pidfd)
+                    self._process_exited(*_reap(pid))
+
+                self._loop.add_reader(pidfd, on_readable)
+                return
+
+        def wait_in_thread() -> None:
+            returncode, rusage = _reap(pid)
+            # the loop may have been closed while the process was running
+            with suppress(RuntimeError):
+                self._loop.call_soon_threadsafe(
+                    self._process_exited, returncode, rusage)
+
+        threading.Thread(target=wait_in_thread, daemon=True).start()
+
+    def send_signal(self, sig: int) -> None:
+        if self._returncode is None:
+            with suppress(ProcessLookupError):
+                os.kill(self._pid, sig)  # type: ignore
+
+
+class _WorkerProtocol(asyncio.SubprocessProtocol):
+
+    """Protocol decoding the event frames sent back by a pool worker."""
+
+    def __init__(self, worker: '_PoolWorker') -> None:
+        self._worker = worker
+        self._inbox = bytearray()
+
+    def pipe_data_received(self, fd: int, data: bytes) -> None:
+        inbox = self._inbox
+        inbox.extend(data)
+        offset = 0
+        while len(inbox) - offset >= HEADER.size:
+            kind, length = HEADER.unpack_from(inbox, offset)
+            end = offset + HEADER.size + length
+            if len(inbox) < end:
+                break
+            self._worker._on_frame(kind, bytes(inbox[end - length:end]))
+            offset = end
+        del inbox[:offset]
+
+    def process_exited(self) -> None:
+        self._worker._on_exit()
+
+
+class _PoolWorker:
+
+    """The parent's handle on one worker process of a `WorkerPoolLauncher`."""
+
+    def __init__(self, launcher: WorkerPoolLauncher) -> None:
+        self._launcher = launcher
+        self._transport: Optional[asyncio.SubprocessTransport] = None
+        self._job: Optional[_PoolTransport] = None
+        self._closed: Optional[asyncio.Future] = None
+
+    async def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._closed = loop.create_future()
+        self._transport, _ = await loop.subprocess_exec(
+            lambda: _WorkerProtocol(self),
+            sys.executable, '-I', '-S', _WORKER_PATH,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=None)
+
+    def run(self, job: '_PoolTransport', cmd: Union[str, Sequence[str]]):
+        """Hand a command to this worker."""
+        self._job = job
+        self.send(b'r', {'cmd': cmd if isinstance(cmd, str) else list(cmd)})
+
+    def send(self, kind: bytes, obj: Dict[str, Any]) -> None:
+        """Send a request frame to this worker."""
+        if self._transport is None or self._transport.is_closing():
+            return
+        payload = json.dumps(obj).encode('utf-8')
+        stdin: asyncio.WriteTransport = (
+            self._transport.get_pipe_transport(0))  # type: ignore
+        stdin.write(HEADER.pack(kind, len(payload)) + payload)
+
+    def pause_reading(self) -> None:
+        if self._transport is not None:
+            stdout: asyncio.ReadTransport = (
+                self._transport.get_pipe_transport(1))  # type: ignore
+            stdout.pause_reading()
+
+    def resume_reading(self) -> None:
+        if self._transport is not None:
+            stdout: asyncio.ReadTransport = (
+                self._transport.get_pipe_transport(1))  # type: ignore
+            stdout.resume_reading()
+
+    def close(self) -> None:
+        """Ask this worker to exit, by closing its request pipe."""
+        if self._transport is not None:
+            stdin = self._transport.get_pipe_transport(0)
+            if stdin is not None:
+                stdin.close()
+
+    async def wait_closed(self) -> None:
+        if self._closed is not None:
+            await asyncio.shield(self._closed)
+
+    def _on_frame(self, kind: bytes, payload: bytes) -> None:
+        job = self._job
+        if kind == b'd':
+            self._job = None
+            if job is not None:
+                job._worker_done()
+            self._launcher._release(self)
+        elif job is not None:
+            job._on_frame(kind, payload)
+
+    def _on_exit(self) -> None:
+        job, self._job = self._job, None
+        if job is not None:
+            job._worker_died()
+        self._launcher._discard(self)
+        if self._transport is not None:
+            self._transport.close()
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
+
+
+class _PoolPipe(asyncio.ReadTransport):
+
+    """Stand-in for the pipe transport of a command run by a pool worker."""
+
+    def __init__(self, worker: _PoolWorker) -> None:
+        super().__init__()
+        self._worker = worker
+        self._closed = False
+
+    def pause_reading(self) -> None:
+        if not self._closed:
+            self._worker.pause_reading()
+
+    def resume_reading(self) -> None:
+        if not self._closed:
+            self._worker.resume_reading()
+
+    def is_closing(self) -> bool:
+        return self._closed
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            # don't leave the worker paused for whatever command is next
+            self._worker.resume_reading()
+
+
+class _PoolTransport(_LauncherTransport):
+
+    """Transport for a command run by a `WorkerPoolLauncher` worker."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop,
+                 protocol: asyncio.SubprocessProtocol,
+                 worker: _PoolWorker) -> None:
+        super().__init__(loop, protocol)
+        self._worker: Optional[_PoolWorker] = worker
+        self._started = loop.create_future()
+        self._open_fds = {1, 2}
+        self._pipes = {fd: _PoolPipe(worker) for fd in self._open_fds}
+
+    def _on_frame(self, kind: bytes, payload: bytes) -> None:
+        if kind == b'o':
+            self._pipe_data_received(1, payload)
+        elif kind == b'e':
+            self._pipe_data_received(2, payload)
+        elif kind in (b'O', b'E',):
+            self._pipe_eof(1 if kind == b'O' else 2)
+        elif kind == b'x':
+            info = json.loads(payload)
+            rusage = info.get('rusage')
+            self._process_exited(
+                info['returncode'],
+                _resource_usage(*rusage) if rusage is not None else None)
+        elif kind == b'p':
+            info = json.loads(payload)
+            if 'pid' in info:
+                self._pid = info['pid']
+                self._started.set_result(None)
+            else:
+                self._started.set_exception(
+                    OSError(info['errno'], info['message']))
+
+    def _pipe_eof(self, fd: int) -> None:
+        if fd in self._open_fds:
+            self._open_fds.remove(fd)
+            self._pipe_connection_lost(fd, None)
+
+    def _worker_done(self) -> None:
+        self._worker = None
+
+    def _worker_died(self) -> None:
+        """Wrap up after the worker running our command died."""
+        self._worker = None
+        if not self._started.done():
+            self._started.set_exception(SublemonRuntimeError(
+                'Pool worker exited before starting the command'))
+            return
+
+        for fd in list(self._open_fds):
+            self._pipe_eof(fd)
+        if self._returncode is None:
+            self._process_exited(-signal.SIGKILL)
+
+    def send_signal(self, sig: int) -> None:
+        if self._returncode is None and self._worker is not None:
+            self._worker.send(b's', {'signal': int(sig)})
+
+
+class _BatchProtocol(asyncio.SubprocessProtocol):
+
+    """Protocol passing the output and exit of a batch's shell on to it."""
+
+    def __init__(self, shell: '_BatchShell') -> None:
+        self._shell = shell
+
+    def pipe_data_received(self, fd: int, data: bytes) -> None:
+        self._shell._on_data(fd, data)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self._shell._on_closed()
+
+
+class _BatchShell:
+
+    """The shell running one batch of a `BatchLauncher`.
+
+    Each command is run as a background subshell, which the shell waits on
+    right away. The shell writes a marker line to stdout once a command has
+    started (with its pid) and once it has exited (with its exit code), and
+    one to stderr once it has exited, so that everything in between belongs
+    to the command whose turn it is. Markers include a random token, so
+    that they cannot be mistaken for output, and start on a line of their
+    own; the newline written ahead of them is dropped along with them.
+
+    """
+
+    def __init__(self, launcher: BatchLauncher,
+                 jobs: List['_BatchJob']
+                 ) -> None:
+        self._launcher = launcher
+        self._jobs = [transport for transport, _ in jobs]
+        self._token = os.urandom(16).hex()
+        self._script = ''.join(
+            _BATCH_LINE.format(
+                cmd=_quote_cmd(cmd), token=self._token, index=i)
+            for i, (_, cmd) in enumerate(jobs)).encode('utf-8')
+        self._separator = ('\n' + self._token + ' ').encode('ascii')
+        self._inboxes = {1: b'', 2: b''}
+        # the index of the command that output on each fd belongs to
+        self._turns = {1: 0, 2: 0}
+        self._loop = self._jobs[0]._loop
+        self._transport: Optional[asyncio.SubprocessTransport] = None
+        self._closed = self._loop.create_future()
+
+    async def start(self) -> None:
+        try:
+            self._transport, _ = await self._loop.subprocess_exec(
+                lambda: _BatchProtocol(self),
+                '/bin/sh',
+                stdin=PIPE,
+                stdout=PIPE,
+                stderr=PIPE,
+                start_new_session=True)
+        except Exception as e:
+            for job in self._jobs:
+                if not job._started.done():
+                    job._started.set_exception(e)
+            self._on_closed()
+            return
+
+        stdin: asyncio.WriteTransport = (
+            self._transport.get_pipe_transport(0))  # type: ignore
+        stdin.write(self._script)
+        stdin.close()
+
+    async def wait_closed(self) -> None:
+        await asyncio.shield(self._closed)
+
+    def pause_reading(self, fd: int) -> None:
+        if self._transport is not None:
+            pipe: asyncio.ReadTransport = (
+                self._transport.get_pipe_transport(fd))  # type: ignore
+            if pipe is not None:
+                pipe.pause_reading()
+
+    def resume_reading(self, fd: int) -> None:
+        if self._transport is not None:
+            pipe: asyncio.ReadTransport = (
+                self._transport.get_pipe_transport(fd))  # type: ignore
+            if pipe is not None:
+                pipe.resume_reading()
+
+    def _on_data(self, fd: int, data: bytes) -> None:
+        """Split output on markers, and pass it to the commands it is from."""
+        inbox = self._inboxes[fd] + data
+        separator = self._separator
+        while True:
+            start = inbox.find(separator)
+            if start < 0:
+                break
+            end = inbox.find(b'\n', start + len(separator))
+            if end < 0:
+                # hold back the marker until the rest of it is read
+                self._output(fd, inbox[:start])
+                self._inboxes[fd] = inbox[start:]
+                return
+            self._output(fd, inbox[:start])
+            self._on_marker(fd, inbox[start + len(separator):end].split())
+            inbox = inbox[end + 1:]
+
+        # hold back what might be the beginning of a marker
+        held = inbox.rfind(b'\n', max(len(inbox) - len(separator) + 1, 0))
+        if held < 0 or not separator.startswith(inbox[held:]):
+            held = len(inbox)
+        self._output(fd, inbox[:held])
+        self._inboxes[fd] = inbox[held:]
+
+    def _output(self, fd: int, data: bytes) -> None:
+        if data and self._turns[fd] < len(self._jobs):
+            self._jobs[self._turns[fd]]._pipe_data_received(fd, data)
+
+    def _on_marker(self, fd: int, fields: List[bytes]) -> None:
+        kind, index = fields[0], int(fields[1])
+        job = self._jobs[index]
+        if kind == b's':
+            job._on_started(int(fields[2]))
+        elif kind == b'x':
+            self._turns[1] = index + 1
+            job._pipe_eof(1)
+            job._on_exited(int(fields[2]))
+        elif kind == b'e':
+            self._turns[2] = index + 1
+            job._pipe_eof(2)
+
+        if self._turns[1] == self._turns[2] == len(self._jobs):
+            # don't wait on anything the commands left running in the
+            # background, which may hold on to the shell's pipes
+            for fd in (1, 2,):
+                pipe = self._transport.get_pipe_transport(  # type: ignore
+                    fd)
+                if pipe is not None:
+                    pipe.close()
+
+    def _on_closed(self) -> None:
+        """Wrap up the commands that the shell did not get to finish."""
+        returncode = None
+        if self._transport is not None:
+            returncode = self._transport.get_returncode()
+            self._transport.close()
+        for job in self._jobs:
+            job._shell_exited(returncode)
+        self._launcher._discard(self)
+        self._closed.set_result(None)
+
+
+class _BatchPipe(asyncio.ReadTransport):
+
+    """Stand-in for the pipe transport of a command run in a batch."""
+
+    def __init__(self, transport: '_BatchTransport', fd: int) -> None:
+        super().__init__()
+        self._transport = transport
+        self._fd = fd
+        self._closed = False
+
+    def pause_reading(self) -> None:
+        shell = self._transport._shell
+        if not self._closed and shell is not None:
+            shell.pause_reading(self._fd)
+
+    def resume_reading(self) -> None:
+        shell = self._transport._shell
+        if not self._closed and shell is not None:
+            shell.resume_reading(self._fd)
+
+    def is_closing(self) -> bool:
+        return self._closed
+
+    def close(self) -> None:
+        if not self._closed:
+            # don't leave the shell paused for whichever command is next
+            self.resume_reading()
+            self._closed = True
+
+
+class _BatchTransport(_LauncherTransport):
+
+    """Transport for a command run by a `BatchLauncher` shell."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop,
+                 protocol: asyncio.SubprocessProtocol) -> None:
+        super().__init__(loop, protocol)
+        self._shell: Optional[_BatchShell] = None
+        self._started = loop.create_future()
+        self._abandoned = False
+        # the signals sent to the command, to recognize its exit code by
+        self._signals: Set[int] = set()
+        self._open_fds = {1, 2}
+        self._pipes = {fd: _BatchPipe(self, fd) for fd in self._open_fds}
+
+    def _on_started(self, pid: int) -> None:
+        self._pid = pid
+        if self._abandoned:
+            self.send_signal(signal.SIGKILL)
+        elif not self._started.done():
+            self._started.set_result(None)
+
+    def _on_exited(self, returncode: int) -> None:
+        # the shell reports commands killed by a signal as 128 plus its
+        # number, which is only told apart from an exit code if we sent it
+        if returncode - 128 in self._signals:
+            returncode = 128 - returncode
+        self._process_exited(returncode)
+
+    def _pipe_eof(self, fd: int) -> None:
+        if fd in self._open_fds:
+            self._open_fds.remove(fd)
+            self._pipe_connection_lost(fd, None)
+
+    def _abandon(self) -> None:
+        """Kill the command as soon as it starts, if it ever does."""
+        self._abandoned = True
+        if self._pid is not None and self._returncode is None:
+            self.send_signal(signal.SIGKILL)
+
+    def _shell_exited(self, returncode: Optional[int]) -> None:
+        """Wrap up after the shell running our command exited."""
+        self._shell = None
+        if not self._started.done():
+            self._started.set_exception(SublemonRuntimeError(
+                'Batch shell exited before starting the command'))
+            return
+
+        for fd in list(self._open_fds):
+            self._pipe_eof(fd)
+        if self._returncode is None:
+            self._process_exited(
+                returncode if returncode is not None else -signal.SIGKILL)
+
+    def send_signal(self, sig: int) -> None:
+        if self._returncode is None and self._pid is not None:
+            self._signals.add(int(sig))
+            with suppress(ProcessLookupError):
+                os.kill(self._pid, sig)
+
+
+def _quote_cmd(cmd: Union[str, Sequence[str]]) -> str:
+    """Quote a command for running in a subshell of a batch's shell."""
+    if isinstance(cmd, str):
+        # evaluated, so that syntax errors only fail this command
+        return 'eval ' + shlex.quote(cmd)
+    return 'exec ' + ' '.join(shlex.quote(arg) for arg in cmd)
+
+
+def _reap(pid: int) -> Tuple[int, Optional[ResourceUsage]]:
+    """Block until process `pid` exits.
+
+    Returns:
+        Its asyncio-style exit code, and its resource usage, if available.
+        If the process was reaped by someone else (e.g., a `SIGCHLD`
+        handler), its exit code is unknown, and reported as 255, as
+        asyncio's child watchers do.
+
+    """
+    rusage: Optional[ResourceUsage] = None
+    try:
+        if hasattr(os, 'wait4'):
+            _, status, ru = os.wait4(pid, 0)
+            rusage = _resource_usage(
+                ru.ru_utime, ru.ru_stime, ru.ru_maxrss)
+        else:
+            _, status = os.waitpid(pid, 0)
+    except ChildProcessError:
+        return _UNKNOWN_EXIT_CODE, None
+
+    if hasattr(os, 'waitstatus_to_exitcode'):
+        return os.waitstatus_to_exitcode(status), rusage
+    elif os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status), rusage
+    return os.WEXITSTATUS(status), rusage
+
+
+def _resource_usage(user_time: float, system_time: float,
+                    max_rss: int) -> ResourceUsage:
+    """Build a `ResourceUsage` from the fields of a `struct rusage`."""
+    return ResourceUsage(user_time, system_time, max_rss * _MAXRSS_SCALE)
+
+
+LAUNCHERS: Dict[str, Callable[[], SublemonLauncher]] = {
+    AsyncioLauncher.name: AsyncioLauncher,
+    PosixSpawnLauncher.name: PosixSpawnLauncher,
+    WorkerPoolLauncher.name: WorkerPoolLauncher,
+    BatchLauncher.name: BatchLauncher,
+}
+
+
+def make_launcher(
+        launcher: Union[str, SublemonLauncher]) -> SublemonLauncher:
+    """Resolve a launcher name (or instance) to a launcher instance."""
+    if isinstance(launcher, SublemonLauncher):
+        return launcher
+    try:
+        factory = LAUNCHERS[launcher]
+    except (KeyError, TypeError):
+        raise SublemonRuntimeError(
+            'Invalid `launcher` kwarg received: `' + str(launcher) + '`')
+    return factory()
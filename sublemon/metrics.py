@@ -0,0 +1,245 @@
+"""Built-in counters and latency histograms of subprocesses."""
+
+import bisect
+
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TYPE_CHECKING)
+
+from sublemon.errors import SublemonRuntimeError
+from sublemon.hooks import SublemonHooks
+from sublemon.utils import monotonic_ns
+
+if TYPE_CHECKING:
+    from sublemon.subprocess import SublemonSubprocess  # noqa
+
+# from a millisecond to about 17 minutes, doubling each time
+_DEFAULT_BOUNDS: Tuple[float, ...] = tuple(0.001 * 2 ** i for i in range(21))
+
+
+class Histogram:
+
+    """Histogram of non-negative values, such as latencies in seconds.
+
+    Values are counted in buckets, so memory use is fixed however many are
+    recorded; quantiles are approximated by the upper bound of the bucket
+    they fall in.
+
+    Args:
+        bounds: The ascending upper bounds of the buckets. Values beyond
+            the last bound are counted in an overflow bucket. Defaults to
+            bounds doubling from 1ms to about 17 minutes.
+
+    """
+
+    def __init__(self, bounds: Optional[Sequence[float]]=None) -> None:
+        bounds = tuple(bounds if bounds is not None else _DEFAULT_BOUNDS)
+        if not bounds or any(a >= b for a, b in zip(bounds, bounds[1:])):
+            raise SublemonRuntimeError(
+                'Invalid `bounds` kwarg received: `' + str(bounds) + '`')
+
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._min: Optional[float] = None
+        self._max: Optional[float] = None
+
+    def __repr__(self) -> str:
+        return ('<Histogram [count: {}, mean: {}, p50: {}, p99: {}, '
+                'max: {}]>').format(
+                    self._count,
+                    self.mean,
+                    self.quantile(0.5),
+                    self.quantile(0.99),
+                    self._max)
+
+    def record(self, value: float) -> None:
+        """Count a value."""
+        self._counts[bisect.bisect_left(self._bounds, value)] += 1
+        self._count += 1
+        self._sum += value
+        if self._min is None or value < self._min:
+            self._min = value
+        if self._max is None or value > self._max:
+            self._max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate the value below which a fraction `q` of values fall.
+
+        Returns:
+            The upper bound of the bucket holding the quantile (capped at
+            the largest value recorded), or `None` if nothing was recorded.
+
+        """
+        if not self._count:
+            return None
+
+        rank = q * self._count
+        seen = 0
+        for i, count in enumerate(self._counts):
+            seen += count
+            if count and seen >= rank:
+                break
+        if i == len(self._bounds):
+            return self._max
+        return min(self._bounds[i], self._max)  # type: ignore
+
+    @property
+    def buckets(self) -> List[Tuple[float, int]]:
+        """The `(upper bound, count)` of each bucket, ending with overflow."""
+        return list(zip(self._bounds + (float('inf'),), self._counts))
+
+    @property
+    def count(self) -> int:
+        """The number of values recorded."""
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        """The sum of the values recorded."""
+        return self._sum
+
+    @property
+    def mean(self) -> Optional[float]:
+        """The mean of the values recorded, if any."""
+        return self._sum / self._count if self._count else None
+
+    @property
+    def min(self) -> Optional[float]:
+        """The smallest value recorded, if any."""
+        return self._min
+
+    @property
+    def max(self) -> Optional[float]:
+        """The largest value recorded, if any."""
+        return self._max
+
+
+class SublemonMetrics(SublemonHooks):
+
+    """Hooks keeping counters and latency histograms of subprocesses.
+
+    Pass an instance to a `Sublemon` instance's `hooks` kwarg, and read its
+    properties at any time.
+
+    """
+
+    def __init__(self) -> None:
+        self._queued = 0
+        self._started = 0
+        self._exited = 0
+        self._failed = 0
+        self._wait_time = Histogram()
+        self._run_time = Histogram()
+        self._bytes_read = {'stdout': 0, 'stderr': 0}
+        self._user_time = 0.0
+        self._system_time = 0.0
+        self._max_rss = 0
+        # when each queued subprocess started waiting for a slot
+        self._queued_ns: Dict['SublemonSubprocess', int] = {}
+        self._first_ns: Optional[int] = None
+        self._last_ns: Optional[int] = None
+
+    def __repr__(self) -> str:
+        return ('<SublemonMetrics [queued: {}, started: {}, exited: {}, '
+                'failed: {}, {:.1f} jobs/s]>').format(
+                    self._queued,
+                    self._started,
+                    self._exited,
+                    self._failed,
+                    self.throughput)
+
+    def on_queued(self, sp: 'SublemonSubprocess') -> None:
+        now = monotonic_ns()
+        self._queued += 1
+        self._queued_ns[sp] = now
+        if self._first_ns is None:
+            self._first_ns = now
+
+    def on_started(self, sp: 'SublemonSubprocess') -> None:
+        self._started += 1
+        queued_ns = self._queued_ns.pop(sp, None)
+        if queued_ns is not None:
+            self._wait_time.record(
+                (sp._began_ns - queued_ns) / 1e9)  # type: ignore
+
+    def on_output(self, sp: 'SublemonSubprocess', stream: str,
+                  data: bytes) -> None:
+        self._bytes_read[stream] += len(data)
+
+    def on_exited(self, sp: 'SublemonSubprocess') -> None:
+        self._queued_ns.pop(sp, None)
+        self._exited += 1
+        self._last_ns = sp._finished_ns
+        if sp._exit_code != 0:
+            self._failed += 1
+        if sp._began_ns is not None and sp._finished_ns is not None:
+            self._run_time.record((sp._finished_ns - sp._began_ns) / 1e9)
+        rusage = sp.resource_usage
+        if rusage is not None:
+            self._user_time += rusage.user_time
+            self._system_time += rusage.system_time
+            self._max_rss = max(self._max_rss, rusage.max_rss)
+
+    @property
+    def queued(self) -> int:
+        """The number of times subprocesses were queued for a slot."""
+        return self._queued
+
+    @property
+    def started(self) -> int:
+        """The number of times subprocesses were launched."""
+        return self._started
+
+    @property
+    def exited(self) -> int:
+        """The number of subprocesses that are done."""
+        return self._exited
+
+    @property
+    def failed(self) -> int:
+        """The number of subprocesses that exited non-zero, or never ran."""
+        return self._failed
+
+    @property
+    def wait_time(self) -> Histogram:
+        """How many seconds subprocesses waited for a slot."""
+        return self._wait_time
+
+    @property
+    def run_time(self) -> Histogram:
+        """How many seconds subprocesses (or their last attempts) ran for."""
+        return self._run_time
+
+    @property
+    def bytes_read(self) -> Dict[str, int]:
+        """The number of bytes read from each of `stdout` and `stderr`."""
+        return dict(self._bytes_read)
+
+    @property
+    def user_time(self) -> float:
+        """The user CPU seconds used by subprocesses, where reported."""
+        return self._user_time
+
+    @property
+    def system_time(self) -> float:
+        """The system CPU seconds used by subprocesses, where reported."""
+        return self._system_time
+
+    @property
+    def max_rss(self) -> int:
+        """The peak resident set size of any subprocess, in bytes."""
+        return self._max_rss
+
+    @property
+    def throughput(self) -> float:
+        """Subprocesses done per second, since the first was queued."""
+        if self._first_ns is None or self._last_ns is None or (
+                self._last_ns <= self._first_ns):
+            return 0.0
+        return self._exited / ((self._last_ns - self._first_ns) / 1e9)
@@ -0,0 +1,216 @@
+"""Merging of the output of many subprocesses into one stream of lines."""
+
+import asyncio
+import codecs
+
+from collections import deque
+from typing import (
+    Any,
+    AsyncGenerator,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    TYPE_CHECKING)
+
+from sublemon.output import DEFAULT_LIMIT
+
+if TYPE_CHECKING:
+    from sublemon.subprocess import SublemonSubprocess  # noqa
+
+_DEFAULT_QS: int = 64
+
+
+class OutputLine(NamedTuple):
+
+    """A line of subprocess output, tagged with where it came from."""
+
+    subprocess: 'SublemonSubprocess'
+    stream: str
+    line: str
+
+
+def multiplex(
+        sps: Iterable['SublemonSubprocess'],
+        streams: Sequence[str],
+        queue_size: int=_DEFAULT_QS) -> AsyncGenerator[OutputLine, None]:
+    """Asynchronous generator for the lines of output of many subprocesses.
+
+    The subprocesses' pipes are not read by tasks of their own; instead,
+    each chunk of output is split into lines in bulk as the subprocess's
+    protocol receives it, and the batch of lines is pushed straight onto a
+    single queue shared by all pipes. The queue holds at most `queue_size`
+    batches; once it is full, reading from the pipes is paused until the
+    consumer catches up.
+
+    Lines are decoded as UTF-8 and yielded without their trailing newlines.
+    If the consumer stops early, the rest of the output is discarded. The
+    subprocesses must not have been launched yet, as their output is only
+    routed to the queue from launch on; they are read from the queue
+    instead of their own `stdout` and `stderr`, which stay empty.
+
+    Args:
+        sps: The subprocesses whose output should be merged.
+        streams: Which of each subprocess's pipes to read (`stdout` and/or
+            `stderr`).
+        queue_size: The max number of batches of lines waiting for the
+            consumer.
+
+    """
+    mux = _Multiplexer(streams, queue_size)
+    for sp in sps:
+        mux.attach(sp)
+    return mux.lines()
+
+
+class _Multiplexer:
+
+    """The queue that the output of the multiplexed subprocesses goes to."""
+
+    def __init__(self, streams: Sequence[str], queue_size: int) -> None:
+        self.streams = frozenset(streams)
+        self._queue_size = queue_size
+        # batches of lines, or errors to raise in the consumer
+        self._items: Deque[Any] = deque()
+        self._waiter: Optional[asyncio.Future] = None
+        self._paused: Set['_MultiplexReader'] = set()
+        # the number of open pipes of each subprocess
+        self._open: Dict['SublemonSubprocess', int] = {}
+        self._closed = False
+
+    def attach(self, sp: 'SublemonSubprocess') -> None:
+        """Route the output of a not yet launched subprocess to us."""
+        sp._sink = self
+        self._open[sp] = 0
+
+    def make_reader(self, sp: 'SublemonSubprocess', stream: str,
+                    loop: asyncio.AbstractEventLoop) -> asyncio.StreamReader:
+        """Create the reader for one of the pipes of a subprocess."""
+        self._open[sp] += 1
+        return _MultiplexReader(self, sp, stream, loop)
+
+    def on_done(self, sp: 'SublemonSubprocess') -> None:
+        """Note that a subprocess finished (or failed to launch)."""
+        self._check(sp)
+
+    def push(self, reader: '_MultiplexReader', item: Any) -> None:
+        if self._closed:
+            return
+        self._items.append(item)
+        if len(self._items) >= self._queue_size:
+            reader.pause()
+            self._paused.add(reader)
+        self._wakeup()
+
+    def pipe_closed(self, sp: 'SublemonSubprocess') -> None:
+        self._open[sp] -= 1
+        self._check(sp)
+
+    def _check(self, sp: 'SublemonSubprocess') -> None:
+        """Forget about a subprocess that won't produce output anymore."""
+        if sp in self._open and sp.is_done and not self._open[sp]:
+            del self._open[sp]
+            self._wakeup()
+
+    def _wakeup(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _resume(self) -> None:
+        paused, self._paused = self._paused, set()
+        for reader in paused:
+            reader.resume()
+
+    async def lines(self) -> AsyncGenerator[OutputLine, None]:
+        """Asynchronous generator for the lines pushed onto the queue."""
+        items = self._items
+        try:
+            while self._open or items:
+                if not items:
+                    self._waiter = asyncio.get_event_loop().create_future()
+                    await self._waiter
+                    self._waiter = None
+                    continue
+
+                item = items.popleft()
+                if self._paused and len(items) < self._queue_size:
+                    self._resume()
+                if isinstance(item, Exception):
+                    raise item
+                sp, stream, batch = item
+                for line in batch:
+                    yield OutputLine(sp, stream, line)
+        finally:
+            # drop whatever is left, without stalling anyone on a full pipe
+            self._closed = True
+            items.clear()
+            self._resume()
+
+
+class _MultiplexReader(asyncio.StreamReader):
+
+    """Reader pushing the lines of one pipe onto a multiplexer's queue."""
+
+    # internals of `asyncio.StreamReader`
+    _transport: Optional[asyncio.ReadTransport]
+
+    def __init__(self, mux: _Multiplexer, sp: 'SublemonSubprocess',
+                 stream: str, loop: asyncio.AbstractEventLoop) -> None:
+        super().__init__(limit=DEFAULT_LIMIT, loop=loop)
+        self._mux = mux
+        self._sp = sp
+        self._stream = stream
+        self._decoder = codecs.getincrementaldecoder('utf-8')('strict')
+        self._partial = ''
+        self._closed = False
+
+    def feed_data(self, data: bytes) -> None:  # type: ignore
+        if self._closed:
+            return
+        try:
+            text = self._partial + self._decoder.decode(data)
+        except UnicodeDecodeError as e:
+            self._fail(e)
+            return
+
+        lines: List[str] = text.split('\n')
+        self._partial = lines.pop()
+        if lines:
+            self._mux.push(self, (self._sp, self._stream, lines,))
+
+    def feed_eof(self) -> None:
+        if self._closed:
+            return
+        try:
+            text = self._partial + self._decoder.decode(b'', final=True)
+        except UnicodeDecodeError as e:
+            self._fail(e)
+            return
+
+        if text:
+            self._mux.push(self, (self._sp, self._stream, [text],))
+        self._close()
+
+    def set_exception(self, exc: BaseException) -> None:
+        if not self._closed:
+            self._fail(exc)  # type: ignore
+
+    def _fail(self, exc: Exception) -> None:
+        self._mux.push(self, exc)
+        self._close()
+
+    def _close(self) -> None:
+        self._closed = True
+        self._mux.pipe_closed(self._sp)
+
+    def pause(self) -> None:
+        if self._transport is not None:
+            self._transport.pause_reading()
+
+    def resume(self) -> None:
+        if self._transport is not None and not self._transport.is_closing():
+            self._transport.resume_reading()
@@ -0,0 +1,275 @@
+"""Buffering policies for the output pipes of subprocesses."""
+
+import asyncio
+import tempfile
+
+from typing import (
+    Any,
+    Callable,
+    IO,
+    Optional)
+
+from sublemon.errors import SublemonRuntimeError
+
+DEFAULT_LIMIT: int = 2 ** 16
+DEFAULT_CHUNK: int = 2 ** 16
+
+OUTPUT_POLICIES = ('pipe', 'discard', 'ring', 'spill', 'capture',)
+
+
+class _OutputReader(asyncio.StreamReader):
+
+    """Base type for readers that never leave data sitting in the OS pipe.
+
+    Unlike a plain `asyncio.StreamReader`, subclasses never pause reading
+    from their transport, so a subprocess can never stall on a full pipe
+    that nobody is consuming. The `output_limit` bounds how many bytes a
+    reader holds on to; what happens to output beyond that depends on the
+    subclass.
+
+    """
+
+    # internals of `asyncio.StreamReader` that subclasses build on
+    _buffer: bytearray
+    _eof: bool
+    _wakeup_waiter: Callable[[], None]
+
+    def __init__(self, output_limit: int,
+                 loop: asyncio.AbstractEventLoop) -> None:
+        super().__init__(limit=DEFAULT_LIMIT, loop=loop)
+        self._output_limit = output_limit
+        self._dropped = 0
+
+    @property
+    def dropped(self) -> int:
+        """The number of bytes of output this reader has thrown away."""
+        return self._dropped
+
+    async def wait_eof(self) -> None:
+        """Coroutine to wait until the pipe has been read to its end."""
+        while not self._eof:
+            await self._wait_for_data('wait_eof')  # type: ignore
+
+
+class _DiscardReader(_OutputReader):
+
+    """Reader that drains and discards all output."""
+
+    def feed_data(self, data: bytes) -> None:  # type: ignore
+        self._dropped += len(data)
+
+
+class _CaptureReader(_OutputReader):
+
+    """Reader that only keeps the first `output_limit` bytes of output.
+
+    Everything beyond the limit is drained and discarded, so a capped
+    capture of a noisy subprocess never stalls it.
+
+    """
+
+    def __init__(self, output_limit: int,
+                 loop: asyncio.AbstractEventLoop) -> None:
+        super().__init__(output_limit, loop)
+        self._kept = 0
+
+    def feed_data(self, data: bytes) -> None:  # type: ignore
+        room = self._output_limit - self._kept
+        if len(data) > room:
+            self._dropped += len(data) - max(room, 0)
+            data = data[:max(room, 0)]
+        if not data:
+            return
+
+        self._kept += len(data)
+        self._buffer.extend(data)
+        self._wakeup_waiter()
+
+    def getvalue(self) -> bytes:
+        """Get the captured output that has not been consumed yet."""
+        return bytes(self._buffer)
+
+
+class _RingReader(_OutputReader):
+
+    """Reader that only keeps the most recent output.
+
+    At most `output_limit` bytes are kept; if `output_lines` is specified,
+    at most that many of the most recent lines are kept, too.
+
+    """
+
+    def __init__(self, output_limit: int, loop: asyncio.AbstractEventLoop,
+                 output_lines: Optional[int]=None) -> None:
+        super().__init__(output_limit, loop)
+        self._output_lines = output_lines
+
+    def feed_data(self, data: bytes) -> None:  # type: ignore
+        if not data:
+            return
+
+        self._buffer.extend(data)
+        cut = max(0, len(self._buffer) - self._output_limit)
+        if self._output_lines is not None:
+            cut = max(cut, self._lines_cut())
+        if cut:
+            del self._buffer[:cut]
+            self._dropped += cut
+        self._wakeup_waiter()
+
+    def _lines_cut(self) -> int:
+        """Get the buffer index at which the last `output_lines` lines begin.
+
+        A trailing partial line counts as one of the kept lines.
+
+        """
+        end = len(self._buffer)
+        if self._buffer.endswith(b'\n'):
+            end -= 1
+        for _ in range(self._output_lines):  # type: ignore
+            end = self._buffer.rfind(b'\n', 0, end)
+            if end < 0:
+                return 0
+        return end + 1
+
+
+class _SpillReader(_OutputReader):
+
+    """Reader that spills output beyond `output_limit` bytes to a tempfile.
+
+    No output is lost; it is read back from the tempfile into memory as the
+    consumer works through the in-memory buffer.
+
+    """
+
+    def __init__(self, output_limit: int,
+                 loop: asyncio.AbstractEventLoop) -> None:
+        super().__init__(output_limit, loop)
+        self._spill: Optional[IO[bytes]] = None
+        self._spill_read_pos = 0
+        self._spill_write_pos = 0
+        self._spill_eof = False
+
+    @property
+    def _spill_pending(self) -> bool:
+        return self._spill_read_pos < self._spill_write_pos
+
+    def feed_data(self, data: bytes) -> None:  # type: ignore
+        if not data:
+            return
+
+        if (not self._spill_pending and
+                len(self._buffer) + len(data) <= self._output_limit):
+            self._buffer.extend(data)
+        else:
+            if self._spill is None:
+                self._spill = tempfile.TemporaryFile()
+            self._spill.seek(self._spill_write_pos)
+            self._spill.write(data)
+            self._spill_write_pos += len(data)
+        self._wakeup_waiter()
+
+    def feed_eof(self) -> None:
+        if self._spill_pending:
+            self._spill_eof = True
+            self._wakeup_waiter()
+        else:
+            self._close_spill()
+            super().feed_eof()
+
+    async def _wait_for_data(self, func_name: str) -> None:
+        if self._refill():
+            return
+        await super()._wait_for_data(func_name)  # type: ignore
+
+    def _refill(self) -> bool:
+        """Move spilled output back into memory.
+
+        Returns:
+            Whether the state of the in-memory buffer changed.
+
+        """
+        if not self._spill_pending:
+            return False
+
+        room = max(self._output_limit - len(self._buffer), DEFAULT_LIMIT)
+        self._spill.seek(self._spill_read_pos)  # type: ignore
+        data = self._spill.read(room)  # type: ignore
+        self._spill_read_pos += len(data)
+        self._buffer.extend(data)
+
+        if not self._spill_pending:
+            # reuse the file for any later overflow
+            self._spill.seek(0)
+            self._spill.truncate()
+            self._spill_read_pos = self._spill_write_pos = 0
+            if self._spill_eof:
+                self._close_spill()
+                super().feed_eof()
+        return True
+
+    def _close_spill(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+
+def make_reader(policy: str, output_limit: int,
+                output_lines: Optional[int],
+                loop: asyncio.AbstractEventLoop) -> asyncio.StreamReader:
+    """Create a reader implementing the specified output policy.
+
+    Args:
+        policy: One of `pipe`, `discard`, `ring`, `spill`, or `capture`.
+        output_limit: The max number of bytes the reader will buffer.
+        output_lines: For the `ring` policy, the max number of lines to
+            keep; ignored for other policies.
+        loop: The loop the reader will be used from.
+
+    """
+    if policy == 'pipe':
+        return asyncio.StreamReader(limit=output_limit, loop=loop)
+    elif policy == 'discard':
+        return _DiscardReader(output_limit, loop)
+    elif policy == 'ring':
+        return _RingReader(output_limit, loop, output_lines)
+    elif policy == 'capture':
+        return _CaptureReader(output_limit, loop)
+    validate_policy(policy)
+    return _SpillReader(output_limit, loop)
+
+
+async def readinto(reader: asyncio.StreamReader, buf) -> int:
+    """Coroutine to read buffered output straight into a writable buffer.
+
+    Waits until the reader has data (or hits EOF), then moves as much of it
+    as fits into `buf` in a single copy, without allocating an intermediate
+    `bytes` object.
+
+    Returns:
+        The number of bytes read into `buf`, which is only 0 at EOF.
+
+    """
+    view = memoryview(buf).cast('B')
+    if not view.nbytes:
+        return 0
+
+    r: Any = reader
+    if r._exception is not None:
+        raise r._exception
+    if not r._buffer and not r._eof:
+        await r._wait_for_data('readinto')
+
+    n = min(view.nbytes, len(r._buffer))
+    with memoryview(r._buffer) as src:
+        view[:n] = src[:n]
+    del r._buffer[:n]
+    r._maybe_resume_transport()
+    return n
+
+
+def validate_policy(policy: str) -> None:
+    """Raise a `SublemonRuntimeError` for unknown output policies."""
+    if policy not in OUTPUT_POLICIES:
+        raise SublemonRuntimeError(
+            'Invalid `output_policy` kwarg received: `' + str(policy) + '`')
@@ -0,0 +1,70 @@
+"""Structured results of finished subprocesses."""
+
+from typing import (
+    Any,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TYPE_CHECKING,
+    Union)
+
+if TYPE_CHECKING:
+    from sublemon.subprocess import SublemonSubprocess  # noqa
+
+
+class RunResult(NamedTuple):
+
+    """The outcome and captured output of a finished subprocess."""
+
+    subprocess: 'SublemonSubprocess'
+    exit_code: Optional[int]
+    stdout: Union[bytes, str]
+    stderr: Union[bytes, str]
+    stdout_truncated: bool
+    stderr_truncated: bool
+    wait_time: float
+    run_time: Optional[float]
+    error: Optional[Exception]
+
+
+def make_result(sp: 'SublemonSubprocess', encoding: Optional[str]=None,
+                errors: str='replace') -> RunResult:
+    """Build the result of a subprocess run under the `capture` policy.
+
+    Args:
+        sp: The finished subprocess, whose pipes have been read to their
+            ends.
+        encoding: The encoding to decode output with, if any; output is
+            left as bytes otherwise.
+        errors: How decoding errors are handled (see `bytes.decode`). The
+            default of `replace` also covers multi-byte characters that were
+            cut in half by truncation.
+
+    """
+    stdout, stdout_truncated = _captured(sp._stdout)
+    stderr, stderr_truncated = _captured(sp._stderr)
+    finished_ns: int = sp._finished_ns  # type: ignore
+    if sp._began_ns is None:
+        wait_time = (finished_ns - sp._scheduled_ns) / 1e9
+        run_time = None
+    else:
+        wait_time = (sp._began_ns - sp._scheduled_ns) / 1e9
+        run_time = (finished_ns - sp._began_ns) / 1e9
+
+    return RunResult(
+        sp,
+        sp._exit_code,
+        stdout.decode(encoding, errors) if encoding is not None else stdout,
+        stderr.decode(encoding, errors) if encoding is not None else stderr,
+        stdout_truncated,
+        stderr_truncated,
+        wait_time,
+        run_time,
+        sp._spawn_error)
+
+
+def _captured(reader: Any) -> Tuple[bytes, bool]:
+    """Get the captured output of a pipe, and whether any was dropped."""
+    if reader is None:
+        return b'', False
+    return reader.getvalue(), reader.dropped > 0
@@ -0,0 +1,136 @@
+"""Policies for retrying subprocesses that fail transiently."""
+
+import random
+
+from datetime import datetime
+from typing import (
+    FrozenSet,
+    Iterable,
+    NamedTuple,
+    Optional)
+
+from sublemon.errors import SublemonRuntimeError
+
+_DEFAULT_MA: int = 3
+_DEFAULT_BO: float = 0.1
+_DEFAULT_MU: float = 2.0
+_DEFAULT_MB: float = 60.0
+_DEFAULT_JI: float = 0.5
+
+
+class Attempt(NamedTuple):
+
+    """The outcome of one run of a subprocess's command."""
+
+    exit_code: int
+    termination_reason: Optional[str]
+    began_at: datetime
+    finished_at: datetime
+
+
+class RetryPolicy:
+
+    """Declarative policy for re-running subprocesses that failed.
+
+    A subprocess is retried when it exits with one of `exit_codes` (or, if
+    not specified, any non-zero exit code), and it has not used up its
+    `max_attempts` yet. Subprocesses terminated for running past their
+    `timeout` are only retried if `retry_timeouts` is set; cancelled ones,
+    and ones that ran past their deadline, are never retried.
+
+    Before the `n`th retry, the subprocess waits for an exponential backoff
+    of `backoff * multiplier ** (n - 1)` seconds (capped at `max_backoff`),
+    of which a random fraction of up to `jitter` is taken off, so that
+    retries of jobs that failed together spread out.
+
+    Args:
+        max_attempts: The max number of times a command is run, including
+            the first attempt.
+        exit_codes: The exit codes that are worth retrying.
+        retry_timeouts: Whether to retry subprocesses that timed out.
+        backoff: The number of seconds to wait before the first retry.
+        multiplier: The factor the backoff grows by with each retry.
+        max_backoff: The max number of seconds to wait before a retry.
+        jitter: The max fraction of each backoff taken off at random,
+            between 0 (no jitter) and 1 (anywhere from no wait to the full
+            backoff).
+
+    """
+
+    def __init__(self, max_attempts: int=_DEFAULT_MA,
+                 exit_codes: Optional[Iterable[int]]=None,
+                 retry_timeouts: bool=False,
+                 backoff: float=_DEFAULT_BO,
+                 multiplier: float=_DEFAULT_MU,
+                 max_backoff: float=_DEFAULT_MB,
+                 jitter: float=_DEFAULT_JI) -> None:
+        if max_attempts < 1:
+            raise SublemonRuntimeError(
+                'Invalid `max_attempts` kwarg received: `' +
+                str(max_attempts) + '`')
+        elif backoff < 0:
+            raise SublemonRuntimeError(
+                'Invalid `backoff` kwarg received: `' + str(backoff) + '`')
+        elif not 0 <= jitter <= 1:
+            raise SublemonRuntimeError(
+                'Invalid `jitter` kwarg received: `' + str(jitter) + '`')
+
+        self._max_attempts = max_attempts
+        self._exit_codes: Optional[FrozenSet[int]] = (
+            frozenset(exit_codes) if exit_codes is not None else None)
+        self._retry_timeouts = retry_timeouts
+        self._backoff = backoff
+        self._multiplier = multiplier
+        self._max_backoff = max_backoff
+        self._jitter = jitter
+
+    def __repr__(self) -> str:
+        return ('<RetryPolicy [max attempts: {}, exit codes: {}, backoff: {} '
+                'x{} up to {}, jitter: {}]>').format(
+                    self._max_attempts,
+                    ('any non-zero' if self._exit_codes is None else
+                     sorted(self._exit_codes)),
+                    self._backoff,
+                    self._multiplier,
+                    self._max_backoff,
+                    self._jitter)
+
+    def should_retry(self, attempts: int, exit_code: int,
+                     termination_reason: Optional[str]) -> bool:
+        """Whether to retry a subprocess after an attempt.
+
+        Args:
+            attempts: The number of attempts made so far.
+            exit_code: The exit code of the latest attempt.
+            termination_reason: Why the latest attempt was terminated, if
+                it was.
+
+        """
+        if attempts >= self._max_attempts:
+            return False
+        elif termination_reason is not None:
+            return termination_reason == 'timeout' and self._retry_timeouts
+        elif self._exit_codes is None:
+            return exit_code != 0
+        return exit_code in self._exit_codes
+
+    def delay(self, attempts: int) -> float:
+        """The number of seconds to wait before retrying.
+
+        Args:
+            attempts: The number of attempts made so far.
+
+        """
+        backoff = min(self._max_backoff,
+                      self._backoff * self._multiplier ** (attempts - 1))
+        return backoff * (1 - self._jitter * random.random())
+
+    @property
+    def max_attempts(self) -> int:
+        """The max number of times a command is run."""
+        return self._max_attempts
+
+    @property
+    def exit_codes(self) -> Optional[FrozenSet[int]]:
+        """The exit codes worth retrying, or `None` for any non-zero one."""
+        return self._exit_codes
@@ -1,43 +1,198 @@
 """The main event of this library."""
 
 import asyncio
+import collections
 import itertools
 
 from contextlib import suppress
 from typing import (
+    Any,
     AsyncGenerator,
+    AsyncIterable,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
     List,
+    Optional,
     Set,
-    Tuple)
+    Tuple,
+    Union)
 
+from sublemon.adaptive import AdaptiveConcurrency
+from sublemon.cache import (
+    CommandResult,
+    digest_inputs,
+    ResultCache)
 from sublemon.errors import SublemonRuntimeError
-from sublemon.subprocess import SublemonSubprocess
-from sublemon.utils import amerge
+from sublemon.filters import OutputFilter
+from sublemon.graph import JobGraph
+from sublemon.hooks import SublemonHooks
+from sublemon.launchers import (
+    make_launcher,
+    SublemonLauncher)
+from sublemon.multiplex import (
+    multiplex,
+    OutputLine)
+from sublemon.output import (
+    DEFAULT_LIMIT,
+    validate_policy)
+from sublemon.results import (
+    make_result,
+    RunResult)
+from sublemon.retry import RetryPolicy
+from sublemon.scheduler import (
+    SharedAdmission,
+    SublemonScheduler)
+from sublemon.subprocess import (
+    Command,
+    Input,
+    SublemonSubprocess)
+from sublemon.utils import aiterate
 
 _DEFAULT_MC: int = 25
 _DEFAULT_PD: float = 0.01
+_DEFAULT_CM: str = 'event'
+_DEFAULT_OP: str = 'pipe'
+_DEFAULT_LN: str = 'asyncio'
+_DEFAULT_AI: float = 1.0
+_DEFAULT_LA: int = 8
+_DEFAULT_KG: float = 5.0
+
+_COMPLETION_MODES = ('event', 'poll',)
+_STOP_MODES = ('drain', 'cancel', 'terminate',)
 
 
 class Sublemon:
 
-    """The runtime for spawning subprocesses."""
+    """The runtime for spawning subprocesses.
+
+    Args:
+        max_concurrency: The max number of subprocesses that may be running
+            at the same time.
+        poll_delta: The number of seconds to sleep in between polls of
+            running subprocesses; only used in `poll` completion mode.
+        completion: How subprocess completion is detected. In `event` mode
+            (the default), subprocesses are finished straight from the
+            event loop's child watcher as soon as they exit. In `poll` mode,
+            running subprocesses are checked every `poll_delta` seconds.
+        output_policy: The default buffering policy for subprocess output
+            pipes. `pipe` leaves unread output in the OS pipe, applying
+            backpressure to the subprocess; `discard` drains and drops all
+            output; `ring` keeps only the most recent output; `spill` keeps
+            all output, spilling it to a tempfile beyond `output_limit`
+            bytes; and `capture` keeps only the first `output_limit` bytes.
+        output_limit: The default max number of bytes buffered in memory
+            per output pipe.
+        output_lines: The default max number of lines kept per output pipe
+            under the `ring` policy.
+        launcher: The backend used to launch subprocesses; either the name
+            of a built-in launcher (`asyncio`, `posix_spawn`, `pool`, or
+            `batch`) or an instance of a `SublemonLauncher` subclass.
+        adaptive: Whether to adapt the concurrency limit to the state of the
+            host. When enabled, `max_concurrency` is only the initial limit;
+            every `adapt_interval` seconds, the limit is raised or lowered
+            based on the host's load average, available memory, open file
+            descriptors, and the latency of completed subprocesses.
+        concurrency_floor: The lowest the adaptive limit may go.
+        concurrency_ceiling: The highest the adaptive limit may go; defaults
+            to `max_concurrency`. Regardless of the ceiling, the limit never
+            grows beyond what `RLIMIT_NOFILE` allows for the two output
+            pipes of each subprocess.
+        adapt_interval: The number of seconds in between adjustments of the
+            adaptive limit.
+        timeout: The default max number of seconds a subprocess may run
+            for, after which its process group is sent `SIGTERM`.
+        deadline: The default time, in terms of the event loop's clock
+            (which is `time.monotonic()` for the default loops), by which
+            subprocesses must have finished.
+        kill_grace: The number of seconds in between sending `SIGTERM` and
+            `SIGKILL` to the process group of a subprocess that ran out of
+            time.
+        cache: The cache to look up and store the results of `gather` and
+            `capture` in, if any. Only enable caching for deterministic
+            commands.
+        retry: The default policy for re-running the commands of
+            subprocesses that fail, if any.
+        hooks: The `SublemonHooks` (such as `SublemonMetrics`) to notify of
+            every transition in the lifecycle of this server's subprocesses.
+            Without any, observing subprocesses costs nothing.
+
+    """
 
     def __init__(self, max_concurrency: int=_DEFAULT_MC,
-                 poll_delta: float=_DEFAULT_PD) -> None:
+                 poll_delta: float=_DEFAULT_PD,
+                 completion: str=_DEFAULT_CM,
+                 output_policy: str=_DEFAULT_OP,
+                 output_limit: int=DEFAULT_LIMIT,
+                 output_lines: Optional[int]=None,
+                 launcher: Union[str, SublemonLauncher]=_DEFAULT_LN,
+                 adaptive: bool=False,
+                 concurrency_floor: int=1,
+                 concurrency_ceiling: Optional[int]=None,
+                 adapt_interval: float=_DEFAULT_AI,
+                 timeout: Optional[float]=None,
+                 deadline: Optional[float]=None,
+                 kill_grace: float=_DEFAULT_KG,
+                 cache: Optional[ResultCache]=None,
+                 retry: Optional[RetryPolicy]=None,
+                 hooks: Iterable[SublemonHooks]=()) -> None:
+        if completion not in _COMPLETION_MODES:
+            raise SublemonRuntimeError(
+                'Invalid `completion` kwarg received: `' + str(completion) +
+                '`')
+        validate_policy(output_policy)
+        if concurrency_ceiling is None:
+            concurrency_ceiling = max_concurrency
+        if adaptive and not 1 <= concurrency_floor <= concurrency_ceiling:
+            raise SublemonRuntimeError(
+                'Invalid `concurrency_floor` kwarg received: `' +
+                str(concurrency_floor) + '`')
+
         self._max_concurrency = max_concurrency
         self._poll_delta = poll_delta
-        self._sem = asyncio.BoundedSemaphore(max_concurrency)
+        self._completion = completion
+        self._output_policy = output_policy
+        self._output_limit = output_limit
+        self._output_lines = output_lines
+        self._timeout = timeout
+        self._deadline = deadline
+        self._kill_grace = kill_grace
+        self._cache = cache
+        self._retry = retry
+        self._hooks: Tuple[SublemonHooks, ...] = tuple(hooks)
+        # in-flight captures of cacheable commands, and the number of
+        # callers waiting on each, by cache key
+        self._coalesced: Dict[str, asyncio.Future] = {}
+        self._waiters: 'collections.Counter[str]' = collections.Counter()
+        self._launcher = make_launcher(launcher)
+        self._poll_task: Optional[asyncio.Future] = None
+        self._adaptive: Optional[AdaptiveConcurrency] = None
+        self._adapt_interval = adapt_interval
+        self._adapt_task: Optional[asyncio.Future] = None
+        if adaptive:
+            self._adaptive = AdaptiveConcurrency(
+                max_concurrency, concurrency_floor, concurrency_ceiling)
+            max_concurrency = self._adaptive.limit
+        self._scheduler = SublemonScheduler(max_concurrency)
         self._is_running = False
         self._pending_set: Set[SublemonSubprocess] = set()
         self._running_set: Set[SublemonSubprocess] = set()
 
     def __str__(self):
-        return ('max concurrency: {}, poll delta: {}, {} running and {} '
-                'pending subprocesses').format(
-                    self._max_concurrency,
-                    self._poll_delta,
-                    len(self._running_set),
-                    len(self._pending_set))
+        s = ('max concurrency: {}, poll delta: {}, {} running and {} '
+             'pending subprocesses').format(
+                 self._max_concurrency,
+                 self._poll_delta,
+                 len(self._running_set),
+                 len(self._pending_set))
+        if self._adaptive is not None:
+            s += ', adaptive limit: {} (floor {}, ceiling {})'.format(
+                self._adaptive.limit,
+                self._adaptive.floor,
+                self._adaptive.ceiling)
+        return s
 
     def __repr__(self):
         return '<Sublemon [{}]>'.format(str(self))
@@ -47,7 +202,11 @@ class Sublemon:
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
-        await self.stop()
+        if exc_type is not None and issubclass(
+                exc_type, asyncio.CancelledError):
+            await self.stop('terminate')
+        else:
+            await self.stop()
 
     async def start(self) -> None:
         """Coroutine to run this server."""
@@ -55,20 +214,66 @@ class Sublemon:
             raise SublemonRuntimeError(
                 'Attempted to start an already-running `Sublemon` instance')
 
-        self._poll_task = asyncio.ensure_future(self._poll())
+        await self._launcher.start(
+            asyncio.get_event_loop(),
+            self._max_concurrency if self._adaptive is None else
+            self._adaptive.ceiling)
+        if self._completion == 'poll':
+            self._poll_task = asyncio.ensure_future(self._poll())
+        if self._adaptive is not None:
+            self._adapt_task = asyncio.ensure_future(self._adapt())
         self._is_running = True
 
-    async def stop(self) -> None:
-        """Coroutine to stop execution of this server."""
-        if not self._is_running:
+    async def stop(self, mode: str='drain',
+                   grace: Optional[float]=None) -> None:
+        """Coroutine to stop execution of this server.
+
+        Args:
+            mode: How to deal with subprocesses that have not finished yet.
+                In `drain` mode (the default), all pending and running
+                subprocesses are waited on. In `cancel` mode, pending
+                subprocesses are cancelled, and running ones are waited on.
+                In `terminate` mode, pending subprocesses are cancelled and
+                running ones are terminated (see `SublemonSubprocess.cancel`),
+                which bounds the time taken to stop by roughly `grace`.
+            grace: In `terminate` mode, the number of seconds in between
+                sending `SIGTERM` and `SIGKILL` to the process groups of
+                running subprocesses; defaults to `kill_grace`.
+
+        If this coroutine is cancelled while waiting on subprocesses, all of
+        them are cancelled.
+
+        """
+        if mode not in _STOP_MODES:
+            raise SublemonRuntimeError(
+                'Invalid `mode` kwarg received: `' + str(mode) + '`')
+        elif not self._is_running:
             raise SublemonRuntimeError(
                 'Attempted to stop an already-stopped `Sublemon` instance')
 
-        await self.block()
-        self._poll_task.cancel()
+        if mode != 'drain':
+            for sp in list(self._pending_set):
+                sp.cancel()
+        if mode == 'terminate':
+            for sp in list(self._running_set):
+                sp.cancel(grace)
+        try:
+            await self.block()
+        except asyncio.CancelledError:
+            self._cancel_all(grace)
+            raise
         self._is_running = False
-        with suppress(asyncio.CancelledError):
-            await self._poll_task
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._poll_task
+            self._poll_task = None
+        if self._adapt_task is not None:
+            self._adapt_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._adapt_task
+            self._adapt_task = None
+        await self._launcher.stop()
 
     async def _poll(self) -> None:
         """Coroutine to poll status of running subprocesses."""
@@ -77,66 +282,621 @@ class Sublemon:
             for subproc in list(self._running_set):
                 subproc._poll()
 
+    async def _adapt(self) -> None:
+        """Coroutine to periodically adjust the adaptive concurrency limit."""
+        adaptive: AdaptiveConcurrency = self._adaptive  # type: ignore
+        while True:
+            await asyncio.sleep(self._adapt_interval)
+            self._scheduler.set_limit(adaptive.adjust(
+                len(self._running_set), len(self._pending_set)))
+
     async def iter_lines(
             self,
-            *cmds: str,
-            stream: str='both') -> AsyncGenerator[str, None]:
+            *cmds: Command,
+            stream: str='both',
+            output_filter: Optional[OutputFilter]=None
+    ) -> AsyncGenerator[str, None]:
         """Coroutine to spawn commands and yield text lines from stdout."""
-        sps = self.spawn(*cmds)
+        outputs = self.iter_output(
+            *cmds, stream=stream, output_filter=output_filter)
+        try:
+            async for output in outputs:
+                yield output.line.rstrip()
+        finally:
+            await outputs.aclose()
+
+    async def iter_output(
+            self,
+            *cmds: Command,
+            stream: str='both',
+            output_filter: Optional[OutputFilter]=None
+    ) -> AsyncGenerator[OutputLine, None]:
+        """Coroutine to spawn commands and yield their tagged output lines.
+
+        Each yielded `OutputLine` holds the subprocess and the name of the
+        stream (`stdout` or `stderr`) that the line came from, and the line
+        itself, decoded as UTF-8 and without its trailing newline. Lines are
+        yielded as soon as they are read from any subprocess.
+
+        If iteration is stopped early (e.g., by closing or cancelling the
+        consumer), any of the spawned subprocesses that have not finished
+        are cancelled.
+
+        Args:
+            stream: Which output to yield: `stdout`, `stderr`, or `both`.
+            output_filter: The filter applied to the output of each
+                subprocess, so that only the lines it keeps are ever split
+                into lines and decoded (see `OutputFilter`).
+
+        """
         if stream == 'both':
-            agen = amerge(
-                amerge(*[sp.stdout for sp in sps]),
-                amerge(*[sp.stderr for sp in sps]))
-        elif stream == 'stdout':
-            agen = amerge(*[sp.stdout for sp in sps])
-        elif stream == 'stderr':
-            agen = amerge(*[sp.stderr for sp in sps])
+            streams: Tuple[str, ...] = ('stdout', 'stderr',)
+        elif stream in ('stdout', 'stderr',):
+            streams = (stream,)
         else:
             raise SublemonRuntimeError(
                 'Invalid `stream` kwarg received: `' + str(stream) + '`')
-        async for line in agen:
-            yield line.decode('utf-8').rstrip()
 
-    async def gather(self, *cmds: str) -> Tuple[int]:
+        sps = self.spawn(*cmds, output_filter=output_filter)
+        outputs = multiplex(sps, streams)
+        exhausted = False
+        try:
+            async for output in outputs:
+                yield output
+            exhausted = True
+        finally:
+            await outputs.aclose()
+            if not exhausted:
+                for sp in sps:
+                    sp.cancel()
+
+    async def gather(self, *cmds: Command, timeout: Optional[float]=None,
+                     deadline: Optional[float]=None,
+                     inputs: Iterable[str]=()) -> Tuple[int]:
         """Coroutine to spawn subprocesses and block until completion.
 
         Note:
             The same `max_concurrency` restriction that applies to `spawn`
-            also applies here.
+            also applies here, as do the `timeout` and `deadline` kwargs.
+
+        If this server has a `cache`, commands are run through `capture`
+        instead, so that their results are cached; `inputs` are then the
+        paths of files the commands depend on (see `capture`).
+
+        If this coroutine is cancelled, the spawned subprocesses are
+        cancelled, too.
 
         Returns:
             The exit codes of the spawned subprocesses, in the order they were
             passed.
 
         """
-        subprocs = self.spawn(*cmds)
+        if self._cache is not None:
+            input_digests = await self._digest_inputs(inputs)
+            return await asyncio.gather(*[  # type: ignore
+                _exit_code(self._capture(
+                    cmd, timeout, deadline, input_digests))
+                for cmd in cmds])
+
+        subprocs = self.spawn(*cmds, timeout=timeout, deadline=deadline)
         subproc_wait_coros = [subproc.wait_done() for subproc in subprocs]
-        return await asyncio.gather(*subproc_wait_coros)  # type: ignore
+        try:
+            return await asyncio.gather(*subproc_wait_coros)  # type: ignore
+        except asyncio.CancelledError:
+            for subproc in subprocs:
+                subproc.cancel()
+            raise
+
+    async def capture(self, *cmds: Command, timeout: Optional[float]=None,
+                      deadline: Optional[float]=None,
+                      inputs: Iterable[str]=()) -> List[CommandResult]:
+        """Coroutine to run commands and capture their full output.
+
+        Output is buffered with the `spill` policy, so no output is lost,
+        however much there is.
+
+        If this server has a `cache`, results are looked up in it first,
+        keyed on the command, the current working directory and
+        environment, and the contents of the files at the `inputs` paths;
+        commands that are not found are run, and their results stored
+        (unless they were terminated or cancelled). Identical commands that
+        are captured at the same time are only run once.
+
+        If this coroutine is cancelled, the spawned subprocesses are
+        cancelled, too.
+
+        Returns:
+            The `CommandResult` of each command, in the order they were
+            passed; results taken from the cache are marked as `cached`.
+
+        """
+        input_digests = await self._digest_inputs(inputs)
+        return await asyncio.gather(*[
+            self._capture(cmd, timeout, deadline, input_digests)
+            for cmd in cmds])
+
+    async def _digest_inputs(
+            self, inputs: Iterable[str]) -> Tuple[Tuple[str, str], ...]:
+        """Coroutine to digest the input files of cached commands."""
+        if self._cache is None or not inputs:
+            return ()
+        return await asyncio.get_event_loop().run_in_executor(
+            None, digest_inputs, list(inputs))
+
+    async def _capture(
+            self, cmd: Command, timeout: Optional[float],
+            deadline: Optional[float],
+            input_digests: Tuple[Tuple[str, str], ...]) -> CommandResult:
+        """Coroutine to capture one command, going through the cache."""
+        if self._cache is None:
+            result, _ = await self._run_captured(cmd, timeout, deadline)
+            return result
+
+        key = ResultCache.key(cmd, input_digests)
+        hit = await self._cache.aget(key)
+        if hit is not None:
+            return hit._replace(cached=True)
+
+        shared = self._coalesced.get(key)
+        if shared is None:
+            shared = self._coalesced[key] = asyncio.ensure_future(
+                self._capture_shared(key, cmd, timeout, deadline))
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(shared)
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                # nobody is left to hand the result to
+                shared.cancel()
+
+    async def _capture_shared(
+            self, key: str, cmd: Command, timeout: Optional[float],
+            deadline: Optional[float]) -> CommandResult:
+        """Coroutine to capture a command on behalf of all of its callers.
+
+        The capture is only cancelled once all of the callers are.
+
+        """
+        cache: ResultCache = self._cache  # type: ignore
+        try:
+            result, cacheable = await self._run_captured(
+                cmd, timeout, deadline)
+            if cacheable:
+                # the result is stored even if we are cancelled meanwhile
+                await asyncio.shield(cache.aput(key, result))
+        finally:
+            del self._coalesced[key]
+        return result
+
+    async def _run_captured(
+            self, cmd: Command, timeout: Optional[float],
+            deadline: Optional[float]) -> Tuple[CommandResult, bool]:
+        """Coroutine to run a command and capture its output.
+
+        Returns:
+            The result, and whether it may be cached.
+
+        """
+        sp, = self.spawn(
+            cmd, output_policy='spill', timeout=timeout, deadline=deadline)
+        try:
+            # the output is all kept, so it can be read once the last of any
+            # retries has finished
+            exit_code = await sp.wait_done()
+            stdout, stderr = await asyncio.gather(
+                _read_all(sp, 'stdout'), _read_all(sp, 'stderr'))
+        except asyncio.CancelledError:
+            sp.cancel()
+            raise
+        result = CommandResult(exit_code, stdout, stderr)
+        return result, sp.termination_reason is None
 
     async def block(self) -> None:
-        """Block until all running and pending subprocesses have finished."""
-        await asyncio.gather(
-            *itertools.chain(
-                (sp.wait_done() for sp in self._running_set),
-                (sp.wait_done() for sp in self._pending_set)))
+        """Block until all running and pending subprocesses have finished.
+
+        This includes any subprocesses spawned while blocking.
+
+        """
+        while self._running_set or self._pending_set:
+            await asyncio.gather(
+                *(sp.wait_done() for sp in itertools.chain(
+                    list(self._running_set), list(self._pending_set))),
+                return_exceptions=True)
 
-    def spawn(self, *cmds: str) -> List[SublemonSubprocess]:
-        """Coroutine to spawn shell commands.
+    def _cancel_all(self, grace: Optional[float]=None) -> None:
+        """Cancel all pending and running subprocesses."""
+        for sp in itertools.chain(
+                list(self._pending_set), list(self._running_set)):
+            sp.cancel(grace)
+
+    def spawn(self, *cmds: Command, output_policy: Optional[str]=None,
+              output_limit: Optional[int]=None,
+              output_lines: Optional[int]=None,
+              output_filter: Optional[OutputFilter]=None, priority: int=0,
+              group: Optional[str]=None, timeout: Optional[float]=None,
+              deadline: Optional[float]=None,
+              stdin: Optional[Input]=None,
+              retry: Optional[RetryPolicy]=None) -> List[SublemonSubprocess]:
+        """Coroutine to spawn commands.
+
+        Each command may either be a string, which is run through the shell,
+        or a sequence of strings, which is executed directly as an argv.
 
         If `max_concurrency` is reached during the attempt to spawn the
-        specified subprocesses, excess subprocesses will block while attempting
-        to acquire this server's semaphore.
+        specified subprocesses, excess subprocesses will wait in this server's
+        scheduler queue. Subprocesses with a higher `priority` are admitted
+        first; within a priority, subprocesses of different `group`s share
+        slots in proportion to the groups' weights (see `set_group_weight`),
+        and subprocesses of the same group are admitted in FIFO order.
+
+        The `output_policy`, `output_limit`, and `output_lines` kwargs
+        override this server's defaults for the spawned subprocesses. Their
+        output is passed through the `output_filter`, if any, before it is
+        buffered (see `OutputFilter`).
+
+        Subprocesses that run for longer than `timeout` seconds, or past
+        the `deadline` (in terms of the event loop's clock), have their
+        process group sent `SIGTERM`, and then `SIGKILL` after this server's
+        `kill_grace` period; see `SublemonSubprocess.termination_reason`.
+        Both default to this server's settings.
+
+        The `stdin` kwarg is fed to the stdin of the spawned subprocesses
+        (see `SublemonSubprocess`); anything other than bytes can only be
+        fed to a single subprocess.
+
+        Subprocesses that fail are re-run according to the `retry` policy,
+        which defaults to this server's; see `RetryPolicy`. A subprocess
+        only finishes once it succeeds or runs out of retries, and it waits
+        for a slot again (without holding one) before each retry.
 
         """
         if not self._is_running:
             raise SublemonRuntimeError(
                 'Attempted to spawn subprocesses from a non-started server')
+        elif stdin is not None and len(cmds) > 1 and not isinstance(
+                stdin, (bytes, bytearray, memoryview,)):
+            raise SublemonRuntimeError(
+                'Attempted to feed the same non-bytes `stdin` to multiple '
+                'subprocesses')
 
-        subprocs = [SublemonSubprocess(self, cmd) for cmd in cmds]
+        subprocs = [
+            SublemonSubprocess(
+                self, cmd,
+                output_policy=output_policy,
+                output_limit=output_limit,
+                output_lines=output_lines,
+                output_filter=output_filter,
+                priority=priority,
+                group=group,
+                timeout=timeout,
+                deadline=deadline,
+                stdin=stdin,
+                retry=retry)
+            for cmd in cmds]
         for sp in subprocs:
-            asyncio.ensure_future(sp.spawn())
+            sp._queue()
         return subprocs
 
+    def pipeline(self, *cmds: Command, output_policy: Optional[str]=None,
+                 output_limit: Optional[int]=None,
+                 output_lines: Optional[int]=None,
+                 output_filter: Optional[OutputFilter]=None,
+                 priority: int=0,
+                 group: Optional[str]=None, timeout: Optional[float]=None,
+                 deadline: Optional[float]=None,
+                 stdin: Optional[Input]=None) -> List[SublemonSubprocess]:
+        """Spawn commands as the stages of a pipeline, like `a | b | c`.
+
+        The stdout of each stage is connected to the stdin of the next
+        through an OS pipe, so data flows between stages at the speed of the
+        pipe, without passing through Python. Only the last stage's stdout
+        can be read; the stderr of every stage can be read as usual. The
+        `stdin` kwarg is fed to the first stage.
+
+        Every stage takes up a slot of its own, but the stages are admitted
+        together (as soon as enough slots are free for all of them), since
+        running only some of them could block forever on a full pipe.
+
+        The remaining kwargs are the same as those of `spawn`, and apply to
+        every stage.
+
+        Returns:
+            The subprocesses of the stages, in order.
+
+        """
+        if not self._is_running:
+            raise SublemonRuntimeError(
+                'Attempted to spawn subprocesses from a non-started server')
+        elif not cmds:
+            raise SublemonRuntimeError(
+                'Attempted to spawn a pipeline with no commands')
+
+        admission = SharedAdmission(self._scheduler, len(cmds))
+        stages: List[SublemonSubprocess] = []
+        try:
+            for cmd in cmds:
+                sp = SublemonSubprocess(
+                    self, cmd,
+                    output_policy=output_policy,
+                    output_limit=output_limit,
+                    output_lines=output_lines,
+                    output_filter=output_filter,
+                    priority=priority,
+                    group=group,
+                    timeout=timeout,
+                    deadline=deadline,
+                    stdin=stages[-1] if stages else stdin)
+                sp._admission = admission
+                stages.append(sp)
+        except BaseException:
+            for sp in stages:
+                sp._close_fds()
+            raise
+
+        for sp in stages:
+            sp._queue()
+        return stages
+
+    async def map(
+            self,
+            cmds: Union[Iterable[Command], AsyncIterable[Command]],
+            ordered: bool=False,
+            lookahead: int=_DEFAULT_LA,
+            output_policy: Optional[str]=None,
+            output_limit: Optional[int]=None,
+            output_lines: Optional[int]=None,
+            output_filter: Optional[OutputFilter]=None,
+            priority: int=0,
+            group: Optional[str]=None,
+            timeout: Optional[float]=None,
+            deadline: Optional[float]=None,
+            retry: Optional[RetryPolicy]=None
+    ) -> AsyncGenerator[SublemonSubprocess, None]:
+        """Coroutine to lazily run commands and yield them as they finish.
+
+        Unlike `spawn`, commands are pulled from `cmds` (a synchronous or an
+        asynchronous iterable) only as there is room for them to run, so at
+        most the current concurrency limit plus `lookahead` subprocesses
+        exist at any time. This keeps memory use bounded by the concurrency,
+        rather than the total number of commands.
+
+        Finished subprocesses are yielded in the order they complete, or,
+        if `ordered` is set, in the order of `cmds`. Since subprocesses are
+        only yielded once they are done, output that is needed afterwards
+        should be buffered with the `ring` or `spill` `output_policy`; under
+        the `pipe` policy, a subprocess that fills its pipes will block
+        forever.
+
+        If iteration is stopped early (e.g., by closing or cancelling the
+        consumer), the subprocesses that have not been yielded yet are
+        cancelled.
+
+        The remaining kwargs are the same as those of `spawn`.
+
+        """
+        agen = self._map(
+            cmds, ordered, lookahead, _run,
+            output_policy=output_policy,
+            output_limit=output_limit,
+            output_lines=output_lines,
+            output_filter=output_filter,
+            priority=priority,
+            group=group,
+            timeout=timeout,
+            deadline=deadline,
+            retry=retry)
+        async for sp in agen:
+            yield sp
+
+    async def run_many(
+            self,
+            cmds: Union[Iterable[Command], AsyncIterable[Command]],
+            ordered: bool=False,
+            max_output: int=DEFAULT_LIMIT,
+            encoding: Optional[str]=None,
+            errors: str='replace',
+            output_filter: Optional[OutputFilter]=None,
+            lookahead: int=_DEFAULT_LA,
+            priority: int=0,
+            group: Optional[str]=None,
+            timeout: Optional[float]=None,
+            deadline: Optional[float]=None,
+            retry: Optional[RetryPolicy]=None
+    ) -> AsyncGenerator[RunResult, None]:
+        """Coroutine to lazily run commands and yield their results.
+
+        Commands are run the same way as with `map`, but their output is
+        captured for you: each pipe is drained in bulk as data arrives,
+        keeping the first `max_output` bytes and dropping the rest, without
+        any coroutine having to consume it. Once a subprocess has exited and
+        both of its pipes are closed, a `RunResult` is yielded with its exit
+        code, output (decoded with `encoding`, if specified), whether either
+        pipe was truncated, and how long it waited for a slot and ran for.
+        Only the output kept by the `output_filter`, if any, is captured
+        (and counted towards `max_output`).
+
+        Subprocesses that could not be launched (or were never started
+        because they were cancelled or ran out of time) are yielded with an
+        `exit_code` of `None` and the `error` that `wait_done` would have
+        raised.
+
+        The `ordered`, `lookahead`, `priority`, `group`, `timeout`,
+        `deadline`, and `retry` kwargs are the same as those of `map`. The
+        output of a retried subprocess is that of its last attempt.
+
+        """
+        agen = self._map(
+            cmds, ordered, lookahead, _run_to_eof,
+            output_policy='capture',
+            output_limit=max_output,
+            output_filter=output_filter,
+            priority=priority,
+            group=group,
+            timeout=timeout,
+            deadline=deadline,
+            retry=retry)
+        async for sp in agen:
+            yield make_result(sp, encoding, errors)
+
+    async def _map(
+            self,
+            cmds: Union[Iterable[Command], AsyncIterable[Command]],
+            ordered: bool,
+            lookahead: int,
+            runner: Callable[[SublemonSubprocess],
+                             Awaitable[SublemonSubprocess]],
+            **kwargs: Any
+    ) -> AsyncGenerator[SublemonSubprocess, None]:
+        """Asynchronous generator implementing `map` and `run_many`.
+
+        Each subprocess is driven to completion by a `runner` task, and
+        yielded once that task is done.
+
+        """
+        if not self._is_running:
+            raise SublemonRuntimeError(
+                'Attempted to spawn subprocesses from a non-started server')
+        elif lookahead < 0:
+            raise SublemonRuntimeError(
+                'Invalid `lookahead` kwarg received: `' + str(lookahead) +
+                '`')
+
+        cmd_iter = aiterate(cmds).__aiter__()
+        exhausted = False
+        alive: Set[SublemonSubprocess] = set()
+        in_flight: Deque[asyncio.Future] = collections.deque()
+        finished: asyncio.Queue = asyncio.Queue()
+        try:
+            while True:
+                while (not exhausted and
+                       len(alive) < self._scheduler.limit + lookahead):
+                    try:
+                        cmd = await cmd_iter.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    sp = SublemonSubprocess(self, cmd, **kwargs)
+                    fut = sp._queue(runner(sp))
+                    if ordered:
+                        in_flight.append(fut)
+                    else:
+                        fut.add_done_callback(finished.put_nowait)
+                    alive.add(sp)
+
+                if not alive:
+                    return
+                elif ordered:
+                    # cancelling the consumer must not cancel the runner out
+                    # from under its subprocess; that is up to `cancel`
+                    sp = await asyncio.shield(in_flight[0])
+                    in_flight.popleft()
+                else:
+                    sp = (await finished.get()).result()
+                alive.remove(sp)
+                yield sp
+        finally:
+            for sp in alive:
+                sp.cancel()
+
+    async def run_graph(
+            self, graph: JobGraph, fail_fast: bool=True,
+            prioritize: bool=True) -> Dict[str, Optional[SublemonSubprocess]]:
+        """Coroutine to run a graph of jobs, respecting their dependencies.
+
+        Each job is spawned the moment the last of its dependencies has
+        succeeded, rather than in stages, so slots do not sit idle while a
+        stage's slowest job finishes. A job succeeds if it exits with a
+        zero exit code.
+
+        If a job fails and `fail_fast` is set, no more jobs are started and
+        the running ones are cancelled; otherwise, every job that does not
+        (directly or indirectly) depend on a failed one still runs.
+
+        If `prioritize` is set, ready jobs are admitted in order of their
+        critical paths (see `JobGraph.critical_paths`), longest first, so
+        that the jobs holding up the most work start as soon as possible.
+        A job's own `priority` still takes precedence.
+
+        If this coroutine is cancelled, all of the graph's unfinished jobs
+        are cancelled, too.
+
+        Returns:
+            Each job's subprocess, or `None` for the jobs that were never
+            started.
+
+        Raises:
+            SublemonRuntimeError: If the graph depends on unknown jobs, or
+                has a dependency cycle.
+
+        """
+        if not self._is_running:
+            raise SublemonRuntimeError(
+                'Attempted to spawn subprocesses from a non-started server')
+
+        order = graph.topological_order()
+        dependents = graph.dependents()
+        ranks: Dict[str, int] = {}
+        if prioritize:
+            paths = graph.critical_paths()
+            levels = {p: i for i, p in enumerate(sorted(set(paths.values())))}
+            ranks = {name: levels[paths[name]] for name in order}
+        num_ranks = len(ranks) + 1
+
+        results: Dict[str, Optional[SublemonSubprocess]] = dict.fromkeys(
+            order)
+        names: Dict[SublemonSubprocess, str] = {}
+        remaining = {name: len(graph.deps(name)) for name in order}
+        alive: Set[SublemonSubprocess] = set()
+        finished: asyncio.Queue = asyncio.Queue()
+        failed = False
+
+        def start(name: str) -> None:
+            job = graph._jobs[name]
+            kwargs = dict(job.kwargs)
+            kwargs['priority'] = (kwargs.get('priority', 0) * num_ranks +
+                                  ranks.get(name, 0))
+            sp = SublemonSubprocess(self, job.cmd, **kwargs)
+            fut = sp._queue(_run(sp))
+            fut.add_done_callback(finished.put_nowait)
+            results[name] = sp
+            names[sp] = name
+            alive.add(sp)
+
+        try:
+            ready = [name for name in order if not remaining[name]]
+            # the first jobs may be admitted right away, so start the most
+            # critical ones first
+            for name in sorted(ready, key=lambda n: -ranks.get(n, 0)):
+                start(name)
+            while alive:
+                sp = (await finished.get()).result()
+                alive.remove(sp)
+                if sp.exit_code == 0 and sp._spawn_error is None:
+                    if failed:
+                        continue
+                    for dependent in dependents[names[sp]]:
+                        remaining[dependent] -= 1
+                        if not remaining[dependent]:
+                            start(dependent)
+                elif fail_fast and not failed:
+                    failed = True
+                    for other in alive:
+                        other.cancel()
+        finally:
+            for sp in alive:
+                sp.cancel()
+        return results
+
+    def set_group_weight(self, group: str, weight: float) -> None:
+        """Set the share of slots a group gets relative to other groups.
+
+        All groups have a weight of 1 until changed.
+
+        """
+        self._scheduler.set_weight(group, weight)
+
     @property
     def running_subprocesses(self) -> Set[SublemonSubprocess]:
         """Get the currently-executing subprocesses."""
@@ -152,7 +912,120 @@ class Sublemon:
         """The max number of subprocesses that can be running concurrently."""
         return self._max_concurrency
 
+    @property
+    def concurrency_limit(self) -> int:
+        """The current limit on concurrently-running subprocesses.
+
+        This is always `max_concurrency` unless adaptive concurrency is
+        enabled.
+
+        """
+        return self._scheduler.limit
+
+    @property
+    def concurrency_metrics(self) -> Dict[str, Optional[float]]:
+        """Metrics about this server's concurrency and its limit.
+
+        In adaptive mode, this includes the latest host metrics the limit
+        was based on (`load_per_cpu`, `free_memory`, `open_fds`,
+        `nofile_limit`, and `fd_cap`), the smoothed subprocess `latency` in
+        seconds, and the `floor` and `ceiling` of the limit. Metrics that
+        have not been or cannot be sampled are `None` or absent.
+
+        """
+        metrics: Dict[str, Optional[float]] = {}
+        if self._adaptive is not None:
+            metrics.update(self._adaptive.metrics)
+        metrics.update(
+            limit=self._scheduler.limit,
+            running=len(self._running_set),
+            pending=len(self._pending_set))
+        return metrics
+
+    @property
+    def adaptive(self) -> bool:
+        """Whether the concurrency limit adapts to the state of the host."""
+        return self._adaptive is not None
+
     @property
     def poll_delta(self) -> float:
         """The number of seconds to sleep in between polls of subprocesses."""
         return self._poll_delta
+
+    @property
+    def output_policy(self) -> str:
+        """The default buffering policy for subprocess output pipes."""
+        return self._output_policy
+
+    @property
+    def output_limit(self) -> int:
+        """The default max number of bytes buffered per output pipe."""
+        return self._output_limit
+
+    @property
+    def timeout(self) -> Optional[float]:
+        """The default max number of seconds a subprocess may run for."""
+        return self._timeout
+
+    @property
+    def deadline(self) -> Optional[float]:
+        """The default event loop time by which subprocesses must finish."""
+        return self._deadline
+
+    @property
+    def kill_grace(self) -> float:
+        """The number of seconds between `SIGTERM` and `SIGKILL`."""
+        return self._kill_grace
+
+    @property
+    def retry(self) -> Optional[RetryPolicy]:
+        """The default policy for re-running failed subprocesses."""
+        return self._retry
+
+    @property
+    def hooks(self) -> Tuple[SublemonHooks, ...]:
+        """The hooks notified of the lifecycle of subprocesses."""
+        return self._hooks
+
+    @property
+    def cache(self) -> Optional[ResultCache]:
+        """The cache of the results of `gather` and `capture`, if any."""
+        return self._cache
+
+    @property
+    def launcher(self) -> SublemonLauncher:
+        """The backend used to launch subprocesses."""
+        return self._launcher
+
+    @property
+    def completion(self) -> str:
+        """How subprocess completion is detected (`event` or `poll`)."""
+        return self._completion
+
+
+async def _exit_code(capture: Awaitable[CommandResult]) -> int:
+    """Coroutine to capture a command, keeping only its exit code."""
+    return (await capture).exit_code
+
+
+async def _run(sp: SublemonSubprocess) -> SublemonSubprocess:
+    """Coroutine to spawn a subprocess and wait for it to finish."""
+    await sp.spawn()
+    with suppress(Exception):
+        await sp.wait_done()
+    return sp
+
+
+async def _run_to_eof(sp: SublemonSubprocess) -> SublemonSubprocess:
+    """Coroutine to run a subprocess and wait for its pipes to close."""
+    await _run(sp)
+    for reader in (sp._stdout, sp._stderr,):
+        if reader is not None:
+            await reader.wait_eof()  # type: ignore
+    return sp
+
+
+async def _read_all(sp: SublemonSubprocess, stream: str) -> bytes:
+    """Coroutine to read all of the output of a subprocess's pipe."""
+    chunks: List[Any] = [chunk async for chunk in sp.iter_chunks(stream)]
+    return b''.join(chunks)
@@ -0,0 +1,193 @@
+"""Admission scheduling of subprocesses onto a `Sublemon` runtime's slots."""
+
+import asyncio
+import heapq
+import itertools
+
+from typing import (
+    Dict,
+    List,
+    Optional)
+
+from sublemon.errors import SublemonRuntimeError
+
+_DEFAULT_WEIGHT: float = 1.0
+
+
+class _Group:
+
+    """Fair-sharing state of a named group of subprocesses."""
+
+    __slots__ = ('weight', 'finish_tags',)
+
+    def __init__(self, weight: float) -> None:
+        self.weight = weight
+        # the virtual finish tag of the group's last waiter, per priority
+        self.finish_tags: Dict[int, float] = {}
+
+
+class SublemonScheduler:
+
+    """Priority and weighted fair-share queue for subprocess slots.
+
+    Waiters with a higher priority are always admitted first. Within a
+    priority level, named groups share the available slots in proportion to
+    their weights (via start-time fair queueing), and waiters of the same
+    group and priority are admitted in FIFO order. Both acquiring and
+    releasing a slot are O(log n) in the number of waiters.
+
+    """
+
+    def __init__(self, limit: int) -> None:
+        self._limit = limit
+        self._in_use = 0
+        self._heap: List[list] = []
+        self._counter = itertools.count()
+        self._groups: Dict[Optional[str], _Group] = {}
+        self._vtimes: Dict[int, float] = {}
+
+    @property
+    def limit(self) -> int:
+        """The number of slots that may be in use at the same time."""
+        return self._limit
+
+    @property
+    def in_use(self) -> int:
+        """The number of slots currently in use."""
+        return self._in_use
+
+    def set_limit(self, limit: int) -> None:
+        """Change the number of available slots.
+
+        Lowering the limit never takes slots away from their holders; it
+        just holds back new admissions until enough slots are released.
+
+        """
+        self._limit = limit
+        self._dispatch()
+
+    def set_weight(self, group: Optional[str], weight: float) -> None:
+        """Set the fair-share weight of a group."""
+        if weight <= 0:
+            raise SublemonRuntimeError(
+                'Group weights must be positive, got `' + str(weight) + '`')
+        self._group(group).weight = weight
+
+    def get_weight(self, group: Optional[str]) -> float:
+        """Get the fair-share weight of a group."""
+        return self._group(group).weight
+
+    async def acquire(self, priority: int=0,
+                      group: Optional[str]=None, slots: int=1) -> None:
+        """Coroutine to wait for and take hold of some slots.
+
+        Multiple `slots` are taken at once, as soon as they are all free
+        (or, if there are more of them than the limit allows, as soon as
+        no other slots are in use). Each one must be released separately.
+
+        """
+        self._prune()
+        if not self._heap and self._fits(slots):
+            self._in_use += slots
+            return
+
+        grp = self._group(group)
+        start_tag = max(self._vtimes.get(priority, 0.0),
+                        grp.finish_tags.get(priority, 0.0))
+        grp.finish_tags[priority] = start_tag + 1.0 / grp.weight
+
+        waiter = asyncio.get_event_loop().create_future()
+        heapq.heappush(
+            self._heap,
+            [-priority, start_tag, next(self._counter), waiter, slots])
+        # we may have jumped ahead of a waiter for more slots than are free
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # we were handed our slots just as we were cancelled
+                for _ in range(slots):
+                    self.release()
+            raise
+
+    def release(self) -> None:
+        """Give back a slot acquired via `acquire`."""
+        self._in_use -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Admit waiters, in order, while there are enough free slots."""
+        self._prune()
+        while self._heap and self._fits(self._heap[0][4]):
+            neg_priority, start_tag, _, waiter, slots = heapq.heappop(
+                self._heap)
+            self._in_use += slots
+            self._vtimes[-neg_priority] = start_tag
+            waiter.set_result(None)
+            self._prune()
+
+    def _fits(self, slots: int) -> bool:
+        """Whether a waiter for `slots` slots may be admitted right now."""
+        return self._in_use + slots <= self._limit or (
+            not self._in_use and slots > self._limit)
+
+    def _prune(self) -> None:
+        """Drop cancelled waiters from the front of the queue."""
+        while self._heap and self._heap[0][3].done():
+            heapq.heappop(self._heap)
+
+    def _group(self, group: Optional[str]) -> _Group:
+        grp = self._groups.get(group)
+        if grp is None:
+            grp = self._groups[group] = _Group(_DEFAULT_WEIGHT)
+        return grp
+
+
+class SharedAdmission:
+
+    """Admission of a set of subprocesses that must all run together.
+
+    The stages of a pipeline block on one another through their pipes, so
+    admitting only some of them could deadlock the runtime. Instead, the
+    first stage to wait for admission acquires one slot for every stage in
+    a single `acquire`, and all stages are admitted at once. Stages that
+    give up waiting (e.g., because they were cancelled) hand their slots
+    back once the rest of the set is admitted.
+
+    """
+
+    def __init__(self, scheduler: SublemonScheduler, size: int) -> None:
+        self._scheduler = scheduler
+        self._size = size
+        self._waiting = size
+        self._withdrawn = 0
+        self._admitted: Optional[asyncio.Future] = None
+
+    async def acquire(self, priority: int=0,
+                      group: Optional[str]=None) -> None:
+        """Coroutine to wait for the whole set to be admitted."""
+        if self._admitted is None:
+            self._admitted = asyncio.ensure_future(self._scheduler.acquire(
+                priority, group, self._size))
+            self._admitted.add_done_callback(self._on_admitted)
+
+        admitted = self._admitted
+        try:
+            await asyncio.shield(admitted)
+        except asyncio.CancelledError:
+            self._waiting -= 1
+            if admitted.done() and not admitted.cancelled():
+                # our slot was handed over just as we were cancelled
+                self._scheduler.release()
+            else:
+                self._withdrawn += 1
+                if not self._waiting:
+                    admitted.cancel()
+            raise
+        self._waiting -= 1
+
+    def _on_admitted(self, admitted: asyncio.Future) -> None:
+        if not admitted.cancelled():
+            for _ in range(self._withdrawn):
+                self._scheduler.release()
@@ -0,0 +1,479 @@
+"""Spreading subprocesses across several event loops."""
+
+import asyncio
+import itertools
+import os
+import sys
+import threading
+
+from contextlib import closing
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union)
+
+import sublemon
+
+from sublemon._shard import (
+    failed,
+    frame,
+    read_frame,
+    ShardServer)
+from sublemon.errors import SublemonRuntimeError
+from sublemon.output import DEFAULT_LIMIT
+from sublemon.runtime import Sublemon
+from sublemon.scheduler import SublemonScheduler
+from sublemon.subprocess import Command
+from sublemon.utils import (
+    aiterate,
+    LoopFactory,
+    new_event_loop,
+    validate_loop_factory)
+
+_DEFAULT_MC: int = 25
+_DEFAULT_SM: str = 'process'
+
+_SHARD_MODES = ('thread', 'process',)
+
+
+class ShardResult(NamedTuple):
+
+    """The outcome and captured output of a command run by a shard.
+
+    The same as a `RunResult`, but with the `cmd` that was run and the index
+    of the `shard` that ran it in place of the subprocess, which stayed
+    behind in the shard.
+
+    """
+
+    cmd: Command
+    shard: int
+    exit_code: Optional[int]
+    stdout: Union[bytes, str]
+    stderr: Union[bytes, str]
+    stdout_truncated: bool
+    stderr_truncated: bool
+    wait_time: float
+    run_time: Optional[float]
+    error: Optional[Exception]
+
+
+class _Call:
+
+    """The jobs of one `run_many` call, and where their results go."""
+
+    def __init__(self, opts: Dict[str, Any]) -> None:
+        self.opts = opts
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.jobs: Set[int] = set()
+        self.is_open = True
+
+
+class _Shard:
+
+    """The front end's handle on one shard."""
+
+    def __init__(self, index: int, kwargs: Dict[str, Any],
+                 on_results: Callable[['_Shard', List[Tuple[Any, ...]]], None],
+                 on_lost: Callable[['_Shard'], None],
+                 loop_factory: Optional[LoopFactory]) -> None:
+        self.index = index
+        # the ids of the jobs sent to this shard that have not finished yet
+        self.jobs: Set[int] = set()
+        # whether the shard exited unexpectedly
+        self.is_lost = False
+        self._kwargs = kwargs
+        self._on_results = on_results
+        self._on_lost = on_lost
+        self._loop_factory = loop_factory
+
+    async def start(self) -> None:
+        """Coroutine to start the shard's `Sublemon`."""
+        raise NotImplementedError
+
+    def send(self, msg: Tuple[Any, ...]) -> None:
+        """Send a request (see `sublemon._shard`) to the shard."""
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        """Coroutine to stop the shard, terminating its running jobs."""
+        raise NotImplementedError
+
+
+class _ThreadShard(_Shard):
+
+    """A shard running its own event loop in a thread of this process."""
+
+    async def start(self) -> None:
+        front = asyncio.get_event_loop()
+        self._started = front.create_future()
+        self._thread = threading.Thread(
+            target=self._run, args=(front,),
+            name='sublemon-shard-' + str(self.index), daemon=True)
+        self._thread.start()
+        await self._started
+
+    def _run(self, front: asyncio.AbstractEventLoop) -> None:
+        loop = new_event_loop(self._loop_factory)
+        asyncio.set_event_loop(loop)
+        with closing(loop):
+            loop.run_until_complete(self._serve(front))
+
+    async def _serve(self, front: asyncio.AbstractEventLoop) -> None:
+        try:
+            server = Sublemon(**self._kwargs)
+            await server.start()
+        except Exception as e:
+            front.call_soon_threadsafe(self._started.set_exception, e)
+            return
+
+        self._loop = asyncio.get_event_loop()
+        self._stopping = asyncio.Event()
+        self._front = front
+        self._server = ShardServer(server, self._send_results)
+        front.call_soon_threadsafe(self._started.set_result, None)
+        await self._stopping.wait()
+        self._server.cancel_all()
+        await server.stop('terminate')
+
+    def _send_results(self, batch: List[Tuple[Any, ...]]) -> None:
+        self._front.call_soon_threadsafe(self._on_results, self, batch)
+
+    def send(self, msg: Tuple[Any, ...]) -> None:
+        self._loop.call_soon_threadsafe(self._server.handle, msg)
+
+    async def stop(self) -> None:
+        self._loop.call_soon_threadsafe(self._stopping.set)
+        await asyncio.get_event_loop().run_in_executor(
+            None, self._thread.join)
+
+
+class _ProcessShard(_Shard):
+
+    """A shard running in a child process (see `sublemon._shard`)."""
+
+    async def start(self) -> None:
+        # make sure the child imports this same copy of the library
+        root = os.path.dirname(os.path.dirname(
+            os.path.abspath(sublemon.__file__)))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            p for p in (root, env.get('PYTHONPATH'),) if p)
+
+        args = ['-c', 'from sublemon._shard import main; main()']
+        if self._loop_factory is not None:
+            args.append(str(self._loop_factory))
+        self._proc = await asyncio.create_subprocess_exec(
+            sys.executable, *args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            env=env)
+        self.send(self._kwargs)  # type: ignore
+        self._reader = asyncio.ensure_future(self._read())
+
+    async def _read(self) -> None:
+        try:
+            while True:
+                self._on_results(
+                    self, await read_frame(self._proc.stdout))  # type: ignore
+        except asyncio.IncompleteReadError:
+            self.is_lost = True
+            self._on_lost(self)
+
+    def send(self, msg: Tuple[Any, ...]) -> None:
+        self._proc.stdin.write(frame(msg))  # type: ignore
+
+    async def stop(self) -> None:
+        self._proc.stdin.close()  # type: ignore
+        await self._proc.wait()
+        await self._reader
+
+
+class ShardedSublemon:
+
+    """Front end spreading subprocesses across several `Sublemon` shards.
+
+    A single event loop can only read so many pipes and reap so many
+    children per second. Each shard runs its own `Sublemon` on its own event
+    loop, either in a thread of this process (in `thread` mode) or in a
+    child process (in `process` mode, the default, which sidesteps the GIL
+    and so scales with the number of cores). The front end hands each
+    command to the shard with the fewest unfinished jobs, in batches, and
+    merges their results back.
+
+    At most `max_concurrency` commands run at the same time across all of
+    the shards.
+
+    Args:
+        shards: The number of shards to run; defaults to the number of
+            CPUs.
+        max_concurrency: The max number of subprocesses that may be running
+            at the same time, across all shards.
+        mode: Where shards run; either `thread` or `process`.
+        loop_factory: The kind of event loop each shard runs (see
+            `new_event_loop`); in `process` mode, it must be given by name.
+        kwargs: Any other kwargs of `Sublemon` (e.g., `launcher` or
+            `timeout`) to create each shard's runtime with. In `process`
+            mode, they must be picklable.
+
+    """
+
+    def __init__(self, shards: Optional[int]=None,
+                 max_concurrency: int=_DEFAULT_MC,
+                 mode: str=_DEFAULT_SM,
+                 loop_factory: Optional[LoopFactory]=None,
+                 **kwargs: Any) -> None:
+        if shards is None:
+            shards = os.cpu_count() or 1
+        if shards < 1:
+            raise SublemonRuntimeError(
+                'Invalid `shards` kwarg received: `' + str(shards) + '`')
+        elif max_concurrency < 1:
+            raise SublemonRuntimeError(
+                'Invalid `max_concurrency` kwarg received: `' +
+                str(max_concurrency) + '`')
+        elif mode not in _SHARD_MODES:
+            raise SublemonRuntimeError(
+                'Invalid `mode` kwarg received: `' + str(mode) + '`')
+        elif mode == 'process' and callable(loop_factory):
+            # a child process can only be told which loop to use by name
+            raise SublemonRuntimeError(
+                'Invalid `loop_factory` kwarg received for `process` mode: `' +
+                str(loop_factory) + '`')
+        validate_loop_factory(loop_factory)
+
+        # the global limit already holds back jobs, so no shard has to; bad
+        # kwargs are caught here, rather than in the shards
+        kwargs['max_concurrency'] = max_concurrency
+        Sublemon(**kwargs)
+
+        self._mode = mode
+        self._loop_factory = loop_factory
+        self._limit = SublemonScheduler(max_concurrency)
+        shard_cls = _ThreadShard if mode == 'thread' else _ProcessShard
+        self._shards: List[_Shard] = [
+            shard_cls(i, kwargs, self._on_results, self._on_lost,
+                      loop_factory)
+            for i in range(shards)]
+        self._ids = itertools.count()
+        # unfinished jobs, by id
+        self._jobs: Dict[int, Tuple[_Call, int, Command, _Shard]] = {}
+        # jobs not yet sent to their shards
+        self._outbox: Dict[Tuple[_Shard, _Call], List[Tuple[int, Command]]]
+        self._outbox = {}
+        self._is_running = False
+
+    def __str__(self):
+        return ('{} {} shards, max concurrency: {}, {} running '
+                'subprocesses').format(
+                    len(self._shards),
+                    self._mode,
+                    self._limit.limit,
+                    self._limit.in_use)
+
+    def __repr__(self):
+        return '<ShardedSublemon [{}]>'.format(str(self))
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    async def start(self) -> None:
+        """Coroutine to start all of the shards."""
+        if self._is_running:
+            raise SublemonRuntimeError(
+                'Attempted to start an already-running `ShardedSublemon` '
+                'instance')
+
+        await asyncio.gather(*(shard.start() for shard in self._shards))
+        self._is_running = True
+
+    async def stop(self) -> None:
+        """Coroutine to stop all of the shards.
+
+        Any subprocesses still running are terminated.
+
+        """
+        if not self._is_running:
+            raise SublemonRuntimeError(
+                'Attempted to stop an already-stopped `ShardedSublemon` '
+                'instance')
+
+        self._is_running = False
+        self._flush()
+        await asyncio.gather(*(shard.stop() for shard in self._shards))
+
+    async def gather(self, *cmds: Command,
+                     timeout: Optional[float]=None) -> List[int]:
+        """Coroutine to run commands and get their exit codes, in order.
+
+        Raises:
+            Exception: The error of the first command that could not be run.
+
+        """
+        results = [r async for r in self.run_many(
+            cmds, ordered=True, max_output=0, timeout=timeout)]
+        for r in results:
+            if r.error is not None:
+                raise r.error
+        return [r.exit_code for r in results]  # type: ignore
+
+    async def run_many(
+            self,
+            cmds: Union[Iterable[Command], AsyncIterable[Command]],
+            ordered: bool=False,
+            max_output: int=DEFAULT_LIMIT,
+            encoding: Optional[str]=None,
+            errors: str='replace',
+            timeout: Optional[float]=None
+    ) -> AsyncGenerator[ShardResult, None]:
+        """Coroutine to lazily run commands across the shards.
+
+        Works like `Sublemon.run_many`: commands are only taken from `cmds`
+        once there is room for them to run, and a `ShardResult` is yielded
+        for each, in order of completion (or of `cmds`, if `ordered`). The
+        output of each command is captured and decoded in its shard.
+
+        If this generator is closed early, the commands it started that have
+        not finished yet are cancelled.
+
+        """
+        if not self._is_running:
+            raise SublemonRuntimeError(
+                'Attempted to spawn subprocesses from a non-started server')
+
+        call = _Call(dict(
+            max_output=max_output,
+            encoding=encoding,
+            errors=errors,
+            timeout=timeout))
+        feeder = asyncio.ensure_future(self._feed(cmds, call))
+        feeder.add_done_callback(lambda _: call.queue.put_nowait(None))
+        buffered: Dict[int, ShardResult] = {}
+        yielded = 0
+        total: Optional[int] = None
+        try:
+            while total is None or yielded < total:
+                item = await call.queue.get()
+                if item is None:
+                    total = feeder.result()
+                    continue
+
+                index, result = item
+                if not ordered:
+                    yielded += 1
+                    yield result
+                    continue
+                buffered[index] = result
+                while yielded in buffered:
+                    result = buffered.pop(yielded)
+                    yielded += 1
+                    yield result
+        finally:
+            call.is_open = False
+            feeder.cancel()
+            self._cancel(call)
+
+    async def _feed(self, cmds: Union[Iterable[Command],
+                                      AsyncIterable[Command]],
+                    call: _Call) -> int:
+        """Coroutine to hand out commands as global slots free up.
+
+        Returns:
+            The number of commands handed out.
+
+        """
+        index = 0
+        async for cmd in aiterate(cmds):
+            await self._limit.acquire()
+            shard = min(self._shards, key=lambda s: (s.is_lost, len(s.jobs)))
+            job_id = next(self._ids)
+            self._jobs[job_id] = (call, index, cmd, shard)
+            shard.jobs.add(job_id)
+            call.jobs.add(job_id)
+            if not self._outbox:
+                # send everything handed out until the feeder has to wait
+                asyncio.get_event_loop().call_soon(self._flush)
+            self._outbox.setdefault((shard, call), []).append((job_id, cmd))
+            index += 1
+        return index
+
+    def _flush(self) -> None:
+        """Send the batches of jobs handed out to the shards."""
+        outbox, self._outbox = self._outbox, {}
+        for (shard, call), jobs in outbox.items():
+            if shard.is_lost:
+                self._on_lost(shard)
+            else:
+                shard.send(('run', call.opts, jobs))
+
+    def _cancel(self, call: _Call) -> None:
+        """Cancel the unfinished jobs of a `run_many` call."""
+        if not self._is_running:
+            # the shards have already terminated them
+            return
+
+        self._flush()
+        by_shard: Dict[_Shard, List[int]] = {}
+        for job_id in call.jobs:
+            by_shard.setdefault(self._jobs[job_id][3], []).append(job_id)
+        for shard, job_ids in by_shard.items():
+            if not shard.is_lost:
+                shard.send(('cancel', job_ids))
+
+    def _on_results(self, shard: _Shard,
+                    batch: List[Tuple[Any, ...]]) -> None:
+        """Release the slots of finished jobs, and pass on their results."""
+        for job_id, *fields in batch:
+            call, index, cmd, _ = self._jobs.pop(job_id)
+            shard.jobs.discard(job_id)
+            call.jobs.discard(job_id)
+            self._limit.release()
+            if call.is_open:
+                call.queue.put_nowait(
+                    (index, ShardResult(cmd, shard.index, *fields)))
+
+    def _on_lost(self, shard: _Shard) -> None:
+        """Fail the unfinished jobs of a shard that exited unexpectedly."""
+        error = SublemonRuntimeError(
+            'Shard ' + str(shard.index) + ' exited unexpectedly')
+        self._on_results(shard, [
+            failed(job_id, self._jobs[job_id][0].opts, error)
+            for job_id in list(shard.jobs)])
+
+    @property
+    def shards(self) -> int:
+        """The number of shards."""
+        return len(self._shards)
+
+    @property
+    def mode(self) -> str:
+        """Where the shards run; either `thread` or `process`."""
+        return self._mode
+
+    @property
+    def loop_factory(self) -> Optional[LoopFactory]:
+        """The kind of event loop that each shard runs."""
+        return self._loop_factory
+
+    @property
+    def max_concurrency(self) -> int:
+        """The max number of subprocesses running across all shards."""
+        return self._limit.limit
+
+    @property
+    def running(self) -> int:
+        """The number of commands handed to shards that have not finished."""
+        return self._limit.in_use
@@ -1,68 +1,478 @@
 """Models for interacting with subprocesses."""
 
 import asyncio
-import uuid
+import codecs
+import itertools
+import os
+import shlex
+import signal
 
+from contextlib import suppress
 from datetime import datetime
 from typing import (
+    Any,
     AsyncGenerator,
+    AsyncIterable,
+    Awaitable,
+    Dict,
+    Iterable,
+    List,
     Optional,
-    TYPE_CHECKING)
-
-from sublemon.errors import SublemonLifetimeError
+    Sequence,
+    Tuple,
+    TYPE_CHECKING,
+    Union)
+
+from sublemon.errors import (
+    SublemonCancelledError,
+    SublemonLifetimeError,
+    SublemonRuntimeError,
+    SublemonTimeoutError)
+from sublemon.filters import OutputFilter
+from sublemon.launchers import (
+    ResourceUsage,
+    SubprocessProtocol)
+from sublemon.output import (
+    DEFAULT_CHUNK,
+    make_reader,
+    readinto,
+    validate_policy)
+from sublemon.retry import (
+    Attempt,
+    RetryPolicy)
+from sublemon.scheduler import SharedAdmission
+from sublemon.utils import (
+    aiterate,
+    monotonic_ns,
+    time_ns)
 
 if TYPE_CHECKING:
+    from sublemon.multiplex import _Multiplexer  # noqa
     from sublemon.runtime import Sublemon  # noqa
 
+# a shell command string, or the argv of a program to run directly
+Command = Union[str, Sequence[str]]
+
+# what can be fed to the stdin of a subprocess: bytes, a file object or
+# descriptor, a (sync or async) iterable of bytes, or another subprocess
+# (whose stdout is piped in)
+Input = Union[bytes, bytearray, memoryview, int, Any,
+              Iterable[bytes], AsyncIterable[bytes], 'SublemonSubprocess']
+
+_PENDING: int = 0
+_RUNNING: int = 1
+_DONE: int = 2
+
+_SIGKILL: int = getattr(signal, 'SIGKILL', signal.SIGTERM)
+
+# offset of the wall clock from the monotonic clock, used to report the
+# monotonic timestamps of subprocesses as datetimes
+_WALL_OFFSET_NS: int = time_ns() - monotonic_ns()
+
+_ids = itertools.count()
+
 
 class SublemonSubprocess:
 
-    """Logical encapsulation of a subprocess."""
+    """Logical encapsulation of a subprocess.
+
+    Args:
+        server: The runtime this subprocess is spawned from.
+        cmd: The command to run. A string is run through the shell, while a
+            sequence of strings is treated as an argv and executed directly,
+            skipping the cost of spawning and parsing with `/bin/sh`.
+        output_policy: How output from the subprocess's pipes is buffered;
+            see `sublemon.output.make_reader` for the available policies.
+            Defaults to the policy of `server`.
+        output_limit: The max number of bytes buffered per output pipe.
+            Defaults to the limit of `server`.
+        output_lines: The max number of lines kept per output pipe under
+            the `ring` policy. Defaults to the setting of `server`.
+        output_filter: The filter applied to the lines of output from the
+            subprocess's pipes before they are buffered, if any.
+        priority: The admission priority of this subprocess; higher
+            priorities are admitted to run first.
+        group: The name of the fair-share group this subprocess belongs to.
+        timeout: The max number of seconds this subprocess may run for.
+            Defaults to the timeout of `server`.
+        deadline: The time, in terms of the event loop's clock (which is
+            `time.monotonic()` for the default loops), by which this
+            subprocess must have finished. Defaults to the deadline of
+            `server`.
+        stdin: What to feed to the stdin of this subprocess. Bytes, as well
+            as (synchronous or asynchronous) iterables of bytes, are written
+            to it from the event loop; a file object or descriptor is handed
+            to the subprocess as its stdin directly; and another, not yet
+            launched, subprocess has its stdout connected to this
+            subprocess's stdin through an OS pipe, so that the data never
+            passes through Python. If not specified, the stdin of this
+            process is inherited.
+        retry: The policy for re-running this subprocess's command when it
+            fails. Defaults to the retry policy of `server`. Subprocesses
+            with anything but bytes (or nothing) as their stdin, and the
+            stages of pipelines, are never retried.
+
+    """
+
+    __slots__ = (
+        '_server', '_cmd', '_output_policy', '_output_limit',
+        '_output_lines', '_priority', '_group', '_id', '_state',
+        '_scheduled_ns', '_began_ns', '_finished_ns', '_exit_code',
+        '_subprocess', '_stdout', '_stderr', '_spawn_error',
+        '_began_running_evt', '_done_running_evt', '_timeout', '_deadline',
+        '_timer', '_termination_reason', '_task', '_admission', '_stdin',
+        '_stdout_fd', '_feeder', '_retry', '_attempts', '_rusage',
+        '_held_output', '_output_filter', '_sink', '_killer', '_launching',)
+
+    def __init__(self, server: 'Sublemon', cmd: Command,
+                 output_policy: Optional[str]=None,
+                 output_limit: Optional[int]=None,
+                 output_lines: Optional[int]=None,
+                 output_filter: Optional[OutputFilter]=None,
+                 priority: int=0,
+                 group: Optional[str]=None,
+                 timeout: Optional[float]=None,
+                 deadline: Optional[float]=None,
+                 stdin: Optional[Input]=None,
+                 retry: Optional[RetryPolicy]=None) -> None:
+        if output_policy is None:
+            output_policy = server._output_policy
+        validate_policy(output_policy)
+        if not isinstance(cmd, str):
+            cmd = tuple(cmd)
+            if not cmd:
+                raise SublemonRuntimeError(
+                    'Attempted to spawn a subprocess with an empty argv')
 
-    def __init__(self, server: 'Sublemon', cmd: str) -> None:
         self._server = server
-        self._cmd = cmd
-        self._scheduled_at = datetime.now()
-        self._uuid = uuid.uuid4()
-        self._began_at: Optional[datetime] = None
+        self._cmd: Union[str, Tuple[str, ...]] = cmd
+        self._output_policy = output_policy
+        self._output_limit = (output_limit if output_limit is not None else
+                              server._output_limit)
+        self._output_lines = (output_lines if output_lines is not None else
+                              server._output_lines)
+        self._output_filter = output_filter
+        self._priority = priority
+        self._group = group
+        self._timeout = timeout if timeout is not None else server._timeout
+        self._deadline = (deadline if deadline is not None else
+                          server._deadline)
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # the pending `SIGKILL` of a terminated subprocess
+        self._killer: Optional[asyncio.TimerHandle] = None
+        self._termination_reason: Optional[str] = None
+        # the task spawning this subprocess, while it waits for a slot
+        self._task: Optional[asyncio.Future] = None
+        self._id = next(_ids)
+        self._state = _PENDING
+        self._scheduled_ns = monotonic_ns()
+        self._began_ns: Optional[int] = None
+        self._finished_ns: Optional[int] = None
         self._exit_code: Optional[int] = None
         self._subprocess: Optional[asyncio.subprocess.Process] = None
-        self._began_running_evt = asyncio.Event()
-        self._done_running_evt = asyncio.Event()
+        self._stdout: Optional[asyncio.StreamReader] = None
+        self._stderr: Optional[asyncio.StreamReader] = None
+        self._spawn_error: Optional[Exception] = None
+        # only created once something waits on them
+        self._began_running_evt: Optional[asyncio.Event] = None
+        self._done_running_evt: Optional[asyncio.Event] = None
+        # shared with the other stages of a pipeline, if any
+        self._admission: Optional[SharedAdmission] = None
+        # whether this subprocess ever got a slot to be launched in
+        self._launching = False
+        # an fd owned by us (closed once launched), or data to feed
+        self._stdin: Any = None
+        self._stdout_fd: Optional[int] = None
+        self._feeder: Optional[asyncio.Future] = None
+        if stdin is not None:
+            self._set_stdin(stdin)
+        self._retry = retry if retry is not None else server._retry
+        # only kept when there is a retry policy
+        self._attempts: Optional[List[Attempt]] = None
+        self._rusage: Optional[ResourceUsage] = None
+        # output that arrived while launching, before hooks heard we started
+        self._held_output: List[Tuple[str, bytes]] = []
+        # the multiplexer our output is routed to, if any
+        self._sink: Optional['_Multiplexer'] = None
+
+    def _set_stdin(self, stdin: Input) -> None:
+        """Validate and prepare what to feed to this subprocess's stdin."""
+        if isinstance(stdin, SublemonSubprocess):
+            if (stdin._state != _PENDING or stdin._launching or
+                    stdin._stdout_fd is not None):
+                raise SublemonRuntimeError(
+                    'Attempted to pipe from a subprocess that is no longer '
+                    'pending, or whose stdout is already piped elsewhere')
+            self._stdin, stdin._stdout_fd = os.pipe()
+        elif isinstance(stdin, (bytes, bytearray, memoryview,)):
+            self._stdin = bytes(stdin)
+        elif isinstance(stdin, int):
+            self._stdin = os.dup(stdin)
+        elif hasattr(stdin, 'fileno'):
+            self._stdin = os.dup(stdin.fileno())
+        elif (hasattr(stdin, '__aiter__') or hasattr(stdin, '__iter__')) \
+                and not isinstance(stdin, str):
+            self._stdin = stdin
+        else:
+            raise SublemonRuntimeError(
+                'Invalid `stdin` kwarg received: `' + str(stdin) + '`')
 
     def __repr__(self) -> str:
         return '<SublemonSubprocess [{}]>'.format(str(self))
 
     def __str__(self) -> str:
-        return '{} -> `{}`'.format(self._scheduled_at, self._cmd)
+        return '{} -> `{}`'.format(self.scheduled_at, self.cmd_str)
 
-    def __hash__(self) -> int:
-        return hash((self._cmd, self._uuid,))
+    def _queue(self, runner: Optional[Awaitable[Any]]=None) -> asyncio.Future:
+        """Queue this subprocess, spawning it from a task of its own.
 
-    def __eq__(self, other) -> bool:
-        return (self._cmd == other._cmd and
-                self._scheduled_at == other._scheduled_at)
+        The subprocess counts as pending from here on, rather than from when
+        its task first gets to run. The task runs `runner`, which must spawn
+        this subprocess, or just `spawn` if it is not given.
 
-    def __ne__(self, other) -> bool:
-        return not (self == other)
+        """
+        self._server._pending_set.add(self)
+        for hook in self._server._hooks:
+            hook.on_queued(self)
+        self._task = asyncio.ensure_future(
+            runner if runner is not None else self.spawn())
+        return self._task
 
     async def spawn(self):
         """Spawn the command wrapped in this object as a subprocess."""
-        self._server._pending_set.add(self)
-        await self._server._sem.acquire()
-        self._subprocess = await asyncio.create_subprocess_shell(
-            self._cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE)
-        self._began_at = datetime.now()
-        if self in self._server._pending_set:
-            self._server._pending_set.remove(self)
+        loop = asyncio.get_event_loop()
+        if self._admission is not None:
+            acquire = self._admission.acquire(self._priority, self._group)
+        else:
+            acquire = self._server._scheduler.acquire(
+                self._priority, self._group)
+        try:
+            if self._deadline is None:
+                await acquire
+            else:
+                await asyncio.wait_for(
+                    acquire, max(self._deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            self._termination_reason = 'deadline'
+            self._fail(SublemonTimeoutError(
+                'Deadline passed before the subprocess could begin'),
+                release=False)
+            return
+        except asyncio.CancelledError:
+            requested = self._termination_reason == 'cancelled'
+            self._termination_reason = 'cancelled'
+            self._fail(_cancelled_error(), release=False)
+            if requested:
+                return
+            raise
+
+        # our redirections are settled from here on
+        self._launching = True
+        self._task = None
+        if self._termination_reason == 'cancelled':
+            # cancelled just as a slot was handed over
+            self._fail(_cancelled_error())
+            return
+
+        event_driven = self._server._completion == 'event'
+        on_exit = self._on_exit if event_driven else _noop
+        on_output = self._on_output if self._server._hooks else None
+
+        def protocol_factory():
+            return SubprocessProtocol(
+                loop, on_exit, lambda fd: self._make_reader(loop, fd),
+                on_output,
+                self._output_filter)
+
+        # only pass the redirections that were asked for, to keep custom
+        # launchers without support for them working
+        redirects: Dict[str, int] = {}
+        if isinstance(self._stdin, int):
+            redirects['stdin'] = self._stdin
+        elif self._stdin is not None:
+            redirects['stdin'] = asyncio.subprocess.PIPE
+        if self._stdout_fd is not None:
+            redirects['stdout'] = self._stdout_fd
+
+        try:
+            transport, protocol = await self._server._launcher.launch(
+                loop, protocol_factory, self._cmd, **redirects)
+        except asyncio.CancelledError:
+            self._termination_reason = 'cancelled'
+            self._fail(_cancelled_error())
+            raise
+        except Exception as e:
+            self._fail(e)
+            return
+        self._close_fds()
+        self._subprocess = asyncio.subprocess.Process(
+            transport, protocol, loop)
+        if self._subprocess.stdin is not None:
+            self._feeder = asyncio.ensure_future(
+                _feed(self._subprocess.stdin, self._stdin))
+        self._stdout = self._subprocess.stdout
+        self._stderr = self._subprocess.stderr
+
+        self._began_ns = monotonic_ns()
+        self._server._pending_set.discard(self)
         self._server._running_set.add(self)
-        self._began_running_evt.set()
+        self._set_state(_RUNNING)
+        if self._server._hooks:
+            self._notify_started()
+        if self._termination_reason == 'cancelled':
+            # cancelled while being launched
+            self._terminate('cancelled')
+        else:
+            self._schedule_expiry(loop)
+
+        # the process may have exited before we finished our bookkeeping
+        if event_driven and self._subprocess.returncode is not None:
+            self._finish()
+
+    def _fail(self, error: Exception, release: bool=True) -> None:
+        """Record a failure to launch this subprocess and free its slot."""
+        self._spawn_error = error
+        self._finished_ns = monotonic_ns()
+        self._close_fds()
+        self._server._pending_set.discard(self)
+        if release:
+            self._server._scheduler.release()
+        self._set_state(_DONE)
+
+    def _close_fds(self) -> None:
+        """Close our ends of the pipes and files handed to the subprocess.
+
+        Once the subprocess has been launched (or failed to launch), only
+        it (and the other end of its pipes) should hold them open, so that
+        EOF and `SIGPIPE` propagate along a pipeline.
+
+        """
+        if isinstance(self._stdin, int):
+            os.close(self._stdin)
+            self._stdin = None
+        if self._stdout_fd is not None:
+            os.close(self._stdout_fd)
+            self._stdout_fd = None
+
+    def _schedule_expiry(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Arrange for this subprocess to be terminated once it expires."""
+        expiry: Optional[float] = None
+        reason = 'timeout'
+        if self._timeout is not None:
+            expiry = loop.time() + self._timeout
+        if self._deadline is not None and (
+                expiry is None or self._deadline < expiry):
+            expiry, reason = self._deadline, 'deadline'
+        if expiry is not None:
+            self._timer = loop.call_at(expiry, self._terminate, reason)
+
+    def cancel(self, grace: Optional[float]=None) -> None:
+        """Cancel this subprocess.
+
+        A pending subprocess is never started; its `wait_done` raises a
+        `SublemonCancelledError`. A running subprocess is terminated, with
+        its process group being sent `SIGTERM`, and then `SIGKILL` after
+        `grace` seconds (which defaults to the server's `kill_grace`).
+        A subprocess backing off before a retry is finished right away,
+        with the exit code of its latest attempt. Cancelling a finished
+        subprocess does nothing.
+
+        """
+        if self._state == _RUNNING:
+            self._terminate('cancelled', grace)
+        elif self._state == _PENDING:
+            self._termination_reason = 'cancelled'
+            if self._timer is not None:
+                # backing off before a retry
+                self._give_up()
+            elif self._task is not None:
+                self._task.add_done_callback(self._on_cancelled)
+                self._task.cancel()
+
+    def _on_cancelled(self, task: asyncio.Future) -> None:
+        """Wrap up a subprocess whose spawning task was cancelled."""
+        if self._state == _PENDING:
+            # the task was cancelled before it ever got to run
+            self._fail(_cancelled_error(), release=False)
+
+    def _terminate(self, reason: str, grace: Optional[float]=None) -> None:
+        """Terminate this running subprocess and its process group.
+
+        The process group of the subprocess is sent `SIGTERM` and, after
+        `grace` seconds, `SIGKILL`. If the subprocess exits before then, the
+        `SIGKILL` is sent right away instead, to take down any of its
+        descendants still lingering in the group; once the group is empty,
+        its id may be reused by an unrelated process.
+
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._state != _RUNNING:
+            return
+        if self._termination_reason is None:
+            self._termination_reason = reason
+        if grace is None:
+            grace = self._server._kill_grace
+        proc: asyncio.subprocess.Process = self._subprocess  # type: ignore
+        _signal_group(proc, signal.SIGTERM)
+        if self._killer is None:
+            self._killer = asyncio.get_event_loop().call_later(
+                grace, self._kill)
+
+    def _kill(self) -> None:
+        """Kill the process group of a terminated subprocess."""
+        if self._killer is not None:
+            self._killer.cancel()
+            self._killer = None
+            _signal_group(self._subprocess, _SIGKILL)  # type: ignore
+
+    def _set_state(self, state: int) -> None:
+        """Move this subprocess along its lifetime, waking any waiters."""
+        self._state = state
+        if self._began_running_evt is not None:
+            self._began_running_evt.set()
+        if state == _DONE:
+            if self._done_running_evt is not None:
+                self._done_running_evt.set()
+            for hook in self._server._hooks:
+                hook.on_exited(self)
+            if self._sink is not None:
+                self._sink.on_done(self)
+
+    def _notify_started(self) -> None:
+        """Tell the server's hooks we started, and pass on held output."""
+        for hook in self._server._hooks:
+            hook.on_started(self)
+        held, self._held_output = self._held_output, []
+        for stream, data in held:
+            for hook in self._server._hooks:
+                hook.on_output(self, stream, data)
+
+    def _on_output(self, fd: int, data: bytes) -> None:
+        """Pass a chunk of output on to the server's hooks."""
+        stream = 'stdout' if fd == 1 else 'stderr'
+        if self._state == _PENDING:
+            self._held_output.append((stream, data))
+            return
+        for hook in self._server._hooks:
+            hook.on_output(self, stream, data)
+
+    def _make_reader(self, loop: asyncio.AbstractEventLoop,
+                     fd: int) -> asyncio.StreamReader:
+        """Create a reader for one of this subprocess's output pipes."""
+        stream = 'stdout' if fd == 1 else 'stderr'
+        if self._sink is not None and stream in self._sink.streams:
+            return self._sink.make_reader(self, stream, loop)
+        return make_reader(self._output_policy, self._output_limit,
+                           self._output_lines, loop)
 
     async def wait_running(self) -> None:
         """Coroutine to wait for this subprocess to begin execution."""
-        await self._began_running_evt.wait()
+        if self._state == _PENDING:
+            if self._began_running_evt is None:
+                self._began_running_evt = asyncio.Event()
+            await self._began_running_evt.wait()
 
     async def wait_done(self) -> int:
         """Coroutine to wait for subprocess run completion.
@@ -70,9 +480,23 @@ class SublemonSubprocess:
         Returns:
             The exit code of the subprocess.
 
+        Raises:
+            Exception: The error raised while launching the subprocess, if
+                it could not be launched (e.g., a `FileNotFoundError` for a
+                missing program).
+            SublemonTimeoutError: If the deadline of the subprocess passed
+                before it could begin running.
+            SublemonCancelledError: If the subprocess was cancelled before
+                it could begin running.
+
         """
-        await self._done_running_evt.wait()
-        if self._exit_code is None:
+        if self._state != _DONE:
+            if self._done_running_evt is None:
+                self._done_running_evt = asyncio.Event()
+            await self._done_running_evt.wait()
+        if self._spawn_error is not None:
+            raise self._spawn_error
+        elif self._exit_code is None:
             raise SublemonLifetimeError(
                 'Subprocess exited abnormally with `None` exit code')
         return self._exit_code
@@ -88,30 +512,301 @@ class SublemonSubprocess:
             raise SublemonLifetimeError(
                 'Attempted to poll a non-active subprocess')
         elif self._subprocess.returncode is not None:
-            self._exit_code = self._subprocess.returncode
-            self._done_running_evt.set()
-            self._server._running_set.remove(self)
-            self._server._sem.release()
+            self._finish()
+
+    def _on_exit(self) -> None:
+        """Child watcher callback for event-driven completion tracking."""
+        if self.is_running:
+            self._finish()
+
+    def _finish(self) -> None:
+        """Record the exit of the wrapped subprocess and free its slot."""
+        if self._state == _DONE:
+            return
+        self._exit_code = self._subprocess.returncode  # type: ignore
+        self._finished_ns = monotonic_ns()
+        # only reported by launchers reaping their own processes
+        self._rusage = getattr(
+            self._subprocess._transport, '_rusage', None)  # type: ignore
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._kill()
+        if self._feeder is not None:
+            self._feeder.cancel()
+            self._feeder = None
+        self._server._running_set.remove(self)
+        self._server._scheduler.release()
+        if self._server._adaptive is not None:
+            self._server._adaptive.record_latency(
+                (self._finished_ns - self._began_ns) / 1e9)  # type: ignore
+
+        if self._retry is not None:
+            if self._attempts is None:
+                self._attempts = []
+            self._attempts.append(Attempt(
+                self._exit_code,  # type: ignore
+                self._termination_reason,
+                _to_datetime(self._began_ns),  # type: ignore
+                _to_datetime(self._finished_ns)))
+            if self._should_retry():
+                return
+        self._set_state(_DONE)
+
+    def _should_retry(self) -> bool:
+        """Schedule another attempt after a backoff, if there should be one.
+
+        While backing off, this subprocess is pending again, without holding
+        on to a slot; the next attempt goes through the scheduler like any
+        other subprocess.
+
+        """
+        retry: RetryPolicy = self._retry  # type: ignore
+        attempts = len(self._attempts)  # type: ignore
+        if (self._admission is not None or self._stdout_fd is not None or
+                not (self._stdin is None or isinstance(self._stdin, bytes)) or
+                not retry.should_retry(
+                    attempts, self._exit_code,  # type: ignore
+                    self._termination_reason)):
+            return False
+
+        loop = asyncio.get_event_loop()
+        delay = retry.delay(attempts)
+        if self._deadline is not None and loop.time() + delay >= (
+                self._deadline):
+            return False
+
+        self._state = _PENDING
+        if self._began_running_evt is not None:
+            self._began_running_evt.clear()
+        self._termination_reason = None
+        self._exit_code = None
+        self._server._pending_set.add(self)
+        self._timer = loop.call_later(delay, self._retry_now)
+        return True
+
+    def _retry_now(self) -> None:
+        """Start the next attempt at running this subprocess."""
+        self._timer = None
+        self._queue()
+
+    def _give_up(self) -> None:
+        """Finish a subprocess that is backing off before a retry."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        latest: Attempt = self._attempts[-1]  # type: ignore
+        self._exit_code = latest.exit_code
+        self._server._pending_set.discard(self)
+        self._set_state(_DONE)
 
     @property
-    async def stdout(self) -> AsyncGenerator[str, None]:
+    async def stdout(self) -> AsyncGenerator[bytes, None]:
         """Asynchronous generator for lines from subprocess stdout."""
         await self.wait_running()
-        async for line in self._subprocess.stdout:  # type: ignore
+        if self._stdout is None:
+            return
+        async for line in self._stdout:
             yield line
 
     @property
-    async def stderr(self) -> AsyncGenerator[str, None]:
+    async def stderr(self) -> AsyncGenerator[bytes, None]:
         """Asynchronous generator for lines from subprocess stderr."""
         await self.wait_running()
-        async for line in self._subprocess.stderr:  # type: ignore
+        if self._stderr is None:
+            return
+        async for line in self._stderr:
             yield line
 
+    async def iter_chunks(
+            self,
+            stream: str='stdout',
+            size: int=DEFAULT_CHUNK,
+            encoding: Optional[str]=None,
+            errors: str='strict') -> AsyncGenerator[Union[bytes, str], None]:
+        """Asynchronous generator for large blocks of subprocess output.
+
+        Each block holds whatever output is buffered, up to `size` bytes,
+        without regard for line boundaries. If an `encoding` is specified,
+        blocks are decoded incrementally (so multi-byte characters split
+        across blocks are handled correctly) and yielded as text.
+
+        Args:
+            stream: Which output pipe to read, `stdout` or `stderr`.
+            size: The max number of bytes per block.
+            encoding: The encoding to decode blocks with, if any.
+            errors: The error handling scheme of the decoder.
+
+        """
+        reader = await self._reader(stream)
+        if reader is None:
+            return
+
+        decoder = None
+        if encoding is not None:
+            decoder = codecs.getincrementaldecoder(encoding)(errors)
+        while True:
+            chunk = await reader.read(size)
+            if not chunk:
+                break
+            elif decoder is None:
+                yield chunk
+            else:
+                text = decoder.decode(chunk)
+                if text:
+                    yield text
+        if decoder is not None:
+            text = decoder.decode(b'', final=True)
+            if text:
+                yield text
+
+    async def iter_line_batches(
+            self,
+            stream: str='stdout',
+            size: int=DEFAULT_CHUNK,
+            encoding: Optional[str]=None,
+            errors: str='strict'
+    ) -> AsyncGenerator[Union[List[bytes], List[str]], None]:
+        """Asynchronous generator for batches of lines of subprocess output.
+
+        Output is read in blocks of up to `size` bytes (see `iter_chunks`),
+        and each block is split into lines all at once, which is much cheaper
+        than reading line by line. Lines are yielded without their trailing
+        newlines, as `bytes`, or as text if an `encoding` is specified. A
+        final line without a trailing newline is yielded, too.
+
+        """
+        newline: Any = '\n' if encoding else b'\n'
+        partial: Any = None
+        chunk: Any
+        async for chunk in self.iter_chunks(stream, size, encoding, errors):
+            if partial:
+                chunk = partial + chunk
+            lines = chunk.split(newline)
+            partial = lines.pop()
+            if lines:
+                yield lines
+        if partial:
+            yield [partial]
+
+    async def readinto(self, buf, stream: str='stdout') -> int:
+        """Coroutine to read subprocess output into a writable buffer.
+
+        The output is copied straight from the pipe's buffer into `buf` (any
+        object supporting the writable buffer protocol, like a `bytearray`
+        or `memoryview`), avoiding the allocation of a new `bytes` object
+        for every read.
+
+        Returns:
+            The number of bytes read into `buf`, which is only 0 once the
+            output is exhausted (or if `buf` is empty).
+
+        """
+        reader = await self._reader(stream)
+        if reader is None:
+            return 0
+        return await readinto(reader, buf)
+
+    async def _reader(
+            self, stream: str) -> Optional[asyncio.StreamReader]:
+        """Coroutine to get the reader of one of this subprocess's pipes."""
+        if stream not in ('stdout', 'stderr',):
+            raise SublemonRuntimeError(
+                'Invalid `stream` kwarg received: `' + str(stream) + '`')
+        await self.wait_running()
+        return self._stdout if stream == 'stdout' else self._stderr
+
     @property
-    def cmd(self) -> str:
-        """The shell command that this subprocess will/is/did run."""
+    def id(self) -> int:
+        """A number uniquely identifying this subprocess in this process.
+
+        Subprocesses are numbered in the order they were created.
+
+        """
+        return self._id
+
+    @property
+    def cmd(self) -> Union[str, Tuple[str, ...]]:
+        """The shell command or argv that this subprocess will/is/did run."""
         return self._cmd
 
+    @property
+    def cmd_str(self) -> str:
+        """The command of this subprocess, as shell-escaped text."""
+        if isinstance(self._cmd, str):
+            return self._cmd
+        return ' '.join(shlex.quote(arg) for arg in self._cmd)
+
+    @property
+    def is_shell(self) -> bool:
+        """Whether this subprocess's command is run through the shell."""
+        return isinstance(self._cmd, str)
+
+    @property
+    def priority(self) -> int:
+        """The admission priority of this subprocess."""
+        return self._priority
+
+    @property
+    def group(self) -> Optional[str]:
+        """The fair-share group of this subprocess."""
+        return self._group
+
+    @property
+    def output_policy(self) -> str:
+        """How output from this subprocess's pipes is buffered."""
+        return self._output_policy
+
+    @property
+    def output_filter(self) -> Optional[OutputFilter]:
+        """The filter applied to the output of this subprocess, if any."""
+        return self._output_filter
+
+    @property
+    def timeout(self) -> Optional[float]:
+        """The max number of seconds this subprocess may run for."""
+        return self._timeout
+
+    @property
+    def deadline(self) -> Optional[float]:
+        """The event loop time by which this subprocess must finish."""
+        return self._deadline
+
+    @property
+    def termination_reason(self) -> Optional[str]:
+        """Why this subprocess was terminated early, if it was.
+
+        This is `timeout` or `deadline` if the subprocess was terminated
+        (or, for `deadline`, never started) because it ran out of time,
+        `cancelled` if it was cancelled, and `None` otherwise.
+
+        """
+        return self._termination_reason
+
+    @property
+    def retry(self) -> Optional[RetryPolicy]:
+        """The policy for re-running this subprocess's command."""
+        return self._retry
+
+    @property
+    def attempts(self) -> Tuple[Attempt, ...]:
+        """The finished attempts at running this subprocess's command.
+
+        Note:
+            Without a retry policy, this only holds the single attempt
+            once the subprocess has exited.
+
+        """
+        if self._attempts is not None:
+            return tuple(self._attempts)
+        elif self._exit_code is None or self._began_ns is None:
+            return ()
+        return (Attempt(
+            self._exit_code,
+            self._termination_reason,
+            _to_datetime(self._began_ns),
+            _to_datetime(self._finished_ns)),)  # type: ignore
+
     @property
     def exit_code(self) -> Optional[int]:
         """The exit code of this subprocess."""
@@ -120,23 +815,22 @@ class SublemonSubprocess:
     @property
     def is_pending(self) -> bool:
         """Whether this subprocess is waiting to run."""
-        return not self._began_running_evt.is_set()
+        return self._state == _PENDING
 
     @property
     def is_running(self) -> bool:
         """Whether this subprocess is currently running."""
-        return (self._began_running_evt.is_set() and
-                not self._done_running_evt.is_set())
+        return self._state == _RUNNING
 
     @property
     def is_done(self) -> bool:
         """Whether this subprocess has completed."""
-        return self._done_running_evt.is_set()
+        return self._state == _DONE
 
     @property
     def scheduled_at(self) -> datetime:
         """The time this object was scheduled on the server."""
-        return self._scheduled_at
+        return _to_datetime(self._scheduled_ns)
 
     @property
     def began_at(self) -> Optional[datetime]:
@@ -147,4 +841,100 @@ class SublemonSubprocess:
             execution.
 
         """
-        return self._began_at
+        if self._began_ns is None:
+            return None
+        return _to_datetime(self._began_ns)
+
+    @property
+    def finished_at(self) -> Optional[datetime]:
+        """The time the subprocess exited, or failed to launch.
+
+        Note:
+            This will be `None` until the subprocess has finished.
+
+        """
+        if self._finished_ns is None:
+            return None
+        return _to_datetime(self._finished_ns)
+
+    @property
+    def timestamps(self) -> Dict[str, float]:
+        """The `time.monotonic()` times of the transitions made so far.
+
+        These are `queued` (when this object was created), `started`, and
+        `exited` (when the subprocess exited, or failed to launch). For a
+        retried subprocess, they are those of its latest attempt.
+
+        """
+        timestamps = {'queued': self._scheduled_ns / 1e9}
+        if self._began_ns is not None:
+            timestamps['started'] = self._began_ns / 1e9
+        if self._finished_ns is not None:
+            timestamps['exited'] = self._finished_ns / 1e9
+        return timestamps
+
+    @property
+    def resource_usage(self) -> Optional[ResourceUsage]:
+        """The CPU time and peak memory used by the exited subprocess.
+
+        Note:
+            This is only reported by the `posix_spawn` and `pool` launchers,
+            which reap their processes via `wait4`; it is `None` otherwise.
+
+        """
+        return self._rusage
+
+
+def _signal_group(proc: asyncio.subprocess.Process, sig: int) -> None:
+    """Send a signal to the process group of a subprocess.
+
+    Subprocesses that do not lead a process group of their own (like the
+    commands run by the `batch` launcher) are signalled on their own.
+
+    """
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(proc.pid, sig)
+            return
+        except PermissionError:
+            return
+        except ProcessLookupError:
+            pass
+    if proc.returncode is None:
+        with suppress(ProcessLookupError):
+            proc.send_signal(sig)
+
+
+def _to_datetime(timestamp_ns: int) -> datetime:
+    """Convert a `monotonic_ns` timestamp to a local datetime."""
+    return datetime.fromtimestamp((timestamp_ns + _WALL_OFFSET_NS) / 1e9)
+
+
+async def _feed(writer: asyncio.StreamWriter, data: Any) -> None:
+    """Coroutine to write data to the stdin of a subprocess, then close it.
+
+    Writing stops quietly if the subprocess closes its stdin early.
+
+    """
+    try:
+        if isinstance(data, bytes):
+            writer.write(data)
+            await writer.drain()
+        else:
+            async for chunk in aiterate(data):
+                writer.write(chunk)
+                await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+def _cancelled_error() -> SublemonCancelledError:
+    """Create the error raised for subprocesses cancelled while pending."""
+    return SublemonCancelledError(
+        'Subprocess was cancelled before it could begin')
+
+
+def _noop() -> None:
+    """Callback that does nothing."""
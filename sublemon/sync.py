@@ -0,0 +1,371 @@
+"""Blocking access to a `Sublemon` running on a background event loop."""
+
+import asyncio
+import threading
+
+from concurrent.futures import Future
+from contextlib import closing
+from functools import partial
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple)
+
+from sublemon.errors import (
+    SublemonCancelledError,
+    SublemonRuntimeError)
+from sublemon.filters import OutputFilter
+from sublemon.runtime import (
+    _STOP_MODES,
+    Sublemon)
+from sublemon.subprocess import (
+    Command,
+    SublemonSubprocess)
+from sublemon.utils import (
+    LoopFactory,
+    new_event_loop,
+    validate_loop_factory)
+
+# lines buffered by the loop for each `iter_lines` consumer
+_LINE_BUFFER: int = 1024
+
+
+class SyncSublemon:
+
+    """Thread-safe, blocking front end to a long-lived `Sublemon`.
+
+    The `Sublemon` runs on an event loop of its own, in a background thread
+    started by `start` and kept until `stop`, so that synchronous code can
+    run commands without paying for a fresh event loop on each call. Any
+    number of threads may use the same instance at once; their calls are
+    queued up and handed to the loop in batches, waking it once per batch
+    rather than once per call.
+
+    Args:
+        loop_factory: The kind of event loop to run the runtime on (see
+            `new_event_loop`).
+        kwargs: The kwargs of `Sublemon` to create the runtime with.
+
+    """
+
+    def __init__(self, loop_factory: Optional[LoopFactory]=None,
+                 **kwargs: Any) -> None:
+        # bad kwargs are caught here, rather than in the loop's thread
+        Sublemon(**kwargs)
+        validate_loop_factory(loop_factory)
+
+        self._loop_factory = loop_factory
+        self._kwargs = kwargs
+        self._lock = threading.Lock()
+        self._is_running = False
+        # calls made from other threads, not yet run by the loop
+        self._inbox: List[Tuple[Callable[..., None], Tuple[Any, ...]]] = []
+        self._tasks: Set[asyncio.Future] = set()
+        # the tasks feeding `iter_lines` consumers
+        self._pumps: Set[asyncio.Future] = set()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[Sublemon] = None
+        self._stopping: Optional[asyncio.Future] = None
+
+    def __repr__(self) -> str:
+        return '<SyncSublemon [{}]>'.format(
+            str(self._server) if self._is_running else 'stopped')
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and issubclass(exc_type, KeyboardInterrupt):
+            self.stop('terminate')
+        else:
+            self.stop()
+
+    def start(self) -> None:
+        """Start the runtime and its event loop, blocking until ready."""
+        with self._lock:
+            if self._is_running or self._thread is not None:
+                raise SublemonRuntimeError(
+                    'Attempted to start an already-running `SyncSublemon` '
+                    'instance')
+
+            ready: Future = Future()
+            self._thread = threading.Thread(
+                target=self._run, args=(ready,), name='sublemon-sync',
+                daemon=True)
+            self._thread.start()
+            try:
+                ready.result()
+            except BaseException:
+                self._thread.join()
+                self._thread = None
+                raise
+            self._is_running = True
+
+    def _run(self, ready: Future) -> None:
+        loop = new_event_loop(self._loop_factory)
+        asyncio.set_event_loop(loop)
+        with closing(loop):
+            loop.run_until_complete(self._serve(ready))
+
+    async def _serve(self, ready: Future) -> None:
+        try:
+            server = Sublemon(**self._kwargs)
+            await server.start()
+        except BaseException as e:
+            ready.set_exception(e)
+            return
+
+        self._loop = asyncio.get_event_loop()
+        self._server = server
+        self._stopping = self._loop.create_future()
+        ready.set_result(None)
+        mode, grace, done = await self._stopping
+        try:
+            await server.stop(mode, grace)
+            # nobody is left to consume the lines of abandoned consumers
+            for pump in list(self._pumps):
+                pump.cancel()
+            await asyncio.gather(*self._tasks, *self._pumps,
+                                 return_exceptions=True)
+        except BaseException as e:
+            done.set_exception(e)
+        else:
+            done.set_result(None)
+
+    def stop(self, mode: str='drain', grace: Optional[float]=None) -> None:
+        """Stop the runtime and its event loop, blocking until done.
+
+        The `mode` and `grace` kwargs are the same as those of
+        `Sublemon.stop`. Futures of calls still in flight are settled
+        before this returns.
+
+        """
+        if mode not in _STOP_MODES:
+            raise SublemonRuntimeError(
+                'Invalid `mode` kwarg received: `' + str(mode) + '`')
+
+        with self._lock:
+            if not self._is_running:
+                raise SublemonRuntimeError(
+                    'Attempted to stop an already-stopped `SyncSublemon` '
+                    'instance')
+            self._is_running = False
+            done: Future = Future()
+            # queued after any calls already handed to the loop
+            self._loop.call_soon_threadsafe(  # type: ignore
+                self._stopping.set_result,  # type: ignore
+                (mode, grace, done,))
+
+        try:
+            done.result()
+        finally:
+            self._thread.join()  # type: ignore
+            self._thread = None
+
+    def _post(self, fn: Callable[..., None], *args: Any) -> None:
+        """Have the loop call `fn(*args)`, batched with other calls."""
+        with self._lock:
+            if not self._is_running:
+                raise SublemonRuntimeError(
+                    'Attempted to spawn subprocesses from a non-started '
+                    'server')
+            self._inbox.append((fn, args,))
+            if len(self._inbox) == 1:
+                self._loop.call_soon_threadsafe(  # type: ignore
+                    self._drain)
+
+    def _drain(self) -> None:
+        with self._lock:
+            batch, self._inbox = self._inbox, []
+        for fn, args in batch:
+            fn(*args)
+
+    def _track(self, aw: Awaitable[Any]) -> asyncio.Future:
+        task = asyncio.ensure_future(aw)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def submit(self, fn: Callable[..., Awaitable[Any]], *args: Any,
+               **kwargs: Any) -> Future:
+        """Run a coroutine against the runtime, from any thread.
+
+        Args:
+            fn: A coroutine function, called on the event loop as
+                `fn(server, *args, **kwargs)`, where `server` is the
+                `Sublemon` instance; e.g., `Sublemon.capture`.
+
+        Returns:
+            A `concurrent.futures.Future` of the coroutine's result.
+
+        """
+        fut: Future = Future()
+        self._post(self._start_call, fut, fn, args, kwargs)
+        return fut
+
+    def _start_call(self, fut: Future, fn: Callable[..., Awaitable[Any]],
+                    args: Tuple[Any, ...], kwargs: Any) -> None:
+        if not fut.set_running_or_notify_cancel():
+            return
+        try:
+            task = self._track(fn(self._server, *args, **kwargs))
+        except Exception as e:
+            fut.set_exception(e)
+        else:
+            task.add_done_callback(partial(_settle, fut))
+
+    def spawn(self, *cmds: Command, **kwargs: Any) -> List[Future]:
+        """Spawn subprocesses, from any thread, without blocking.
+
+        Accepts the same kwargs as `Sublemon.spawn`.
+
+        Returns:
+            A `concurrent.futures.Future` of the exit code of each command,
+            raising what `SublemonSubprocess.wait_done` would have raised.
+            Each future counts as running once its subprocess has begun
+            execution; cancelling it before then cancels the subprocess.
+
+        """
+        futs: List[Future] = [Future() for _ in cmds]
+        self._post(self._spawn, cmds, kwargs, futs)
+        return futs
+
+    def _spawn(self, cmds: Tuple[Command, ...], kwargs: Any,
+               futs: List[Future]) -> None:
+        try:
+            sps = self._server.spawn(*cmds, **kwargs)  # type: ignore
+        except Exception as e:
+            for fut in futs:
+                if fut.set_running_or_notify_cancel():
+                    fut.set_exception(e)
+            return
+
+        for sp, fut in zip(sps, futs):
+            fut.add_done_callback(partial(self._on_done, sp))
+            self._track(self._watch(sp, fut))
+
+    def _on_done(self, sp: SublemonSubprocess, fut: Future) -> None:
+        if fut.cancelled():
+            try:
+                self._post(sp.cancel)
+            except SublemonRuntimeError:
+                # stopping, which settles the subprocess anyway
+                pass
+
+    async def _watch(self, sp: SublemonSubprocess, fut: Future) -> None:
+        await sp.wait_running()
+        if not fut.set_running_or_notify_cancel():
+            return
+        try:
+            fut.set_result(await sp.wait_done())
+        except BaseException as e:
+            fut.set_exception(e)
+
+    def gather(self, *cmds: Command, **kwargs: Any) -> Tuple[int]:
+        """Run commands and block until all of them have exited.
+
+        Accepts the same kwargs as `Sublemon.gather`, and returns the exit
+        codes of the commands, in order.
+
+        """
+        return self.submit(Sublemon.gather, *cmds, **kwargs).result()
+
+    def iter_lines(self, *cmds: Command, stream: str='both',
+                   output_filter: Optional[OutputFilter]=None
+                   ) -> Iterator[str]:
+        """Spawn commands and iterate over their text lines as they arrive.
+
+        The same as `Sublemon.iter_lines`, but blocking. Lines are handed
+        over from the event loop in batches; if the consumer falls behind,
+        reading from the subprocesses is paused. Closing the iterator early
+        cancels any of the subprocesses that have not finished.
+
+        """
+        buf, pump = self.submit(
+            self._start_lines, cmds, stream, output_filter).result()
+        try:
+            while True:
+                for line in self.submit(_next_lines, buf).result():
+                    if line is None:
+                        return
+                    elif isinstance(line, BaseException):
+                        raise line
+                    yield line
+        finally:
+            try:
+                self._post(pump.cancel)
+            except SublemonRuntimeError:
+                pass
+
+    async def _start_lines(
+            self, server: Sublemon, cmds: Tuple[Command, ...], stream: str,
+            output_filter: Optional[OutputFilter]
+    ) -> Tuple[asyncio.Queue, asyncio.Future]:
+        buf: asyncio.Queue = asyncio.Queue(maxsize=_LINE_BUFFER)
+        pump = asyncio.ensure_future(
+            _pump_lines(server, cmds, stream, output_filter, buf))
+        self._pumps.add(pump)
+        pump.add_done_callback(self._pumps.discard)
+        return buf, pump
+
+    @property
+    def is_running(self) -> bool:
+        """Whether this instance has been started, and not yet stopped."""
+        return self._is_running
+
+    @property
+    def server(self) -> Optional[Sublemon]:
+        """The wrapped `Sublemon`, which must only be used from its loop."""
+        return self._server
+
+    @property
+    def loop_factory(self) -> Optional[LoopFactory]:
+        """The kind of event loop that the wrapped `Sublemon` runs on."""
+        return self._loop_factory
+
+    @property
+    def loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        """The event loop that the wrapped `Sublemon` runs on."""
+        return self._loop
+
+
+def _settle(fut: Future, task: asyncio.Future) -> None:
+    """Pass on the outcome of a task to a running future."""
+    if task.cancelled():
+        fut.set_exception(SublemonCancelledError(
+            'Call was cancelled while stopping the server'))
+    elif task.exception() is not None:
+        fut.set_exception(task.exception())
+    else:
+        fut.set_result(task.result())
+
+
+async def _pump_lines(server: Sublemon, cmds: Tuple[Command, ...],
+                      stream: str, output_filter: Optional[OutputFilter],
+                      buf: asyncio.Queue) -> None:
+    lines = server.iter_lines(
+        *cmds, stream=stream, output_filter=output_filter)
+    try:
+        async for line in lines:
+            await buf.put(line)
+    except Exception as e:
+        await buf.put(e)
+    else:
+        await buf.put(None)
+    finally:
+        await lines.aclose()
+
+
+async def _next_lines(server: Sublemon, buf: asyncio.Queue) -> List[Any]:
+    """Wait for at least one buffered line, and take all of them."""
+    batch = [await buf.get()]
+    while not buf.empty():
+        batch.append(buf.get_nowait())
+    return batch
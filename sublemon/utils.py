@@ -5,28 +5,113 @@ import contextlib
 import signal
 import sys
 
-from aiostream import stream
 from typing import (
     Any,
-    AsyncGenerator)
+    AsyncGenerator,
+    AsyncIterable,
+    Callable,
+    Iterable,
+    Optional,
+    Union)
+
+from sublemon.errors import SublemonRuntimeError
+
+try:
+    from time import monotonic_ns, time_ns
+except ImportError:  # Python 3.6
+    import time
+
+    def monotonic_ns() -> int:
+        """The value of `time.monotonic()`, in nanoseconds."""
+        return int(time.monotonic() * 1e9)
+
+    def time_ns() -> int:
+        """The value of `time.time()`, in nanoseconds."""
+        return int(time.time() * 1e9)
+
+LoopFactory = Union[str, Callable[[], asyncio.AbstractEventLoop]]
+
+_LOOP_FACTORIES = ('asyncio', 'uvloop', 'auto',)
 
 
 async def amerge(*agens) -> AsyncGenerator[Any, None]:
     """Thin wrapper around aiostream.stream.merge."""
+    from aiostream import stream
+
     xs = stream.merge(*agens)
     async with xs.stream() as streamer:
         async for x in streamer:
             yield x
 
 
-def crossplat_loop_run(coro) -> Any:
-    """Cross-platform method for running a subprocess-spawning coroutine."""
-    if sys.platform == 'win32':
-        signal.signal(signal.SIGINT, signal.SIG_DFL)
-        loop = asyncio.ProactorEventLoop()
+async def aiterate(
+        iterable: Union[Iterable, AsyncIterable]) -> AsyncGenerator[Any, None]:
+    """Iterate over either a synchronous or an asynchronous iterable."""
+    if hasattr(iterable, '__aiter__'):
+        async for x in iterable:
+            yield x
     else:
-        loop = asyncio.new_event_loop()
+        for x in iterable:
+            yield x
+
+
+def has_uvloop() -> bool:
+    """Whether the `uvloop` event loop is installed."""
+    try:
+        import uvloop  # noqa
+    except ImportError:
+        return False
+    return True
 
+
+def new_event_loop(loop_factory: Optional[LoopFactory]=None
+                   ) -> asyncio.AbstractEventLoop:
+    """Create an event loop that subprocesses can be spawned from.
+
+    Args:
+        loop_factory: Which kind of event loop to create: `asyncio` (the
+            default) for the standard library's loop (a `ProactorEventLoop`
+            on Windows), `uvloop` for the loop of the `uvloop` library,
+            `auto` for `uvloop` when it is installed and the standard loop
+            otherwise, or any callable returning a new event loop.
+
+    """
+    validate_loop_factory(loop_factory)
+    if loop_factory is None:
+        loop_factory = 'asyncio'
+    if callable(loop_factory):
+        return loop_factory()
+
+    if loop_factory == 'uvloop' or (loop_factory == 'auto' and has_uvloop()):
+        import uvloop
+        return uvloop.new_event_loop()
+    elif sys.platform == 'win32':
+        return asyncio.ProactorEventLoop()
+    return asyncio.new_event_loop()
+
+
+def validate_loop_factory(loop_factory: Optional[LoopFactory]) -> None:
+    """Raise a `SublemonRuntimeError` for event loops that can't be made."""
+    if loop_factory is None or callable(loop_factory):
+        return
+    elif loop_factory not in _LOOP_FACTORIES:
+        raise SublemonRuntimeError(
+            'Invalid `loop_factory` kwarg received: `' + str(loop_factory) +
+            '`')
+    elif loop_factory == 'uvloop' and not has_uvloop():
+        raise SublemonRuntimeError('`uvloop` event loop is not installed')
+
+
+def crossplat_loop_run(coro, loop_factory: Optional[LoopFactory]=None) -> Any:
+    """Cross-platform method for running a subprocess-spawning coroutine.
+
+    The coroutine is run on a new event loop (see `new_event_loop` for the
+    `loop_factory` kwarg), which is closed once it is done.
+
+    """
+    if sys.platform == 'win32':
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+    loop = new_event_loop(loop_factory)
     asyncio.set_event_loop(loop)
     with contextlib.closing(loop):
         return loop.run_until_complete(coro)
@@ -0,0 +1,109 @@
+"""Tests for the adaptive concurrency mode of `sublemon`."""
+
+import unittest
+
+from unittest import mock
+
+from sublemon import (
+    crossplat_loop_run,
+    Sublemon,
+    SublemonRuntimeError)
+from sublemon.adaptive import AdaptiveConcurrency
+
+
+def _host(load=0.0, free_memory=0.5, open_fds=10, nofile=1024):
+    """Patch the host metrics sampled by the adaptive controller."""
+    patches = [
+        mock.patch('sublemon.adaptive._load_per_cpu', return_value=load),
+        mock.patch('sublemon.adaptive._free_memory',
+                   return_value=free_memory),
+        mock.patch('sublemon.adaptive._open_fds', return_value=open_fds),
+        mock.patch('sublemon.adaptive._nofile_limit', return_value=nofile)]
+    for patch in patches:
+        patch.start()
+    return patches
+
+
+class TestAdaptiveConcurrency(unittest.TestCase):
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def test_additive_increase(self):
+        """Ensure a healthy, saturated host gets a higher limit."""
+        _host()
+        controller = AdaptiveConcurrency(4, 1, 6)
+        self.assertEqual(controller.adjust(running=4, pending=10), 5)
+        self.assertEqual(controller.adjust(running=5, pending=10), 6)
+        self.assertEqual(controller.adjust(running=6, pending=10), 6)
+        # no backlog, no reason to grow
+        self.assertEqual(controller.adjust(running=2, pending=0), 6)
+
+    def test_multiplicative_decrease(self):
+        """Ensure a congested host gets a lower limit, down to the floor."""
+        _host(load=4.0)
+        controller = AdaptiveConcurrency(16, 4, 16)
+        self.assertEqual(controller.adjust(running=16, pending=10), 12)
+        self.assertEqual(controller.adjust(running=12, pending=10), 9)
+        for _ in range(10):
+            controller.adjust(running=4, pending=10)
+        self.assertEqual(controller.limit, 4)
+
+        mock.patch.stopall()
+        _host(free_memory=0.01)
+        controller = AdaptiveConcurrency(16, 1, 16)
+        self.assertEqual(controller.adjust(running=16, pending=10), 12)
+
+    def test_latency_decrease(self):
+        """Ensure slowing jobs get a lower limit."""
+        _host()
+        controller = AdaptiveConcurrency(8, 1, 8)
+        controller.record_latency(0.1)
+        self.assertEqual(controller.adjust(running=8, pending=0), 8)
+        for _ in range(10):
+            controller.record_latency(10.0)
+            controller.adjust(running=8, pending=0)
+        self.assertLess(controller.limit, 8)
+
+    def test_nofile_cap(self):
+        """Ensure the limit never outgrows `RLIMIT_NOFILE`."""
+        _host(open_fds=100, nofile=200)
+        controller = AdaptiveConcurrency(100, 50, 100)
+        # 200 - 64 reserved - 100 open leaves room for 18 more jobs
+        self.assertEqual(controller.adjust(running=0, pending=100), 18)
+        self.assertEqual(controller.metrics['fd_cap'], 18)
+
+
+class TestAdaptiveRuntime(unittest.TestCase):
+
+    def test_invalid_floor(self):
+        """Ensure floors outside of `[1, ceiling]` are rejected."""
+        with self.assertRaises(SublemonRuntimeError):
+            Sublemon(adaptive=True, concurrency_floor=0)
+        with self.assertRaises(SublemonRuntimeError):
+            Sublemon(adaptive=True, concurrency_floor=5,
+                     concurrency_ceiling=4)
+
+    def test_observability(self):
+        """Ensure the adaptive limit shows up in `str` and the metrics."""
+        async def test():
+            async with Sublemon(max_concurrency=2, adaptive=True,
+                                concurrency_ceiling=8,
+                                adapt_interval=0.01) as s:
+                self.assertIn('adaptive limit: 2 (floor 1, ceiling 8)',
+                              str(s))
+                exit_codes = await s.gather(*['sleep 0.05'] * 20)
+                self.assertEqual(exit_codes, [0] * 20)
+
+                metrics = s.concurrency_metrics
+                self.assertEqual(metrics['limit'], s.concurrency_limit)
+                self.assertEqual(metrics['ceiling'], 8)
+                self.assertIsNotNone(metrics['latency'])
+                self.assertIn('load_per_cpu', metrics)
+
+            s = Sublemon(max_concurrency=3)
+            self.assertFalse(s.adaptive)
+            self.assertNotIn('adaptive', str(s))
+            self.assertEqual(s.concurrency_metrics,
+                             {'limit': 3, 'running': 0, 'pending': 0})
+        crossplat_loop_run(test())
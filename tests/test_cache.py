@@ -0,0 +1,177 @@
+"""Tests for the result caching of `sublemon`."""
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+from unittest import mock
+
+from sublemon import (
+    CommandResult,
+    crossplat_loop_run,
+    ResultCache,
+    Sublemon)
+
+
+class TestResultCache(unittest.TestCase):
+
+    def test_memory_lru(self):
+        """Ensure the memory tier evicts the least recently used results."""
+        cache = ResultCache(max_entries=2)
+        for key in 'abc':
+            cache.put(key, CommandResult(0, key.encode(), b''))
+            if key == 'b':
+                self.assertIsNotNone(cache.get('a'))
+        self.assertEqual(cache.get('a').stdout, b'a')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c').stdout, b'c')
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_disk_tier(self):
+        """Ensure the disk tier persists results and bounds its size."""
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(max_entries=1, directory=directory,
+                                max_disk_bytes=100)
+            cache.put('a', CommandResult(3, b'out', b'err'))
+            cache.put('b', CommandResult(0, b'', b''))
+            self.assertEqual(cache.get('a'),
+                             CommandResult(3, b'out', b'err'))
+
+            # a fresh cache picks up the results on disk
+            cache = ResultCache(directory=directory, max_disk_bytes=100)
+            self.assertEqual(len(cache), 2)
+            self.assertEqual(cache.get('b'), CommandResult(0, b'', b''))
+
+            cache.put('c', CommandResult(0, b'x' * 60, b''))
+            self.assertIsNone(cache.get('a'))
+            self.assertIsNotNone(cache.get('c'))
+            self.assertLessEqual(cache.disk_bytes, 100)
+
+            cache.clear()
+            self.assertEqual(len(cache), 0)
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_corrupt_entries(self):
+        """Ensure truncated or corrupt results on disk are misses."""
+        async def test():
+            with tempfile.TemporaryDirectory() as directory:
+                cache = ResultCache(directory=directory)
+                await cache.aput('a', CommandResult(3, b'out', b'err'))
+                await cache.aput('b', CommandResult(0, b'out', b''))
+                with open(os.path.join(directory, 'a'), 'r+b') as f:
+                    f.truncate(5)
+                with open(os.path.join(directory, 'b'), 'r+b') as f:
+                    f.truncate(14)
+
+                cache = ResultCache(directory=directory)
+                self.assertIsNone(await cache.aget('a'))
+                self.assertIsNone(cache.get('b'))
+                self.assertEqual((cache.hits, cache.misses), (0, 2))
+                self.assertEqual(os.listdir(directory), [])
+                self.assertEqual(cache.disk_bytes, 0)
+        crossplat_loop_run(test())
+
+    def test_key(self):
+        """Ensure keys depend on the command, environment, and inputs."""
+        key = ResultCache.key('make', [('/in', 'abc')])
+        self.assertEqual(key, ResultCache.key('make', [('/in', 'abc')]))
+        self.assertNotEqual(key, ResultCache.key('make', [('/in', 'abd')]))
+        self.assertNotEqual(key, ResultCache.key(['make'], [('/in', 'abc')]))
+        with mock.patch.dict(os.environ, {'SUBLEMON_TEST': '1'}):
+            self.assertNotEqual(
+                key, ResultCache.key('make', [('/in', 'abc')]))
+
+
+class TestCachedRuntime(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.runs = os.path.join(self.tmp.name, 'runs')
+        self.input = os.path.join(self.tmp.name, 'input')
+        with open(self.input, 'w') as f:
+            f.write('one')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _count_runs(self):
+        with open(self.runs) as f:
+            return len(f.read().split())
+
+    def test_capture(self):
+        """Test capturing output, with and without a cache."""
+        async def test():
+            async with Sublemon() as s:
+                result, = await s.capture('echo out; echo err >&2; exit 2')
+                self.assertEqual(result,
+                                 CommandResult(2, b'out\n', b'err\n'))
+
+            cmd = 'echo run >> {}; cat {}'.format(self.runs, self.input)
+            async with Sublemon(cache=ResultCache()) as s:
+                first, = await s.capture(cmd, inputs=[self.input])
+                second, = await s.capture(cmd, inputs=[self.input])
+                self.assertEqual(first.stdout, b'one')
+                self.assertFalse(first.cached)
+                self.assertTrue(second.cached)
+                self.assertEqual(self._count_runs(), 1)
+
+                # changed inputs are a different key
+                with open(self.input, 'w') as f:
+                    f.write('two')
+                third, = await s.capture(cmd, inputs=[self.input])
+                self.assertEqual(third.stdout, b'two')
+                self.assertEqual(self._count_runs(), 2)
+        crossplat_loop_run(test())
+
+    def test_gather_coalescing(self):
+        """Ensure identical in-flight commands are only run once."""
+        async def test():
+            cmd = 'echo run >> {}; sleep 0.2; exit 3'.format(self.runs)
+            async with Sublemon(cache=ResultCache()) as s:
+                self.assertEqual(await s.gather(cmd, cmd, cmd), [3, 3, 3])
+                self.assertEqual(self._count_runs(), 1)
+                self.assertEqual(await s.gather(cmd), [3])
+                self.assertEqual(self._count_runs(), 1)
+
+                # the result type does not depend on the cache
+                self.assertIsInstance(await s.gather(cmd), list)
+
+                # terminated commands are not cached
+                slow = 'echo run >> {}; sleep 10'.format(self.runs)
+                await s.gather(slow, timeout=0.1)
+                await s.gather(slow, timeout=0.1)
+                self.assertEqual(self._count_runs(), 3)
+        crossplat_loop_run(test())
+
+    def test_cancel_coalesced(self):
+        """Ensure cancelling one of several coalesced callers is isolated."""
+        async def test():
+            cmd = 'echo run >> {}; sleep 0.5; echo done'.format(self.runs)
+            async with Sublemon(cache=ResultCache()) as s:
+                leader = asyncio.ensure_future(s.capture(cmd))
+                await asyncio.sleep(0.1)
+                follower = asyncio.ensure_future(s.capture(cmd))
+                await asyncio.sleep(0.1)
+                leader.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await leader
+
+                result, = await follower
+                self.assertEqual(result.stdout, b'done\n')
+                self.assertFalse(result.cached)
+                self.assertEqual(self._count_runs(), 1)
+                self.assertTrue((await s.capture(cmd))[0].cached)
+
+                # but the command is cancelled along with its last caller
+                cmd = 'echo run >> {}; sleep 10'.format(self.runs)
+                callers = [asyncio.ensure_future(s.capture(cmd))
+                           for _ in range(2)]
+                await asyncio.sleep(0.2)
+                for caller in callers:
+                    caller.cancel()
+                await asyncio.gather(*callers, return_exceptions=True)
+                await s.block()
+                self.assertEqual(self._count_runs(), 2)
+                self.assertFalse(s._coalesced)
+        crossplat_loop_run(test())
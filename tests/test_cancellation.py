@@ -0,0 +1,153 @@
+"""Tests for cancelling subprocesses and stopping `sublemon` runtimes."""
+
+import asyncio
+import signal
+import time
+import unittest
+
+from sublemon import (
+    AsyncioLauncher,
+    crossplat_loop_run,
+    Sublemon,
+    SublemonCancelledError,
+    SublemonRuntimeError)
+
+
+class _SlowLauncher(AsyncioLauncher):
+
+    """Launcher taking its time to launch anything."""
+
+    async def launch(self, *args, **kwargs):
+        await asyncio.sleep(0.3)
+        return await super().launch(*args, **kwargs)
+
+
+@unittest.skipIf(not hasattr(signal, 'SIGKILL'), 'need POSIX signals')
+class TestCancellation(unittest.TestCase):
+
+    def test_cancel_subprocess(self):
+        """Test cancelling pending and running subprocesses."""
+        async def test():
+            async with Sublemon(max_concurrency=1) as s:
+                running, pending = s.spawn('sleep 10', 'true')
+                await running.wait_running()
+
+                pending.cancel()
+                with self.assertRaises(SublemonCancelledError):
+                    await pending.wait_done()
+                self.assertEqual(pending.termination_reason, 'cancelled')
+
+                running.cancel()
+                self.assertEqual(await running.wait_done(), -signal.SIGTERM)
+                self.assertEqual(running.termination_reason, 'cancelled')
+
+                # cancelling finished subprocesses does nothing
+                running.cancel()
+                self.assertEqual(await s.gather('true'), [0])
+
+                # nor does cancelling one that never got to wait for a slot
+                # leave it pending forever
+                sp, = s.spawn('true')
+                sp.cancel()
+                with self.assertRaises(SublemonCancelledError):
+                    await sp.wait_done()
+                self.assertFalse(s.pending_subprocesses)
+        crossplat_loop_run(test())
+
+    def test_invalid_stop_mode(self):
+        """Ensure unknown stop modes are rejected."""
+        async def test():
+            s = Sublemon()
+            await s.start()
+            with self.assertRaises(SublemonRuntimeError):
+                await s.stop('abandon')
+            await s.stop()
+        crossplat_loop_run(test())
+
+    def test_stop_cancel(self):
+        """Ensure `cancel` mode only cancels pending subprocesses."""
+        async def test():
+            s = Sublemon(max_concurrency=2)
+            await s.start()
+            sps = s.spawn(*['sleep 0.2'] * 5)
+            await asyncio.gather(sps[0].wait_running(), sps[1].wait_running())
+            await s.stop('cancel')
+
+            self.assertEqual(sps[0].exit_code, 0)
+            self.assertEqual(sps[1].exit_code, 0)
+            for sp in sps[2:]:
+                self.assertTrue(sp.is_done)
+                self.assertEqual(sp.termination_reason, 'cancelled')
+        crossplat_loop_run(test())
+
+    def test_stop_terminate(self):
+        """Ensure stopping with 1000 subprocesses in flight is bounded."""
+        async def test():
+            s = Sublemon(max_concurrency=1000)
+            await s.start()
+            sps = s.spawn(*[['sleep', '60']] * 1000)
+            await asyncio.sleep(0.5)
+
+            start = time.monotonic()
+            await s.stop('terminate', grace=0.5)
+            self.assertLess(time.monotonic() - start, 20)
+            self.assertTrue(all(sp.is_done for sp in sps))
+            self.assertTrue(
+                all(sp.termination_reason == 'cancelled' for sp in sps))
+            self.assertFalse(s.running_subprocesses)
+            self.assertFalse(s.pending_subprocesses)
+        crossplat_loop_run(test())
+
+    def test_cancel_consumers(self):
+        """Ensure cancelled consumers clean up their subprocesses."""
+        async def test():
+            async with Sublemon(max_concurrency=2) as s:
+                gather = asyncio.ensure_future(
+                    s.gather('sleep 10', 'sleep 10', 'sleep 10'))
+                await asyncio.sleep(0.2)
+                gather.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await gather
+
+                # the unread output would otherwise stall `seq` forever
+                outputs = s.iter_output('seq 1000000', stream='stdout')
+                async for output in outputs:
+                    sp = output.subprocess
+                    break
+                await outputs.aclose()
+                await sp.wait_done()
+                self.assertEqual(sp.termination_reason, 'cancelled')
+
+                agen = s.map(['sleep 10'] * 4)
+                consumer = asyncio.ensure_future(agen.__anext__())
+                await asyncio.sleep(0.2)
+                consumer.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await consumer
+
+            # and stopping the runtime did not hang on anything
+            self.assertFalse(s.running_subprocesses)
+        crossplat_loop_run(test())
+
+    def test_cancel_during_launch(self):
+        """Ensure subprocesses cancelled while launching free their slots."""
+        async def test():
+            s = Sublemon(max_concurrency=1, launcher=_SlowLauncher())
+            await s.start()
+            agen = s.map(['true'], ordered=True)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(agen.__anext__(), 0.1)
+            await asyncio.wait_for(s.stop(), 5)
+            self.assertFalse(s.pending_subprocesses)
+            self.assertFalse(s.running_subprocesses)
+
+            async with Sublemon(max_concurrency=1,
+                                launcher=_SlowLauncher()) as s:
+                sp, = s.spawn('true')
+                task = sp._task
+                await asyncio.sleep(0.1)
+                task.cancel()
+                with self.assertRaises(SublemonCancelledError):
+                    await sp.wait_done()
+                self.assertEqual(await s.gather('true'), [0])
+        crossplat_loop_run(test())
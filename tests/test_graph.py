@@ -0,0 +1,135 @@
+"""Tests for running graphs of dependent jobs with `sublemon`."""
+
+import os
+import tempfile
+import time
+import unittest
+
+from sublemon import (
+    crossplat_loop_run,
+    JobGraph,
+    Sublemon,
+    SublemonRuntimeError)
+
+
+class TestJobGraph(unittest.TestCase):
+
+    def test_topological_order(self):
+        """Ensure jobs are ordered after their dependencies."""
+        graph = JobGraph()
+        graph.add('link', 'true', deps=['a.o', 'b.o'])
+        graph.add('a.o', 'true', deps=['gen'])
+        graph.add('b.o', 'true')
+        graph.add('gen', 'true')
+        order = graph.topological_order()
+        self.assertEqual(sorted(order), sorted(graph.names))
+        for name in graph.names:
+            for dep in graph.deps(name):
+                self.assertLess(order.index(dep), order.index(name))
+
+    def test_critical_paths(self):
+        """Test the critical path costs of jobs."""
+        graph = JobGraph()
+        graph.add('a', 'true', cost=1)
+        graph.add('b', 'true', deps=['a'], cost=5)
+        graph.add('c', 'true', deps=['a'], cost=2)
+        graph.add('d', 'true', deps=['b', 'c'], cost=1)
+        self.assertEqual(graph.critical_paths(),
+                         {'a': 7, 'b': 6, 'c': 3, 'd': 1})
+
+    def test_invalid_graphs(self):
+        """Ensure duplicate jobs, unknown dependencies, and cycles fail."""
+        graph = JobGraph()
+        graph.add('a', 'true', deps=['b'])
+        with self.assertRaises(SublemonRuntimeError):
+            graph.add('a', 'true')
+        with self.assertRaises(SublemonRuntimeError):
+            graph.topological_order()
+
+        graph.add('b', 'true', deps=['c'])
+        graph.add('c', 'true', deps=['a'])
+        graph.add('d', 'true')
+        with self.assertRaisesRegex(SublemonRuntimeError,
+                                    'a -> b -> c -> a'):
+            graph.topological_order()
+
+
+class TestRunGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log = os.path.join(self.tmp.name, 'log')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _log(self, name, then='true'):
+        """Get a command that logs `name` when run."""
+        return 'echo {} >> {}; {}'.format(name, self.log, then)
+
+    def _logged(self):
+        with open(self.log) as f:
+            return f.read().split()
+
+    def test_run_graph(self):
+        """Ensure jobs start as soon as their own dependencies are done."""
+        async def test():
+            graph = JobGraph()
+            graph.add('slow', 'sleep 0.5')
+            graph.add('fast', 'true')
+            graph.add('after-fast', self._log('after-fast'), deps=['fast'])
+            graph.add('last', self._log('last'),
+                      deps=['slow', 'after-fast'])
+            async with Sublemon(max_concurrency=2) as s:
+                start = time.monotonic()
+                results = await s.run_graph(graph)
+                self.assertTrue(all(sp.exit_code == 0
+                                    for sp in results.values()))
+                # `after-fast` did not wait for `slow`
+                self.assertLess(
+                    (results['after-fast'].finished_at -
+                     results['slow'].began_at).total_seconds(), 0.4)
+                self.assertEqual(self._logged(), ['after-fast', 'last'])
+                self.assertLess(time.monotonic() - start, 5)
+        crossplat_loop_run(test())
+
+    def test_failures(self):
+        """Test the fail-fast and continue-on-error modes."""
+        async def test():
+            graph = JobGraph()
+            graph.add('bad', 'exit 1')
+            graph.add('slow', 'sleep 2')
+            graph.add('after-bad', self._log('after-bad'), deps=['bad'])
+            graph.add('ok', 'sleep 0.2')
+            graph.add('after-ok', self._log('after-ok'), deps=['ok'])
+            async with Sublemon() as s:
+                results = await s.run_graph(graph, fail_fast=False,
+                                            prioritize=False)
+                self.assertEqual(results['bad'].exit_code, 1)
+                self.assertIsNone(results['after-bad'])
+                self.assertEqual(results['after-ok'].exit_code, 0)
+                self.assertEqual(self._logged(), ['after-ok'])
+
+                start = time.monotonic()
+                results = await s.run_graph(graph)
+                self.assertEqual(results['slow'].termination_reason,
+                                 'cancelled')
+                self.assertIsNone(results['after-ok'])
+                self.assertLess(time.monotonic() - start, 1.5)
+        crossplat_loop_run(test())
+
+    def test_critical_path_first(self):
+        """Ensure ready jobs on the critical path are admitted first."""
+        async def test():
+            graph = JobGraph()
+            for i in range(4):
+                graph.add('leaf{}'.format(i), self._log('leaf'))
+            graph.add('head', self._log('head'))
+            graph.add('tail', self._log('tail'), deps=['head'])
+            async with Sublemon(max_concurrency=1) as s:
+                await s.run_graph(graph)
+            logged = self._logged()
+            self.assertEqual(logged[0], 'head')
+            self.assertEqual(sorted(logged), ['head'] + ['leaf'] * 4 +
+                             ['tail'])
+        crossplat_loop_run(test())
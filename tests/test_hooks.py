@@ -0,0 +1,150 @@
+"""Tests for the lifecycle hooks and metrics of `sublemon`."""
+
+import os
+import unittest
+
+from sublemon import (
+    crossplat_loop_run,
+    Histogram,
+    RetryPolicy,
+    Sublemon,
+    SublemonHooks,
+    SublemonMetrics,
+    SublemonRuntimeError)
+
+REAPING_LAUNCHERS = ['pool']
+if hasattr(os, 'posix_spawn'):
+    REAPING_LAUNCHERS.append('posix_spawn')
+
+
+class _Recorder(SublemonHooks):
+
+    """Hooks recording every event they are notified of."""
+
+    def __init__(self):
+        self.events = []
+
+    def on_queued(self, sp):
+        self.events.append(('queued', sp.cmd_str))
+
+    def on_started(self, sp):
+        self.events.append(('started', sp.cmd_str))
+
+    def on_output(self, sp, stream, data):
+        self.events.append(('output', stream, data))
+
+    def on_exited(self, sp):
+        self.events.append(('exited', sp.exit_code))
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_record(self):
+        """Test bucketing and summarizing of recorded values."""
+        h = Histogram(bounds=[1, 2, 4])
+        self.assertIsNone(h.quantile(0.5))
+        for value in (0.5, 1.5, 1.5, 3, 10):
+            h.record(value)
+        self.assertEqual(h.count, 5)
+        self.assertEqual(h.sum, 16.5)
+        self.assertEqual((h.min, h.max), (0.5, 10))
+        self.assertEqual(h.buckets,
+                         [(1, 1), (2, 2), (4, 1), (float('inf'), 1)])
+        self.assertEqual(h.quantile(0.5), 2)
+        self.assertEqual(h.quantile(0.1), 1)
+        self.assertEqual(h.quantile(1), 10)
+
+    def test_invalid_bounds(self):
+        """Ensure bounds must be non-empty and ascending."""
+        with self.assertRaises(SublemonRuntimeError):
+            Histogram(bounds=[])
+        with self.assertRaises(SublemonRuntimeError):
+            Histogram(bounds=[2, 1])
+
+
+class TestHooks(unittest.TestCase):
+
+    def test_lifecycle(self):
+        """Test that hooks see each transition of a subprocess, in order."""
+        async def test():
+            recorder = _Recorder()
+            async with Sublemon(hooks=[recorder]) as s:
+                sp, = s.spawn('echo hello')
+                await sp.wait_done()
+            self.assertEqual(recorder.events, [
+                ('queued', 'echo hello'),
+                ('started', 'echo hello'),
+                ('output', 'stdout', b'hello\n'),
+                ('exited', 0),
+            ])
+            self.assertLessEqual(sp.timestamps['queued'],
+                                 sp.timestamps['started'])
+            self.assertLessEqual(sp.timestamps['started'],
+                                 sp.timestamps['exited'])
+
+        crossplat_loop_run(test())
+
+    def test_retried_lifecycle(self):
+        """Test that retried subprocesses are queued and started again."""
+        async def test():
+            recorder = _Recorder()
+            retry = RetryPolicy(max_attempts=2, backoff=0)
+            async with Sublemon(hooks=[recorder], retry=retry) as s:
+                sp, = s.spawn('exit 3')
+                await sp.wait_done()
+            self.assertEqual(recorder.events, [
+                ('queued', 'exit 3'),
+                ('started', 'exit 3'),
+                ('queued', 'exit 3'),
+                ('started', 'exit 3'),
+                ('exited', 3),
+            ])
+
+        crossplat_loop_run(test())
+
+    def test_metrics(self):
+        """Test the counters and histograms kept by `SublemonMetrics`."""
+        async def test():
+            metrics = SublemonMetrics()
+            async with Sublemon(max_concurrency=1, hooks=[metrics]) as s:
+                await s.gather('echo out', 'echo err >&2; exit 1',
+                               'sleep 0.1')
+                sp, = s.spawn(['nonexistent-program-name'])
+                with self.assertRaises(FileNotFoundError):
+                    await sp.wait_done()
+
+            self.assertEqual(metrics.queued, 4)
+            self.assertEqual(metrics.started, 3)
+            self.assertEqual(metrics.exited, 4)
+            self.assertEqual(metrics.failed, 2)
+            self.assertEqual(metrics.bytes_read,
+                             {'stdout': 4, 'stderr': 4})
+            self.assertEqual(metrics.wait_time.count, 3)
+            self.assertEqual(metrics.run_time.count, 3)
+            self.assertGreaterEqual(metrics.run_time.max, 0.1)
+            self.assertGreater(metrics.throughput, 0)
+
+        crossplat_loop_run(test())
+
+    def test_resource_usage(self):
+        """Test that launchers reaping via `wait4` report resource usage."""
+        async def test():
+            for launcher in REAPING_LAUNCHERS:
+                metrics = SublemonMetrics()
+                async with Sublemon(launcher=launcher,
+                                    hooks=[metrics]) as s:
+                    sp, = s.spawn(
+                        'i=0; while [ $i -lt 20000 ]; do i=$((i+1)); done')
+                    await sp.wait_done()
+                usage = sp.resource_usage
+                self.assertIsNotNone(usage)
+                self.assertGreater(usage.user_time + usage.system_time, 0)
+                self.assertGreater(usage.max_rss, 0)
+                self.assertEqual(metrics.max_rss, usage.max_rss)
+
+            async with Sublemon() as s:
+                sp, = s.spawn('true')
+                await sp.wait_done()
+            self.assertIsNone(sp.resource_usage)
+
+        crossplat_loop_run(test())
@@ -0,0 +1,193 @@
+"""Tests for the subprocess launcher backends of `sublemon`."""
+
+import asyncio
+import os
+import subprocess
+import unittest
+
+from sublemon import (
+    BatchLauncher,
+    CommandResult,
+    crossplat_loop_run,
+    PosixSpawnLauncher,
+    Sublemon,
+    SublemonRuntimeError,
+    WorkerPoolLauncher)
+from sublemon.launchers import (
+    _BatchShell,
+    _reap)
+
+LAUNCHERS = ['asyncio', 'pool']
+if hasattr(os, 'posix_spawn'):
+    LAUNCHERS.append('posix_spawn')
+
+
+class _FakeBatchJob:
+
+    """Records what a batch's shell passes on to one of its commands."""
+
+    def __init__(self, loop):
+        self._loop = loop
+        self.output = {1: b'', 2: b''}
+        self.pid = self.returncode = None
+
+    def _pipe_data_received(self, fd, data):
+        self.output[fd] += data
+
+    def _pipe_eof(self, fd):
+        pass
+
+    def _on_started(self, pid):
+        self.pid = pid
+
+    def _on_exited(self, returncode):
+        self.returncode = returncode
+
+
+def _fake_batch(loop):
+    """Create a batch's shell for two fake commands, and its stdout."""
+    jobs = [_FakeBatchJob(loop), _FakeBatchJob(loop)]
+    shell = _BatchShell(BatchLauncher(), [(job, 'true',) for job in jobs])
+    token = shell._token.encode('ascii')
+
+    def marker(fields):
+        return b'\n' + token + b' ' + fields + b'\n'
+
+    data = (marker(b's 0 100') + b'hello\n' + marker(b'x 0 0') +
+            marker(b's 1 101') + b'tail' + marker(b'x 1 3'))
+    return jobs, shell, data
+
+
+class TestLaunchers(unittest.TestCase):
+
+    def test_invalid_launcher(self):
+        """Ensure unknown launcher names are rejected."""
+        with self.assertRaises(SublemonRuntimeError):
+            Sublemon(launcher='teleport')
+
+    def test_launcher_instance(self):
+        """Ensure launcher instances can be passed directly."""
+        if 'posix_spawn' not in LAUNCHERS:
+            self.skipTest('`posix_spawn` is not supported')
+        launcher = PosixSpawnLauncher()
+        self.assertIs(Sublemon(launcher=launcher).launcher, launcher)
+
+    def test_pool_size(self):
+        """Ensure the worker pool maps onto the concurrency slots."""
+        async def test():
+            async with Sublemon(max_concurrency=3, launcher='pool') as s:
+                self.assertEqual(s.launcher.size, 3)
+                subprocs = s.spawn(*['sleep 0.2' for _ in range(6)])
+                await asyncio.gather(
+                    *[sp.wait_running() for sp in subprocs[:3]])
+                self.assertEqual(len(s.running_subprocesses), 3)
+                await s.block()
+                self.assertEqual(
+                    [sp.exit_code for sp in subprocs], [0] * 6)
+
+            async with Sublemon(launcher=WorkerPoolLauncher(size=2)) as s:
+                self.assertEqual(s.launcher.size, 2)
+                self.assertEqual(await s.gather(*['true'] * 4), [0] * 4)
+        crossplat_loop_run(test())
+
+    def test_exit_codes_and_output(self):
+        """Ensure each launcher reports exit codes and output."""
+        async def test():
+            for launcher in LAUNCHERS:
+                async with Sublemon(launcher=launcher) as s:
+                    self.assertEqual(
+                        await s.gather('exit 3', ['true'], 'kill -9 $$'),
+                        [3, 0, -9])
+                    lines = [line async for line in s.iter_lines(
+                        'echo a && echo b 1>&2', ['echo', 'c'])]
+                    self.assertEqual(sorted(lines), ['a', 'b', 'c'])
+        crossplat_loop_run(test())
+
+    def test_launch_failure(self):
+        """Ensure a failed launch is reported and frees its slot."""
+        async def test():
+            for launcher in LAUNCHERS:
+                async with Sublemon(max_concurrency=1,
+                                    launcher=launcher) as s:
+                    bad, good = s.spawn(['/sublemon/no/such/file'], 'true')
+                    with self.assertRaises(FileNotFoundError):
+                        await bad.wait_done()
+                    self.assertTrue(bad.is_done)
+                    self.assertEqual(await good.wait_done(), 0)
+        crossplat_loop_run(test())
+
+    def test_reap_reaped_child(self):
+        """Ensure reaping a child that someone else reaped doesn't fail."""
+        proc = subprocess.Popen(['true'])
+        proc.wait()
+        self.assertEqual(_reap(proc.pid), (255, None,))
+
+    def test_batch(self):
+        """Test demultiplexing commands run in batches by one shell."""
+        async def test():
+            launcher = BatchLauncher(batch_size=50)
+            async with Sublemon(max_concurrency=100,
+                                launcher=launcher) as s:
+                self.assertEqual(s.launcher.batch_size, 50)
+                cmds = ['exit {}'.format(i % 5) for i in range(120)]
+                self.assertEqual(await s.gather(*cmds),
+                                 [i % 5 for i in range(120)])
+
+                results = await s.capture(
+                    'echo out; echo err >&2; printf tail', ['echo', "'q'"],
+                    'printf err >&2; exit 1', 'if then', 'seq 100000')
+                self.assertEqual(results[:3], [
+                    CommandResult(0, b'out\ntail', b'err\n', False),
+                    CommandResult(0, b"'q'\n", b'', False),
+                    CommandResult(1, b'', b'err', False)])
+                # syntax errors only fail their own command
+                self.assertEqual(results[3].exit_code, 2)
+                self.assertEqual(
+                    results[4].stdout.splitlines(),
+                    [str(i).encode() for i in range(1, 100001)])
+
+                sp, = s.spawn(['nonexistent-program-name'])
+                with self.assertRaises(FileNotFoundError):
+                    await sp.wait_done()
+        crossplat_loop_run(test())
+
+    def test_batch_split_markers(self):
+        """Ensure markers split across reads are still recognized."""
+        loop = asyncio.new_event_loop()
+        try:
+            _, _, data = _fake_batch(loop)
+            for i in range(len(data) + 1):
+                with self.subTest(split=i):
+                    jobs, shell, data = _fake_batch(loop)
+                    shell._on_data(1, data[:i])
+                    shell._on_data(1, data[i:])
+                    self.assertEqual(
+                        [(job.output[1], job.pid, job.returncode,)
+                         for job in jobs],
+                        [(b'hello\n', 100, 0,), (b'tail', 101, 3,)])
+        finally:
+            loop.close()
+
+    def test_batch_termination_and_redirection(self):
+        """Test signalling batched commands, and redirected fallbacks."""
+        async def test():
+            async with Sublemon(kill_grace=1, launcher='batch') as s:
+                sp, = s.spawn('sleep 5', timeout=0.1)
+                self.assertEqual(await sp.wait_done(), -15)
+                self.assertEqual(sp.termination_reason, 'timeout')
+                # a command exiting with 128 plus a signal's number
+                self.assertEqual(await s.gather('exit 143'), [143])
+
+                sp, = s.spawn('cat', stdin=b'fed\n')
+                self.assertEqual(await sp.wait_done(), 0)
+                self.assertEqual(
+                    [line async for line in sp.stdout], [b'fed\n'])
+                sps = s.pipeline('seq 100', 'wc -l')
+                self.assertEqual([await sp.wait_done() for sp in sps],
+                                 [0, 0])
+
+            with self.assertRaises(SublemonRuntimeError):
+                BatchLauncher(batch_size=0)
+            with self.assertRaises(SublemonRuntimeError):
+                BatchLauncher(batch_delay=-1)
+        crossplat_loop_run(test())
@@ -0,0 +1,138 @@
+"""Tests for running `sublemon` on different kinds of event loops."""
+
+import asyncio
+import os
+import unittest
+
+from sublemon import (
+    crossplat_loop_run,
+    has_uvloop,
+    new_event_loop,
+    ShardedSublemon,
+    Sublemon,
+    SublemonRuntimeError,
+    SyncSublemon)
+
+LOOP_FACTORIES = ['asyncio']
+if has_uvloop():
+    LOOP_FACTORIES.append('uvloop')
+
+LAUNCHERS = ['asyncio', 'pool']
+if hasattr(os, 'posix_spawn'):
+    LAUNCHERS.append('posix_spawn')
+
+
+class TestNewEventLoop(unittest.TestCase):
+
+    def test_invalid_loop_factory(self):
+        """Ensure unknown kinds of event loops are rejected."""
+        with self.assertRaises(SublemonRuntimeError):
+            new_event_loop('bogus')
+        coro = asyncio.sleep(0)
+        with self.assertRaises(SublemonRuntimeError):
+            crossplat_loop_run(coro, loop_factory='bogus')
+        coro.close()
+        with self.assertRaises(SublemonRuntimeError):
+            SyncSublemon(loop_factory='bogus')
+        with self.assertRaises(SublemonRuntimeError):
+            ShardedSublemon(mode='thread', loop_factory='bogus')
+        with self.assertRaises(SublemonRuntimeError):
+            ShardedSublemon(loop_factory=asyncio.new_event_loop)
+
+    def test_callable_loop_factory(self):
+        """Test creating event loops with any callable."""
+        created = []
+
+        def factory():
+            loop = asyncio.new_event_loop()
+            created.append(loop)
+            return loop
+
+        async def test():
+            return asyncio.get_event_loop()
+
+        self.assertIs(crossplat_loop_run(test(), loop_factory=factory),
+                      created[0])
+        self.assertTrue(created[0].is_closed())
+
+        # runtimes on threads of their own only create their loops there
+        SyncSublemon(loop_factory=factory)
+        ShardedSublemon(mode='thread', loop_factory=factory)
+        self.assertEqual(len(created), 1)
+
+    def test_auto(self):
+        """Test that `uvloop` is picked when it is installed."""
+        loop = new_event_loop('auto')
+        try:
+            self.assertEqual(type(loop).__module__.startswith('uvloop'),
+                             has_uvloop())
+        finally:
+            loop.close()
+
+    @unittest.skipIf(has_uvloop(), 'uvloop is installed')
+    def test_missing_uvloop(self):
+        """Ensure asking for `uvloop` without it installed fails."""
+        with self.assertRaises(SublemonRuntimeError):
+            new_event_loop('uvloop')
+
+
+class TestLoops(unittest.TestCase):
+
+    def test_launchers(self):
+        """Test every launcher on every kind of event loop."""
+        async def test(launcher):
+            async with Sublemon(launcher=launcher) as s:
+                self.assertEqual(await s.gather('true', 'exit 3'), [0, 3])
+                lines = [line async for line in s.iter_lines(
+                    'seq 1000', stream='stdout')]
+                self.assertEqual(lines, [str(i) for i in range(1, 1001)])
+                sp, = s.spawn(['nonexistent-program-name'])
+                with self.assertRaises(FileNotFoundError):
+                    await sp.wait_done()
+
+        for loop_factory in LOOP_FACTORIES:
+            for launcher in LAUNCHERS:
+                with self.subTest(loop_factory=loop_factory,
+                                  launcher=launcher):
+                    crossplat_loop_run(test(launcher),
+                                       loop_factory=loop_factory)
+
+    def test_timeouts_stdin_and_pipelines(self):
+        """Test terminating, feeding, and piping on every kind of loop."""
+        async def test():
+            async with Sublemon(kill_grace=1) as s:
+                sp, = s.spawn('sleep 60', timeout=0.1)
+                await sp.wait_done()
+                self.assertEqual(sp.termination_reason, 'timeout')
+
+                sp, = s.spawn('cat', stdin=b'fed\n')
+                self.assertEqual(await sp.wait_done(), 0)
+                self.assertEqual(
+                    [line async for line in sp.stdout], [b'fed\n'])
+
+                sps = s.pipeline('seq 100', 'wc -l')
+                self.assertEqual([await sp.wait_done() for sp in sps],
+                                 [0, 0])
+                self.assertEqual(
+                    [line.strip() async for line in sps[-1].stdout],
+                    [b'100'])
+
+        for loop_factory in LOOP_FACTORIES:
+            with self.subTest(loop_factory=loop_factory):
+                crossplat_loop_run(test(), loop_factory=loop_factory)
+
+    def test_background_loops(self):
+        """Test the front ends that run event loops of their own."""
+        async def test(loop_factory, mode):
+            async with ShardedSublemon(shards=2, mode=mode,
+                                       loop_factory=loop_factory) as s:
+                self.assertEqual(await s.gather('true', 'exit 3'), [0, 3])
+
+        for loop_factory in LOOP_FACTORIES:
+            with self.subTest(loop_factory=loop_factory):
+                with SyncSublemon(loop_factory=loop_factory) as s:
+                    self.assertEqual(s.gather('exit 2'), [2])
+                    self.assertEqual(
+                        list(s.iter_lines('echo hi')), ['hi'])
+                for mode in ('thread', 'process',):
+                    crossplat_loop_run(test(loop_factory, mode))
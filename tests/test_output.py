@@ -0,0 +1,249 @@
+"""Tests for the output buffering policies of `sublemon`."""
+
+import re
+import shutil
+import time
+import unittest
+
+from sublemon import (
+    crossplat_loop_run,
+    OutputFilter,
+    Sublemon,
+    SublemonRuntimeError,
+    SyncSublemon)
+
+NO_PY = shutil.which('python') is None
+
+
+def _sp_write_lines(n: int, stream: str='stdout') -> str:
+    """Return the subprocess cmd to write `n` numbered lines to `stream`."""
+    return ('python -c "import sys\n'
+            'for i in range({}): print(i, file=sys.{})"').format(n, stream)
+
+
+@unittest.skipIf(NO_PY, 'need `python` in PATH')
+class TestOutputPolicies(unittest.TestCase):
+
+    def test_invalid_policy(self):
+        """Ensure unknown output policies are rejected."""
+        with self.assertRaises(SublemonRuntimeError):
+            Sublemon(output_policy='hoard')
+
+        async def test():
+            async with Sublemon() as s:
+                with self.assertRaises(SublemonRuntimeError):
+                    s.spawn('echo hi', output_policy='hoard')
+        crossplat_loop_run(test())
+
+    def test_discard(self):
+        """Ensure unread output does not stall a `discard` subprocess."""
+        async def test():
+            async with Sublemon(output_policy='discard') as s:
+                sp, = s.spawn(_sp_write_lines(100000, 'stderr'))
+                self.assertEqual(await sp.wait_done(), 0)
+                lines = [line async for line in sp.stderr]
+                self.assertEqual(lines, [])
+        crossplat_loop_run(test())
+
+    def test_ring_bytes(self):
+        """Ensure the `ring` policy keeps the most recent bytes."""
+        async def test():
+            async with Sublemon() as s:
+                sp, = s.spawn(_sp_write_lines(100000),
+                              output_policy='ring', output_limit=1024)
+                self.assertEqual(await sp.wait_done(), 0)
+                data = b''.join([line async for line in sp.stdout])
+                self.assertTrue(len(data) <= 1024)
+                self.assertTrue(data.endswith(b'99998\n99999\n'))
+        crossplat_loop_run(test())
+
+    def test_ring_lines(self):
+        """Ensure the `ring` policy can keep the most recent lines."""
+        async def test():
+            async with Sublemon(output_policy='ring', output_lines=3) as s:
+                sp, = s.spawn(_sp_write_lines(100000))
+                self.assertEqual(await sp.wait_done(), 0)
+                lines = [line async for line in sp.stdout]
+                self.assertEqual(lines, [b'99997\n', b'99998\n', b'99999\n'])
+        crossplat_loop_run(test())
+
+    def test_capture(self):
+        """Ensure the `capture` policy keeps the first bytes."""
+        async def test():
+            async with Sublemon() as s:
+                sp, = s.spawn(_sp_write_lines(100000),
+                              output_policy='capture', output_limit=12)
+                self.assertEqual(await sp.wait_done(), 0)
+                lines = [line async for line in sp.stdout]
+                self.assertEqual(lines, [b'0\n', b'1\n', b'2\n', b'3\n',
+                                         b'4\n', b'5\n'])
+        crossplat_loop_run(test())
+
+    def test_spill(self):
+        """Ensure the `spill` policy loses no output."""
+        async def test():
+            async with Sublemon(output_policy='spill',
+                                output_limit=4096) as s:
+                sp, = s.spawn(_sp_write_lines(100000))
+                self.assertEqual(await sp.wait_done(), 0)
+                lines = [line async for line in sp.stdout]
+                self.assertEqual(len(lines), 100000)
+                self.assertEqual(lines[0], b'0\n')
+                self.assertEqual(lines[-1], b'99999\n')
+        crossplat_loop_run(test())
+
+
+@unittest.skipIf(NO_PY, 'need `python` in PATH')
+class TestChunkedOutput(unittest.TestCase):
+
+    def test_iter_chunks(self):
+        """Test reading raw and decoded blocks of output."""
+        async def test():
+            async with Sublemon() as s:
+                sp, = s.spawn(_sp_write_lines(10000))
+                chunks = [c async for c in sp.iter_chunks(size=4096)]
+                self.assertTrue(all(len(c) <= 4096 for c in chunks))
+                self.assertEqual(
+                    b''.join(chunks).split(),
+                    [str(i).encode() for i in range(10000)])
+
+                # multi-byte characters split across blocks
+                sp, = s.spawn(['printf', 'éèê'])
+                text = [c async for c in sp.iter_chunks(
+                    size=1, encoding='utf-8')]
+                self.assertEqual(''.join(text), 'éèê')
+
+                with self.assertRaises(SublemonRuntimeError):
+                    async for _ in sp.iter_chunks('stdin'):
+                        pass
+        crossplat_loop_run(test())
+
+    def test_iter_line_batches(self):
+        """Test splitting output into lines in bulk."""
+        async def test():
+            async with Sublemon() as s:
+                sp, = s.spawn(_sp_write_lines(10000, 'stderr'))
+                lines = []
+                async for batch in sp.iter_line_batches(
+                        'stderr', size=1000, encoding='utf-8'):
+                    lines.extend(batch)
+                self.assertEqual(lines, [str(i) for i in range(10000)])
+
+                sp, = s.spawn(['printf', 'a\\nb\\n\\nc'])
+                batches = [b async for b in sp.iter_line_batches()]
+                self.assertEqual(sum(batches, []), [b'a', b'b', b'', b'c'])
+        crossplat_loop_run(test())
+
+    def test_readinto(self):
+        """Test reading output into caller-provided buffers."""
+        async def test():
+            async with Sublemon(output_policy='spill', output_limit=1024) as s:
+                sp, = s.spawn(_sp_write_lines(10000))
+                await sp.wait_done()
+
+                buf = bytearray(3000)
+                data = bytearray()
+                while True:
+                    n = await sp.readinto(buf)
+                    if not n:
+                        break
+                    data += buf[:n]
+                self.assertEqual(
+                    data.split(), [str(i).encode() for i in range(10000)])
+                self.assertEqual(await sp.readinto(bytearray()), 0)
+        crossplat_loop_run(test())
+
+
+class TestOutputFilters(unittest.TestCase):
+
+    def test_invalid_filters(self):
+        """Ensure filters with nonsensical settings are rejected."""
+        for kwargs in (dict(pattern='text'), dict(pattern=re.compile('x')),
+                       dict(prefix='text'), dict(sample=0), dict(head=-1),
+                       dict(tail=-1),):
+            with self.subTest(**kwargs):
+                with self.assertRaises(SublemonRuntimeError):
+                    OutputFilter(**kwargs)
+
+    def test_apply(self):
+        """Test each kind of filter on a buffer of lines."""
+        data = b'apple\nbanana\navocado\ncherry\napricot'
+        cases = [
+            (OutputFilter(), data),
+            (OutputFilter(pattern=b'an'), b'banana\n'),
+            (OutputFilter(pattern=re.compile(b'^a.*o')),
+             b'avocado\napricot'),
+            (OutputFilter(pattern=b'a$'), b'banana\n'),
+            (OutputFilter(pattern=b'e\\nb'), b''),
+            (OutputFilter(prefix=b'a'), b'apple\navocado\napricot'),
+            (OutputFilter(prefix=b'a', pattern=b'c'), b'avocado\napricot'),
+            (OutputFilter(sample=2), b'apple\navocado\napricot'),
+            (OutputFilter(head=2), b'apple\nbanana\n'),
+            (OutputFilter(tail=2), b'cherry\napricot'),
+            (OutputFilter(prefix=b'a', head=2, tail=1), b'avocado\n'),
+            (OutputFilter(head=0), b''),
+        ]
+        for f, expected in cases:
+            with self.subTest(f=f):
+                self.assertEqual(f.apply(data), expected)
+
+    def test_split_chunks(self):
+        """Ensure lines split across chunks are matched as a whole."""
+        data = b''.join(b'%d\n' % i for i in range(1000))
+        f = OutputFilter(pattern=b'^12', sample=2)
+        state = f._start()
+        out = b''.join(state.feed(data[i:i + 7])
+                       for i in range(0, len(data), 7))
+        out += state.flush()
+        self.assertEqual(out, f.apply(data))
+        self.assertEqual(out.split(), [
+            b'12', b'121', b'123', b'125', b'127', b'129'])
+
+    def test_long_lines(self):
+        """Ensure output without newlines is filtered in bounded pieces."""
+        chunk = b'x' * 2 ** 16
+        for f, expected in ((OutputFilter(), chunk * 2 ** 10 + b'y\n',),
+                            (OutputFilter(pattern=b'y'), b'y\n',),
+                            (OutputFilter(tail=1), b'y\n',),):
+            with self.subTest(f=f):
+                state = f._start()
+                start = time.monotonic()
+                out = []
+                for _ in range(2 ** 10):
+                    out.append(state.feed(chunk))
+                    self.assertLess(len(state._partial), 2 ** 20)
+                out.append(state.feed(b'y\n'))
+                out.append(state.flush())
+                self.assertEqual(b''.join(out), expected)
+                self.assertLess(time.monotonic() - start, 5)
+
+    def test_spawn_and_iter_lines(self):
+        """Test filtering the output of subprocesses as it is read."""
+        async def test():
+            async with Sublemon() as s:
+                sp, = s.spawn('seq 100000; echo 777 >&2',
+                              output_filter=OutputFilter(pattern=b'^7+$'))
+                self.assertEqual(sp.output_filter.pattern, b'^7+$')
+                self.assertEqual(
+                    [line async for line in sp.stdout],
+                    [b'7\n', b'77\n', b'777\n', b'7777\n', b'77777\n'])
+                self.assertEqual(
+                    [line async for line in sp.stderr], [b'777\n'])
+
+                lines = [line async for line in s.iter_lines(
+                    'seq 1000', 'seq 5', stream='stdout',
+                    output_filter=OutputFilter(tail=1))]
+                self.assertEqual(sorted(lines), ['1000', '5'])
+
+                results = [r async for r in s.run_many(
+                    ['seq 100000'], max_output=16,
+                    output_filter=OutputFilter(prefix=b'9999'))]
+                self.assertEqual(results[0].stdout, b'9999\n99990\n99991')
+                self.assertTrue(results[0].stdout_truncated)
+        crossplat_loop_run(test())
+
+        with SyncSublemon() as s:
+            self.assertEqual(
+                list(s.iter_lines(
+                    'seq 100', output_filter=OutputFilter(head=2))),
+                ['1', '2'])
@@ -0,0 +1,139 @@
+"""Tests for feeding stdin to `sublemon` subprocesses, and pipelines."""
+
+import asyncio
+import tempfile
+import unittest
+
+from sublemon import (
+    crossplat_loop_run,
+    Sublemon,
+    SublemonCancelledError,
+    SublemonRuntimeError)
+
+from tests.test_launchers import LAUNCHERS
+
+PIPE_LAUNCHERS = [launcher for launcher in LAUNCHERS if launcher != 'pool']
+
+
+async def _read(sp):
+    """Read all of a subprocess's stdout, and wait for it to finish."""
+    data = b''.join([line async for line in sp.stdout])
+    await sp.wait_done()
+    return data
+
+
+class TestStdin(unittest.TestCase):
+
+    def test_stdin_sources(self):
+        """Test feeding bytes, files, and iterables to stdin."""
+        async def chunks():
+            for i in range(3):
+                yield '{}\n'.format(i).encode()
+                await asyncio.sleep(0.01)
+
+        for launcher in PIPE_LAUNCHERS:
+            with self.subTest(launcher=launcher):
+                async def test():
+                    async with Sublemon(launcher=launcher) as s:
+                        one, two = s.spawn('cat', ['cat'], stdin=b'hi\n')
+                        self.assertEqual(await _read(one), b'hi\n')
+                        self.assertEqual(await _read(two), b'hi\n')
+
+                        sp, = s.spawn('cat', stdin=chunks())
+                        self.assertEqual(await _read(sp), b'0\n1\n2\n')
+                        sp, = s.spawn('cat', stdin=[b'a', b'b'])
+                        self.assertEqual(await _read(sp), b'ab')
+
+                        with tempfile.TemporaryFile() as f:
+                            f.write(b'from a file\n')
+                            f.seek(0)
+                            sp, = s.spawn('cat', stdin=f)
+                        self.assertEqual(await _read(sp), b'from a file\n')
+
+                        # subprocesses that stop reading early are fine
+                        sp, = s.spawn('head -c 1', stdin=b'x' * 2 ** 20)
+                        self.assertEqual(await _read(sp), b'x')
+                crossplat_loop_run(test())
+
+    def test_invalid_stdin(self):
+        """Ensure stdin that cannot be fed is rejected."""
+        async def test():
+            async with Sublemon() as s:
+                with self.assertRaises(SublemonRuntimeError):
+                    s.spawn('cat', stdin='text')
+                with self.assertRaises(SublemonRuntimeError):
+                    s.spawn('cat', 'cat', stdin=[b'a'])
+
+                sp, = s.spawn('true')
+                await sp.wait_done()
+                with self.assertRaises(SublemonRuntimeError):
+                    s.spawn('cat', stdin=sp)
+
+                # nor can a subprocess that is being launched be piped from
+                sp, = s.spawn('echo hello')
+                await asyncio.sleep(0)
+                self.assertTrue(sp.is_pending)
+                with self.assertRaises(SublemonRuntimeError):
+                    s.spawn('cat', stdin=sp)
+                self.assertEqual(await _read(sp), b'hello\n')
+        crossplat_loop_run(test())
+
+    def test_pool_launcher(self):
+        """Ensure the `pool` launcher refuses to redirect stdin."""
+        async def test():
+            async with Sublemon(launcher='pool') as s:
+                sp, = s.spawn('cat', stdin=b'hi')
+                with self.assertRaises(SublemonRuntimeError):
+                    await sp.wait_done()
+        crossplat_loop_run(test())
+
+
+class TestPipelines(unittest.TestCase):
+
+    def test_pipeline(self):
+        """Test piping subprocesses into one another."""
+        for launcher in PIPE_LAUNCHERS:
+            with self.subTest(launcher=launcher):
+                async def test():
+                    async with Sublemon(launcher=launcher) as s:
+                        stages = s.pipeline(
+                            'seq 100000', ['grep', '7'], 'wc -l')
+                        self.assertEqual(await _read(stages[-1]), b'40951\n')
+                        self.assertEqual(
+                            [await sp.wait_done() for sp in stages], [0] * 3)
+                        self.assertIsNone(stages[0]._stdout)
+
+                        # early exits downstream stop upstream stages
+                        yes, head = s.pipeline(['yes'], 'head -n 2',
+                                               stdin=b'ignored')
+                        self.assertEqual(await _read(head), b'y\ny\n')
+                        self.assertEqual(await yes.wait_done(), -13)
+
+                        # and stdin can be piped from a lone subprocess
+                        echo, = s.spawn('echo piped')
+                        cat, = s.spawn('cat', stdin=echo)
+                        self.assertEqual(await _read(cat), b'piped\n')
+                crossplat_loop_run(test())
+
+    def test_pipeline_admission(self):
+        """Ensure pipeline stages are admitted together."""
+        async def test():
+            async with Sublemon(max_concurrency=1) as s:
+                # would block forever on the full pipe, if run one by one
+                big, count = s.pipeline(
+                    'head -c 1000000 /dev/zero', ['wc', '-c'])
+                self.assertEqual(await _read(count), b'1000000\n')
+
+                blocker, = s.spawn('sleep 0.2')
+                seq, cat = s.pipeline('seq 3', 'cat')
+                await asyncio.sleep(0.05)
+                self.assertTrue(seq.is_pending and cat.is_pending)
+                seq.cancel()
+                with self.assertRaises(SublemonCancelledError):
+                    await seq.wait_done()
+
+                # the stage left behind sees EOF, and no slots leak
+                self.assertEqual(await _read(cat), b'')
+                self.assertEqual(await s.gather('true', 'true'), [0, 0])
+                self.assertEqual(s._scheduler.in_use, 0)
+        crossplat_loop_run(test())
@@ -0,0 +1,132 @@
+"""Tests for retrying failed `sublemon` subprocesses."""
+
+import asyncio
+import os
+import signal
+import tempfile
+import unittest
+
+from sublemon import (
+    crossplat_loop_run,
+    RetryPolicy,
+    Sublemon,
+    SublemonRuntimeError)
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_should_retry(self):
+        """Test which attempts are worth retrying."""
+        policy = RetryPolicy(max_attempts=3)
+        self.assertTrue(policy.should_retry(1, 1, None))
+        self.assertTrue(policy.should_retry(2, -9, None))
+        self.assertFalse(policy.should_retry(3, 1, None))
+        self.assertFalse(policy.should_retry(1, 0, None))
+        self.assertFalse(policy.should_retry(1, -15, 'timeout'))
+        self.assertFalse(policy.should_retry(1, -15, 'cancelled'))
+
+        policy = RetryPolicy(exit_codes={75}, retry_timeouts=True)
+        self.assertTrue(policy.should_retry(1, 75, None))
+        self.assertFalse(policy.should_retry(1, 1, None))
+        self.assertTrue(policy.should_retry(1, -15, 'timeout'))
+        self.assertFalse(policy.should_retry(1, -15, 'deadline'))
+
+    def test_delay(self):
+        """Ensure backoff grows exponentially, with bounded jitter."""
+        policy = RetryPolicy(backoff=1, multiplier=2, max_backoff=5,
+                             jitter=0)
+        self.assertEqual([policy.delay(n) for n in range(1, 5)],
+                         [1, 2, 4, 5])
+
+        policy = RetryPolicy(backoff=1, multiplier=2, jitter=0.5)
+        delays = [policy.delay(3) for _ in range(100)]
+        self.assertTrue(all(2 <= d <= 4 for d in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+    def test_invalid_policy(self):
+        """Ensure invalid policies are rejected."""
+        with self.assertRaises(SublemonRuntimeError):
+            RetryPolicy(max_attempts=0)
+        with self.assertRaises(SublemonRuntimeError):
+            RetryPolicy(backoff=-1)
+        with self.assertRaises(SublemonRuntimeError):
+            RetryPolicy(jitter=2)
+
+
+@unittest.skipIf(not hasattr(signal, 'SIGKILL'), 'need POSIX signals')
+class TestRetries(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.counter = os.path.join(self.tmp.name, 'counter')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _flaky(self, failures):
+        """Get a command that fails its first `failures` runs."""
+        return 'echo x >> {0}; test $(wc -l < {0}) -gt {1}'.format(
+            self.counter, failures)
+
+    def test_retry(self):
+        """Ensure failed subprocesses are retried until they succeed."""
+        async def test():
+            policy = RetryPolicy(max_attempts=4, backoff=0.2, jitter=0)
+            async with Sublemon(max_concurrency=1, retry=policy) as s:
+                flaky, = s.spawn(self._flaky(2))
+                other, = s.spawn('true')
+                self.assertEqual(await other.wait_done(), 0)
+                # the slot was not held while backing off
+                self.assertTrue(flaky.is_pending)
+
+                self.assertEqual(await flaky.wait_done(), 0)
+                attempts = flaky.attempts
+                self.assertEqual([a.exit_code for a in attempts], [1, 1, 0])
+                self.assertGreater(
+                    (attempts[1].began_at - attempts[0].finished_at)
+                    .total_seconds(), 0.15)
+                self.assertEqual(len(other.attempts), 1)
+
+                # retries run out, and only matching exit codes are retried
+                sp, = s.spawn('exit 3')
+                self.assertEqual(await sp.wait_done(), 3)
+                self.assertEqual(len(sp.attempts), 1 + 3)
+                sp, = s.spawn('exit 3', retry=RetryPolicy(exit_codes=[75]))
+                self.assertEqual(await sp.wait_done(), 3)
+                self.assertEqual(len(sp.attempts), 1)
+        crossplat_loop_run(test())
+
+    def test_retry_timeouts(self):
+        """Ensure timed-out subprocesses are only retried if asked to."""
+        async def test():
+            async with Sublemon() as s:
+                sp, = s.spawn('sleep 10', timeout=0.1, retry=RetryPolicy(
+                    max_attempts=2, retry_timeouts=True, backoff=0))
+                self.assertEqual(await sp.wait_done(), -signal.SIGTERM)
+                self.assertEqual([a.termination_reason for a in sp.attempts],
+                                 ['timeout', 'timeout'])
+
+                sp, = s.spawn('sleep 10', timeout=0.1, retry=RetryPolicy())
+                await sp.wait_done()
+                self.assertEqual(len(sp.attempts), 1)
+        crossplat_loop_run(test())
+
+    def test_cancel_backoff(self):
+        """Ensure subprocesses backing off can be cancelled and stopped."""
+        async def test():
+            s = Sublemon(retry=RetryPolicy(backoff=60))
+            await s.start()
+            one, two = s.spawn('exit 2', 'exit 3')
+            await one.wait_running()
+            while len(one.attempts) < 1 or len(two.attempts) < 1:
+                await asyncio.sleep(0.01)
+            self.assertTrue(one.is_pending)
+
+            one.cancel()
+            self.assertEqual(await one.wait_done(), 2)
+            self.assertEqual(one.termination_reason, 'cancelled')
+
+            await s.stop('cancel')
+            self.assertEqual(two.exit_code, 3)
+            self.assertFalse(s.pending_subprocesses)
+        crossplat_loop_run(test())
@@ -53,6 +53,26 @@ class TestRuntime(unittest.TestCase):
                 self.assertEqual(s.pending_subprocesses, set())
         crossplat_loop_run(test())
 
+    def test_invalid_completion_mode(self):
+        """Ensure an unknown completion mode is rejected."""
+        with self.assertRaises(SublemonRuntimeError):
+            Sublemon(completion='busy-wait')
+
+    def test_completion_modes(self):
+        """Ensure both completion modes record exit codes and free slots."""
+        async def test():
+            for completion in ('event', 'poll',):
+                async with Sublemon(max_concurrency=1,
+                                    completion=completion) as s:
+                    self.assertEqual(s.completion, completion)
+                    exit_codes = await s.gather(
+                        _sp_exit_with(0),
+                        _sp_exit_with(3),
+                        _sp_exit_with(5))
+                    self.assertEqual(exit_codes, [0, 3, 5])
+                    self.assertEqual(len(s.running_subprocesses), 0)
+        crossplat_loop_run(test())
+
     def test_double_start(self):
         """Ensure double starting the server raises an exception."""
         async def test():
@@ -111,6 +131,26 @@ class TestRuntime(unittest.TestCase):
                 self.assertEqual(three.exit_code, 0)
         crossplat_loop_run(test())
 
+    def test_block(self):
+        """Ensure `block` waits on subprocesses spawned just before it."""
+        async def test():
+            async with Sublemon(max_concurrency=1) as s:
+                sps = s.spawn('true', 'true')
+                self.assertEqual(set(sps), s.pending_subprocesses)
+                later = []
+
+                async def spawn_later():
+                    await sps[0].wait_done()
+                    later.extend(s.spawn('exit 3'))
+                asyncio.ensure_future(spawn_later())
+
+                await s.block()
+                self.assertEqual([sp.exit_code for sp in sps], [0, 0])
+                self.assertEqual([sp.exit_code for sp in later], [3])
+                self.assertFalse(s.running_subprocesses)
+                self.assertFalse(s.pending_subprocesses)
+        crossplat_loop_run(test())
+
     def test_concurrency_limiting(self):
         """Ensure the `max_concurrency` option works as expected."""
         async def test():
@@ -178,6 +218,53 @@ class TestRuntime(unittest.TestCase):
                 self.assertEqual(4, len(lines))
         crossplat_loop_run(test())
 
+    def test_iter_output(self):
+        """Test iterating over tagged lines from spawned subprocesses."""
+        async def test():
+            async with Sublemon() as s:
+                outputs = [o async for o in s.iter_output(
+                    _sp_print_stdout('A'), _sp_print_stderr('B'))]
+                self.assertEqual(
+                    sorted((o.stream, o.line) for o in outputs),
+                    [('stderr', 'B'), ('stdout', 'A')])
+                by_line = {o.line: o.subprocess for o in outputs}
+                self.assertIn('A', by_line['A'].cmd)
+                self.assertIn('B', by_line['B'].cmd)
+
+                # stopping early is fine
+                agen = s.iter_output('seq 10', stream='stdout')
+                async for output in agen:
+                    self.assertEqual(output.line, '1')
+                    break
+                await agen.aclose()
+
+                with self.assertRaises(SublemonRuntimeError):
+                    async for _ in s.iter_output('true', stream='stdin'):
+                        pass
+        crossplat_loop_run(test())
+
+    def test_exec_mode(self):
+        """Test spawning argv-style commands without the shell."""
+        async def test():
+            async with Sublemon() as s:
+                sp, = s.spawn([sys.executable, '-c', 'print("$HOME")'])
+                self.assertFalse(sp.is_shell)
+                self.assertEqual(
+                    [line async for line in sp.stdout], [b'$HOME\n'])
+
+                exit_codes = await s.gather(
+                    [sys.executable, '-c', 'import sys; sys.exit(3)'],
+                    _sp_exit_with(4))
+                self.assertEqual(exit_codes, [3, 4])
+
+                lines = [line async for line in s.iter_lines(
+                    ['echo', 'a b'], 'echo c')]
+                self.assertEqual(sorted(lines), ['a b', 'c'])
+
+                with self.assertRaises(SublemonRuntimeError):
+                    s.spawn([])
+        crossplat_loop_run(test())
+
     def test_gather(self):
         """Test `gather` concurrent functionality."""
         async def test():
@@ -190,3 +277,102 @@ class TestRuntime(unittest.TestCase):
                     _sp_exit_with(4))
                 self.assertEqual(exit_codes, [0, 1, 2, 3, 4])
         crossplat_loop_run(test())
+
+    def test_map(self):
+        """Test lazily running commands from sync and async iterables."""
+        async def test():
+            async with Sublemon(max_concurrency=4) as s:
+                sps = [sp async for sp in s.map(
+                    (_sp_exit_with(i % 3) for i in range(10)))]
+                self.assertEqual(len(sps), 10)
+                self.assertTrue(all(sp.is_done for sp in sps))
+                self.assertEqual(sorted(sp.exit_code for sp in sps),
+                                 sorted(i % 3 for i in range(10)))
+
+                async def cmds():
+                    for i in range(5):
+                        yield 'sleep 0.0{}; exit {}'.format(5 - i, i)
+                exit_codes = [sp.exit_code async for sp in s.map(
+                    cmds(), ordered=True)]
+                self.assertEqual(exit_codes, [0, 1, 2, 3, 4])
+
+                with self.assertRaises(SublemonRuntimeError):
+                    async for _ in s.map([], lookahead=-1):
+                        pass
+        crossplat_loop_run(test())
+
+    def test_map_bounded(self):
+        """Ensure `map` only pulls commands as there is room to run them."""
+        async def test():
+            async with Sublemon(max_concurrency=2) as s:
+                pulled = 0
+                most_alive = 0
+
+                def cmds():
+                    nonlocal pulled
+                    for _ in range(50):
+                        pulled += 1
+                        yield 'true'
+
+                done = 0
+                async for _ in s.map(cmds(), lookahead=3):
+                    done += 1
+                    most_alive = max(most_alive, pulled - done)
+                self.assertEqual(done, 50)
+                self.assertLessEqual(most_alive, 5)
+        crossplat_loop_run(test())
+
+    def test_subprocess_identity(self):
+        """Test the identity, ids, and timestamps of subprocess objects."""
+        async def test():
+            async with Sublemon() as s:
+                one, two = s.spawn('true', 'true')
+                self.assertNotEqual(one, two)
+                self.assertEqual(len({one, two, one}), 2)
+                self.assertLess(one.id, two.id)
+                self.assertFalse(hasattr(one, '__dict__'))
+                self.assertIsNone(one.began_at)
+
+                await s.gather('true')
+                await asyncio.gather(one.wait_done(), two.wait_done())
+                self.assertLessEqual(one.scheduled_at, one.began_at)
+                self.assertLessEqual(one.began_at, one.finished_at)
+                self.assertTrue(one.is_done and not one.is_running)
+        crossplat_loop_run(test())
+
+    def test_run_many(self):
+        """Test streaming the captured results of many commands."""
+        async def test():
+            async with Sublemon(max_concurrency=4) as s:
+                cmds = [_sp_print_stdout(i) for i in range(20)]
+                results = [r async for r in s.run_many(
+                    cmds, ordered=True, encoding='utf-8')]
+                self.assertEqual([r.stdout for r in results],
+                                 ['{}\n'.format(i) for i in range(20)])
+                self.assertTrue(all(r.exit_code == 0 and r.error is None and
+                                    r.run_time >= 0 and r.wait_time >= 0
+                                    for r in results))
+
+                results = {r.subprocess.cmd_str: r async for r in s.run_many([
+                    _sp_print_stderr('oops'),
+                    'seq 100000',
+                    ['/nonexistent/program'],
+                    'sleep 10'], max_output=10, timeout=0.5)}
+                oops = results[_sp_print_stderr('oops')]
+                self.assertEqual((oops.stdout, oops.stderr), (b'', b'oops\n'))
+                self.assertFalse(oops.stderr_truncated)
+
+                seq = results['seq 100000']
+                self.assertEqual(seq.stdout, b'1\n2\n3\n4\n5\n')
+                self.assertTrue(seq.stdout_truncated)
+
+                missing = results['/nonexistent/program']
+                self.assertIsNone(missing.exit_code)
+                self.assertIsNone(missing.run_time)
+                self.assertIsInstance(missing.error, FileNotFoundError)
+
+                sleep = results['sleep 10']
+                self.assertEqual(sleep.subprocess.termination_reason,
+                                 'timeout')
+                self.assertLess(sleep.run_time, 5)
+        crossplat_loop_run(test())
@@ -0,0 +1,151 @@
+"""Tests for the admission scheduling of `sublemon`."""
+
+import asyncio
+import unittest
+
+from sublemon import (
+    crossplat_loop_run,
+    Sublemon,
+    SublemonRuntimeError)
+from sublemon.scheduler import SublemonScheduler
+
+
+async def _admission_order(scheduler, waiters):
+    """Queue `(name, priority, group)` waiters and record admission order.
+
+    All of the scheduler's slots are held while the waiters queue up, and
+    then released one admission at a time.
+
+    """
+    order = []
+
+    async def wait(name, priority, group):
+        await scheduler.acquire(priority, group)
+        order.append(name)
+
+    held = scheduler.limit
+    for _ in range(held):
+        await scheduler.acquire()
+    tasks = [asyncio.ensure_future(wait(*waiter)) for waiter in waiters]
+    await asyncio.sleep(0)
+
+    for _ in range(held + len(waiters)):
+        scheduler.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return order
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_priority_then_fifo(self):
+        """Ensure higher priorities go first, and FIFO within a priority."""
+        async def test():
+            order = await _admission_order(SublemonScheduler(1), [
+                ('a', 0, None), ('b', 0, None), ('c', 5, None),
+                ('d', 1, None), ('e', 5, None)])
+            self.assertEqual(order, ['c', 'e', 'd', 'a', 'b'])
+        crossplat_loop_run(test())
+
+    def test_weighted_fair_share(self):
+        """Ensure groups are admitted in proportion to their weights."""
+        async def test():
+            scheduler = SublemonScheduler(1)
+            scheduler.set_weight('heavy', 3)
+            waiters = [('l{}'.format(i), 0, 'light') for i in range(4)]
+            waiters += [('h{}'.format(i), 0, 'heavy') for i in range(12)]
+            order = await _admission_order(scheduler, waiters)
+
+            first_eight = order[:8]
+            self.assertEqual(
+                sum(1 for name in first_eight if name.startswith('h')), 6)
+            # FIFO within each group
+            self.assertEqual([name for name in order if name[0] == 'l'],
+                             ['l0', 'l1', 'l2', 'l3'])
+            self.assertEqual(
+                [name for name in order if name[0] == 'h'],
+                ['h{}'.format(i) for i in range(12)])
+        crossplat_loop_run(test())
+
+    def test_cancelled_waiters(self):
+        """Ensure cancelled waiters are skipped without leaking slots."""
+        async def test():
+            scheduler = SublemonScheduler(1)
+            await scheduler.acquire()
+            waiter = asyncio.ensure_future(scheduler.acquire())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            scheduler.release()
+            await asyncio.sleep(0)
+            self.assertEqual(scheduler.in_use, 0)
+        crossplat_loop_run(test())
+
+    def test_multiple_slots(self):
+        """Ensure multiple slots are taken at once, and in order."""
+        async def test():
+            scheduler = SublemonScheduler(3)
+            await scheduler.acquire()
+            await scheduler.acquire()
+            pair = asyncio.ensure_future(scheduler.acquire(slots=2))
+            single = asyncio.ensure_future(scheduler.acquire())
+            await asyncio.sleep(0)
+            # the single slot that is free is not enough for the pair, and
+            # the single waiter may not jump ahead of it
+            self.assertFalse(pair.done() or single.done())
+
+            scheduler.release()
+            await asyncio.sleep(0)
+            self.assertTrue(pair.done())
+            self.assertEqual(scheduler.in_use, 3)
+
+            # more slots than the limit are taken once none are in use
+            for _ in range(3):
+                scheduler.release()
+            await single
+            many = asyncio.ensure_future(scheduler.acquire(slots=5))
+            await asyncio.sleep(0)
+            self.assertFalse(many.done())
+            scheduler.release()
+            await many
+            self.assertEqual(scheduler.in_use, 5)
+        crossplat_loop_run(test())
+
+    def test_priority_jumps_multi_slot_waiter(self):
+        """Ensure a higher-priority waiter may use slots a bigger one can't."""
+        async def test():
+            scheduler = SublemonScheduler(4)
+            await scheduler.acquire()
+            await scheduler.acquire()
+            triple = asyncio.ensure_future(scheduler.acquire(slots=3))
+            await asyncio.sleep(0)
+            self.assertFalse(triple.done())
+
+            urgent = asyncio.ensure_future(scheduler.acquire(priority=10))
+            await asyncio.sleep(0)
+            self.assertTrue(urgent.done())
+            self.assertFalse(triple.done())
+            self.assertEqual(scheduler.in_use, 3)
+
+            for _ in range(3):
+                scheduler.release()
+            await triple
+            self.assertEqual(scheduler.in_use, 3)
+        crossplat_loop_run(test())
+
+    def test_invalid_weight(self):
+        """Ensure non-positive group weights are rejected."""
+        with self.assertRaises(SublemonRuntimeError):
+            SublemonScheduler(1).set_weight('group', 0)
+
+    def test_interactive_job_not_starved(self):
+        """Ensure a later high-priority job jumps a queued batch."""
+        async def test():
+            async with Sublemon(max_concurrency=1) as s:
+                batch = s.spawn(*['sleep 0.05' for _ in range(20)])
+                await batch[0].wait_running()
+                interactive, = s.spawn('true', priority=1)
+                await interactive.wait_done()
+                self.assertTrue(
+                    sum(1 for sp in batch if sp.is_pending) >= 17)
+                await s.block()
+        crossplat_loop_run(test())
@@ -0,0 +1,97 @@
+"""Tests for spreading subprocesses across `sublemon` shards."""
+
+import asyncio
+import os
+import signal
+import time
+import unittest
+
+from sublemon import (
+    crossplat_loop_run,
+    ShardedSublemon,
+    SublemonRuntimeError)
+
+MODES = ('thread', 'process',)
+
+
+@unittest.skipIf(not hasattr(signal, 'SIGKILL'), 'need POSIX signals')
+class TestShardedSublemon(unittest.TestCase):
+
+    def test_results(self):
+        """Test that results are merged back from every shard."""
+        async def test():
+            for mode in MODES:
+                async with ShardedSublemon(shards=2, max_concurrency=4,
+                                           mode=mode) as s:
+                    cmds = ['sleep 0.0{}; echo {}'.format(9 - i, i)
+                            for i in range(10)]
+                    results = [r async for r in s.run_many(
+                        cmds, ordered=True, encoding='utf-8')]
+                    self.assertEqual([r.cmd for r in results], cmds)
+                    self.assertEqual([r.stdout for r in results],
+                                     [str(i) + '\n' for i in range(10)])
+                    self.assertEqual({r.shard for r in results}, {0, 1})
+
+                    self.assertEqual(await s.gather('true', 'exit 3'),
+                                     [0, 3])
+                    self.assertEqual(s.running, 0)
+
+        crossplat_loop_run(test())
+
+    def test_global_limit(self):
+        """Ensure the concurrency limit holds across all shards."""
+        async def test():
+            for mode in MODES:
+                async with ShardedSublemon(shards=2, max_concurrency=2,
+                                           mode=mode) as s:
+                    start = time.perf_counter()
+                    await s.gather(*['sleep 0.2'] * 4)
+                    self.assertGreaterEqual(time.perf_counter() - start, 0.4)
+
+        crossplat_loop_run(test())
+
+    def test_early_close(self):
+        """Test that closing `run_many` early cancels its commands."""
+        async def test():
+            for mode in MODES:
+                async with ShardedSublemon(shards=2, mode=mode) as s:
+                    start = time.perf_counter()
+                    agen = s.run_many(['true'] + ['sleep 5'] * 4)
+                    async for result in agen:
+                        self.assertEqual(result.exit_code, 0)
+                        break
+                    await agen.aclose()
+
+                    while s.running:
+                        await asyncio.sleep(0.01)
+                    self.assertLess(time.perf_counter() - start, 2)
+
+        crossplat_loop_run(test())
+
+    def test_lost_shard(self):
+        """Ensure the jobs of a shard that died are failed."""
+        async def test():
+            async with ShardedSublemon(shards=1) as s:
+                agen = s.run_many(['sleep 5'])
+                fut = asyncio.ensure_future(agen.__anext__())
+                await asyncio.sleep(0.5)
+                os.kill(s._shards[0]._proc.pid, signal.SIGKILL)
+                result = await fut
+                self.assertIsNone(result.exit_code)
+                self.assertIsInstance(result.error, SublemonRuntimeError)
+                await agen.aclose()
+
+                # later jobs fail straight away, too
+                result, = [r async for r in s.run_many(['true'])]
+                self.assertIsInstance(result.error, SublemonRuntimeError)
+
+        crossplat_loop_run(test())
+
+    def test_invalid_kwargs(self):
+        """Ensure invalid kwargs are rejected up front."""
+        with self.assertRaises(SublemonRuntimeError):
+            ShardedSublemon(shards=0)
+        with self.assertRaises(SublemonRuntimeError):
+            ShardedSublemon(mode='fiber')
+        with self.assertRaises(SublemonRuntimeError):
+            ShardedSublemon(completion='psychic')
@@ -0,0 +1,116 @@
+"""Tests for the synchronous front end of `sublemon`."""
+
+import asyncio
+import threading
+import time
+import unittest
+
+from concurrent.futures import Future
+
+from sublemon import (
+    CommandResult,
+    Sublemon,
+    SublemonCancelledError,
+    SublemonRuntimeError,
+    SyncSublemon)
+
+
+class TestSyncSublemon(unittest.TestCase):
+
+    def test_gather_and_spawn(self):
+        """Test blocking and future-returning runs of commands."""
+        with SyncSublemon(max_concurrency=2) as s:
+            self.assertEqual(s.gather('true', 'exit 3'), [0, 3])
+            futs = s.spawn('echo hello', 'exit 2')
+            self.assertTrue(all(isinstance(f, Future) for f in futs))
+            self.assertEqual([f.result() for f in futs], [0, 2])
+            fut, = s.spawn(['nonexistent-program-name'])
+            with self.assertRaises(FileNotFoundError):
+                fut.result()
+            with self.assertRaises(SublemonRuntimeError):
+                s.spawn('true', output_policy='bogus')[0].result()
+        self.assertFalse(s.is_running)
+
+    def test_submit(self):
+        """Test running any coroutine of the runtime on its loop."""
+        with SyncSublemon() as s:
+            result, = s.submit(Sublemon.capture, 'echo hi').result()
+            self.assertEqual(result, CommandResult(0, b'hi\n', b'', False))
+            self.assertIs(s.submit(_own_loop).result(), s.loop)
+
+    def test_iter_lines(self):
+        """Test blocking iteration over the lines of commands."""
+        with SyncSublemon() as s:
+            self.assertEqual(
+                list(s.iter_lines('seq 3000', stream='stdout')),
+                [str(i) for i in range(1, 3001)])
+            self.assertEqual(
+                sorted(s.iter_lines('echo out', 'echo err >&2')),
+                ['err', 'out'])
+            with self.assertRaises(SublemonRuntimeError):
+                list(s.iter_lines('true', stream='bogus'))
+
+            start = time.perf_counter()
+            lines = s.iter_lines('echo first; sleep 10')
+            self.assertEqual(next(lines), 'first')
+            lines.close()
+        self.assertLess(time.perf_counter() - start, 5)
+
+    def test_many_threads(self):
+        """Test that many threads can share one instance at once."""
+        codes = []
+
+        def run(i):
+            for j in range(10):
+                codes.extend(s.gather('exit {}'.format((i + j) % 4)))
+
+        with SyncSublemon(max_concurrency=4) as s:
+            threads = [threading.Thread(target=run, args=(i,))
+                       for i in range(16)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(sorted(codes), sorted(
+            (i + j) % 4 for i in range(16) for j in range(10)))
+
+    def test_cancel(self):
+        """Test cancelling queued commands and stopping with work left."""
+        with SyncSublemon(max_concurrency=1) as s:
+            blocker, queued = s.spawn('sleep 0.5', 'echo never')
+            self.assertTrue(queued.cancel())
+            self.assertEqual(blocker.result(), 0)
+            self.assertTrue(queued.cancelled())
+
+        s = SyncSublemon(max_concurrency=1)
+        s.start()
+        running, pending = s.spawn('sleep 10', 'true')
+        while not running.running():
+            time.sleep(0.01)
+        start = time.perf_counter()
+        s.stop('terminate', grace=1)
+        self.assertLess(time.perf_counter() - start, 5)
+        self.assertNotEqual(running.result(), 0)
+        with self.assertRaises(SublemonCancelledError):
+            pending.result()
+
+    def test_lifecycle_errors(self):
+        """Test misuse of the start and stop methods."""
+        with self.assertRaises(SublemonRuntimeError):
+            SyncSublemon(completion='bogus')
+        s = SyncSublemon()
+        with self.assertRaises(SublemonRuntimeError):
+            s.gather('true')
+        with self.assertRaises(SublemonRuntimeError):
+            s.stop()
+        with s:
+            with self.assertRaises(SublemonRuntimeError):
+                s.start()
+            with self.assertRaises(SublemonRuntimeError):
+                s.stop('bogus')
+        with self.assertRaises(SublemonRuntimeError):
+            s.spawn('true')
+
+
+async def _own_loop(server):
+    return asyncio.get_event_loop()
@@ -0,0 +1,91 @@
+"""Tests for the timeouts and deadlines of `sublemon` subprocesses."""
+
+import asyncio
+import signal
+import time
+import unittest
+
+from sublemon import (
+    crossplat_loop_run,
+    Sublemon,
+    SublemonTimeoutError)
+
+from tests.test_launchers import LAUNCHERS
+
+
+@unittest.skipIf(not hasattr(signal, 'SIGKILL'), 'need POSIX signals')
+class TestTimeouts(unittest.TestCase):
+
+    def test_timeout(self):
+        """Ensure subprocesses are terminated once they time out."""
+        async def test():
+            async with Sublemon(max_concurrency=1, timeout=0.2) as s:
+                start = time.monotonic()
+                slow, fast = s.spawn('sleep 10', 'true')
+                self.assertEqual(await slow.wait_done(), -signal.SIGTERM)
+                self.assertEqual(slow.termination_reason, 'timeout')
+                # the slot is freed for the next subprocess right away
+                self.assertEqual(await fast.wait_done(), 0)
+                self.assertIsNone(fast.termination_reason)
+                self.assertLess(time.monotonic() - start, 2)
+
+                exit_codes = await s.gather(
+                    'sleep 10', ['sleep', '10'], timeout=0.1)
+                self.assertEqual(exit_codes, [-signal.SIGTERM] * 2)
+        crossplat_loop_run(test())
+
+    def test_kill_process_group(self):
+        """Ensure stubborn descendants of a timed-out subprocess are killed."""
+        # the subshell holds on to the output pipes, and ignores SIGTERM
+        cmd = '(trap "" TERM; sleep 10; echo late) & sleep 10'
+        for launcher in LAUNCHERS:
+            with self.subTest(launcher=launcher):
+                async def test():
+                    async with Sublemon(launcher=launcher,
+                                        kill_grace=0.2) as s:
+                        start = time.monotonic()
+                        sp, = s.spawn(cmd, timeout=0.2)
+                        lines = [line async for line in sp.stdout]
+                        self.assertEqual(lines, [])
+                        self.assertEqual(sp.termination_reason, 'timeout')
+                        self.assertLess(time.monotonic() - start, 5)
+                crossplat_loop_run(test())
+
+    def test_kill_on_exit(self):
+        """Ensure process groups are not killed after their grace period."""
+        cmd = '(trap "" TERM; sleep 10; echo late) & sleep 10'
+
+        async def test():
+            async with Sublemon(kill_grace=30) as s:
+                start = time.monotonic()
+                sp, = s.spawn(cmd, timeout=0.2)
+                self.assertEqual(await sp.wait_done(), -signal.SIGTERM)
+                # the lingering descendant is killed as the subprocess exits
+                self.assertIsNone(sp._killer)
+                self.assertEqual([line async for line in sp.stdout], [])
+                self.assertLess(time.monotonic() - start, 5)
+        crossplat_loop_run(test())
+
+    def test_deadline(self):
+        """Ensure deadlines apply to both pending and running subprocesses."""
+        async def test():
+            async with Sublemon(max_concurrency=1) as s:
+                loop = asyncio.get_event_loop()
+                deadline = loop.time() + 0.3
+                running, pending = s.spawn(
+                    'sleep 10', 'true', deadline=deadline)
+                self.assertEqual(running.deadline, deadline)
+
+                with self.assertRaises(SublemonTimeoutError):
+                    await pending.wait_done()
+                self.assertEqual(pending.termination_reason, 'deadline')
+                self.assertFalse(pending.is_pending)
+                self.assertEqual(await running.wait_done(), -signal.SIGTERM)
+                self.assertEqual(running.termination_reason, 'deadline')
+                self.assertEqual(await s.gather('true'), [0])
+
+                # an already-passed deadline never starts anything
+                sp, = s.spawn('true', deadline=loop.time() - 1)
+                with self.assertRaises(SublemonTimeoutError):
+                    await sp.wait_done()
+        crossplat_loop_run(test())